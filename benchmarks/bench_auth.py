@@ -0,0 +1,56 @@
+""" Counts the authentications manageiq performs for a playbook, with basic
+authentication on every request as before, and with X-Auth-Tokens kept in
+memory only or shared by the module processes through a token file.
+
+Every task of the playbook runs its module in a process of its own, so the
+clients and the in-memory tokens are dropped between tasks.
+
+    $ python benchmarks/bench_auth.py
+"""
+
+import os
+import shutil
+import tempfile
+
+from miq_stub import StubServer
+from ansible.module_utils import manageiq_utils
+from ansible.module_utils.manageiq_utils import PooledManageIQClient, manageiq_client
+
+
+TASKS = 50
+CALLS_PER_TASK = 5
+
+
+def playbook(api_url, **client_options):
+    for _ in range(TASKS):
+        # a new module process
+        manageiq_utils._clients.clear()
+        manageiq_utils._tokens.clear()
+        client = manageiq_client(PooledManageIQClient, api_url, 'admin', 'smartvm', True, None, **client_options)
+        for _ in range(CALLS_PER_TASK):
+            client.get(api_url + '/providers')
+
+
+def main():
+    tokens_dir = tempfile.mkdtemp()
+    try:
+        with StubServer() as server:
+            api_url = server.url + '/api'
+            scenarios = [
+                ('basic auth', dict(token_auth=False)),
+                ('token auth, in memory', dict(token_auth=True)),
+                ('token auth, token file', dict(token_auth=True, token_file=os.path.join(tokens_dir, 'tokens'))),
+            ]
+            print('{:<28} {:>12} {:>12} {:>10}'.format('scenario', 'basic auths', 'token auths', 'requests'))
+            for name, options in scenarios:
+                server.reset()
+                playbook(api_url, **options)
+                print('{:<28} {:>12} {:>12} {:>10}'.format(
+                    name, server.counters.get('basic_auths', 0), server.counters.get('token_auths', 0),
+                    server.counters.get('requests', 0)))
+    finally:
+        shutil.rmtree(tokens_dir)
+
+
+if __name__ == '__main__':
+    main()
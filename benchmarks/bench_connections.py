@@ -0,0 +1,79 @@
+""" Counts the connections (TCP, and over https TLS, handshakes) the modules
+open to manageiq, with a client of their own per module object as before,
+and with the shared pooled client.
+
+Every task of a playbook runs its module in a process of its own, so the
+shared client is dropped between tasks: pooling saves connections within a
+module run only, most of all when the module issues its calls concurrently.
+
+    $ python benchmarks/bench_connections.py
+"""
+
+import logging
+import threading
+
+from manageiq_client.api import ManageIQClient
+
+from miq_stub import StubServer
+from ansible.module_utils import manageiq_utils
+from ansible.module_utils.manageiq_utils import PooledManageIQClient, manageiq_client
+
+
+TASKS = 50
+CALLS_PER_TASK = 5
+THREADS = 20
+CALLS_PER_THREAD = 20
+
+
+def sequential_tasks(make_client, api_url):
+    for _ in range(TASKS):
+        # a new module process
+        manageiq_utils._clients.clear()
+        client = make_client(api_url)
+        for _ in range(CALLS_PER_TASK):
+            client.get(api_url + '/providers')
+
+
+def concurrent_calls(client, api_url):
+    # every round all the threads issue their call together, the way a module
+    # fans out independent reads
+    barrier = threading.Barrier(THREADS)
+
+    def worker():
+        for _ in range(CALLS_PER_THREAD):
+            barrier.wait()
+            client.get(api_url + '/providers')
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def main():
+    # the default pool discarding the connections it has no room for is the point
+    logging.getLogger('urllib3').setLevel(logging.ERROR)
+    with StubServer() as server:
+        api_url = server.url + '/api'
+        auth = ('admin', 'smartvm')
+
+        scenarios = [
+            ('client per module object', lambda: sequential_tasks(
+                lambda url: ManageIQClient(url, auth), api_url)),
+            ('shared pooled client', lambda: sequential_tasks(
+                lambda url: manageiq_client(PooledManageIQClient, url, auth[0], auth[1], True, None), api_url)),
+            ('{} threads, default pool'.format(THREADS), lambda: concurrent_calls(
+                ManageIQClient(api_url, auth), api_url)),
+            ('{} threads, pool_size={}'.format(THREADS, THREADS), lambda: concurrent_calls(
+                PooledManageIQClient(api_url, auth, pool_size=THREADS), api_url)),
+        ]
+        print('{:<32} {:>12} {:>10}'.format('scenario', 'connections', 'requests'))
+        for name, scenario in scenarios:
+            server.reset()
+            scenario()
+            print('{:<32} {:>12} {:>10}'.format(
+                name, server.counters.get('connections', 0), server.counters.get('requests', 0)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+""" Measures the time to compute the custom attributes to add and update on
+an entity carrying thousands of custom attributes, all of them set again
+with half of their values changed, finding every desired attribute with a
+scan of the existing ones as add_or_update_custom_attributes used to, and
+with the existing attributes indexed by (name, section).
+
+The custom attributes are served in process, so the times are the
+comparisons and the response handling only, without any network latency.
+
+    $ python benchmarks/bench_custom_attributes.py
+"""
+
+import os
+import sys
+import time
+
+from mock import Mock
+
+import miq_stub  # noqa: F401, makes module_utils importable
+from ansible.module_utils.basic import AnsibleModule
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'library'))
+import manageiq_custom_attributes  # noqa: E402
+
+
+API_URL = 'http://miq.example.com/api'
+SECTION = 'metadata'
+SIZES = [1000, 2500, 5000, 10000]
+
+
+class InProcessClient(object):
+    """ Serves the custom attributes of a single provider, counting the requests. """
+
+    def __init__(self, count):
+        self.response = {'custom_attributes': [
+            {'href': '{}/providers/1/custom_attributes/{}'.format(API_URL, i), 'id': i,
+             'name': 'ca{}'.format(i), 'section': SECTION, 'value': 'value {}'.format(i)}
+            for i in range(count)]}
+        self.requests = 0
+
+    def get(self, url, **params):
+        self.requests += 1
+        return self.response
+
+    def post(self, url, action, resources):
+        self.requests += 1
+        return {'results': resources}
+
+
+def custom_attributes_manager(client):
+    manageiq_custom_attributes.MiqApi = Mock(return_value=client)
+    miq = manageiq_custom_attributes.ManageIQCustomAttributes(Mock(spec=AnsibleModule), 'http://miq.example.com',
+                                                              'admin', 'smartvm', miq_verify_ssl=False, ca_bundle_path=None)
+    miq.find_entity_by_name = Mock(return_value=1)
+    return miq
+
+
+def scan_per_attribute(miq, custom_attributes):
+    entity_cas = miq.get_entity_custom_attributes('provider', 1)
+    additions, edits = [], []
+    for new_ca in custom_attributes:
+        existing_ca = next((ca for ca in entity_cas
+                            if (ca['name'], ca['section']) == (new_ca['name'], new_ca['section'])), None)
+        if existing_ca:
+            if new_ca['value'] != existing_ca['value']:
+                edits.append((new_ca, existing_ca['href']))
+        else:
+            additions.append(new_ca)
+    return additions, edits
+
+
+def index(miq, custom_attributes):
+    return miq.add_or_update_custom_attributes('provider', 'provider', custom_attributes)
+
+
+def main():
+    print('{:>10} {:>12} {:>12} {:>12}'.format('attributes', 'scan s', 'index s', 'index us/ca'))
+    for count in SIZES:
+        custom_attributes = [{'name': 'ca{}'.format(i), 'section': SECTION,
+                              'value': 'value {}'.format(i if i % 2 else -i)} for i in range(count)]
+        timings = []
+        for approach in (scan_per_attribute, index):
+            miq = custom_attributes_manager(InProcessClient(count))
+            start = time.time()
+            approach(miq, custom_attributes)
+            timings.append(time.time() - start)
+        print('{:>10} {:>12.4f} {:>12.4f} {:>12.2f}'.format(count, timings[0], timings[1], timings[1] / count * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+""" Measures the peak memory and the time to find a resource by name in a
+large collection, listing the whole collection in one response as
+iterating over client.collections does, and scanning it page by page,
+requesting the ids and names only, until the resource is found.
+
+Each scenario runs in a process of its own, for its peak RSS to be its own.
+
+    $ python benchmarks/bench_paging.py
+"""
+
+import resource
+import subprocess
+import sys
+import time
+
+from miq_stub import FakeCollection, StubServer
+from manageiq_client.api import ManageIQClient
+from ansible.module_utils.manageiq_paging import find_first
+
+
+SIZE = 200000
+TARGET = 'vm-{index:06d}'.format(index=SIZE // 2)
+SCENARIOS = ['full listing', 'paged, projected']
+
+
+def peak_rss_mb():
+    # ru_maxrss survives fork and exec on linux, it would report the server's
+    # peak, the high water mark of /proc is the process' own
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except IOError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_scenario(name, api_url):
+    client = ManageIQClient(api_url, ('admin', 'smartvm'))
+    url = api_url + '/vms'
+    rss_before = peak_rss_mb()
+    start = time.time()
+    if name == 'full listing':
+        resources = client.get(url, expand='resources')['resources']
+        found = next(r for r in resources if r['name'] == TARGET)
+    else:
+        found = find_first(client, url, lambda r: r['name'] == TARGET, attributes=['id', 'name'])
+    elapsed = time.time() - start
+    assert found['id'] == SIZE // 2 + 1
+    print('{:<20} {:>14.2f} {:>14.1f} {:>14.1f}'.format(name, elapsed, peak_rss_mb(), peak_rss_mb() - rss_before))
+
+
+def main():
+    if len(sys.argv) == 3:
+        return run_scenario(sys.argv[1], sys.argv[2])
+    with StubServer(latency=0, collections=[FakeCollection('vms', SIZE)]) as server:
+        print('{} resources, looking up {}'.format(SIZE, TARGET))
+        print('{:<20} {:>14} {:>14} {:>14}'.format('scenario', 'first match s', 'peak RSS MB', 'growth MB'))
+        sys.stdout.flush()
+        for name in SCENARIOS:
+            subprocess.check_call([sys.executable, __file__, name, server.url + '/api'])
+
+
+if __name__ == '__main__':
+    main()
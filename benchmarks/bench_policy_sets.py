@@ -0,0 +1,79 @@
+""" Measures the time to compute the policies to assign on a resource carrying
+thousands of assigned policies and profiles, checking every wanted policy
+with a scan of the resource's assignments, read again for every policy as
+entity_assigned used to, and with the set of the assigned ids, read once.
+
+The assignments are served in process, so the times are the comparisons
+and the response handling only, without any network latency.
+
+    $ python benchmarks/bench_policy_sets.py
+"""
+
+import os
+import sys
+import time
+
+from mock import Mock
+
+import miq_stub  # noqa: F401, makes module_utils importable
+from ansible.module_utils.basic import AnsibleModule
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'library'))
+import manageiq_policy_assignment  # noqa: E402
+
+
+API_URL = 'http://miq.example.com/api'
+SIZES = [(1000, 100), (5000, 500), (10000, 1000)]
+
+
+class InProcessClient(object):
+    """ Serves the assignments of a single resource, counting the requests. """
+
+    def __init__(self, assigned):
+        self.response = {'resources': [{'href': '{}/policies/{}'.format(API_URL, i), 'id': i} for i in assigned]}
+        self.requests = 0
+
+    def get(self, url, **params):
+        self.requests += 1
+        return self.response
+
+    def post(self, url, action, resources):
+        self.requests += 1
+        return {'results': [{'success': True, 'message': 'Assigning Policy'} for _ in resources]}
+
+
+def assignment_manager(client):
+    manageiq_policy_assignment.MiqApi = Mock(return_value=client)
+    return manageiq_policy_assignment.ManageIQ(Mock(spec=AnsibleModule), 'http://miq.example.com',
+                                               'admin', 'smartvm', miq_verify_ssl=False, ca_bundle_path=None)
+
+
+def scan_per_policy(miq, wanted):
+    url = '{}/hosts/1/policies'.format(API_URL)
+    return [entity_id for entity_id in wanted
+            if not any(ae['id'] == entity_id for ae in miq.client.get(url, expand='resources', attributes='id')['resources'])]
+
+
+def id_set(miq, wanted):
+    return miq.apply_to_resource('policies', set(wanted), 'hosts', 1, 'present')
+
+
+def main():
+    print('{:>10} {:>8} {:>16} {:>10} {:>16} {:>10}'.format(
+        'assigned', 'wanted', 'scan s', 'requests', 'id set s', 'requests'))
+    for assigned_count, wanted_count in SIZES:
+        assigned = range(1, assigned_count + 1)
+        # half of the wanted policies are already assigned
+        wanted = list(range(assigned_count - wanted_count // 2 + 1, assigned_count + wanted_count // 2 + 1))
+        timings = []
+        for approach in (scan_per_policy, id_set):
+            client = InProcessClient(assigned)
+            miq = assignment_manager(client)
+            start = time.time()
+            approach(miq, wanted)
+            timings.extend([time.time() - start, client.requests])
+        print('{:>10} {:>8} {:>16.4f} {:>10} {:>16.4f} {:>10}'.format(assigned_count, wanted_count, *timings))
+
+
+if __name__ == '__main__':
+    main()
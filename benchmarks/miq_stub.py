@@ -0,0 +1,171 @@
+""" A minimal stand-in for the manageiq api, counting the connections it
+accepts and the authentications it performs, to benchmark the client side of
+the modules against.
+
+Importing it also makes the repository's module_utils importable as
+ansible.module_utils.*, the way the modules import them.
+"""
+
+import json
+import os
+import uuid
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+except ImportError:  # python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+
+import ansible.module_utils
+
+
+ansible.module_utils.__path__.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'module_utils'))
+
+
+class FakeCollection(object):
+    """ A collection of size generated vm-like resources, served page by page
+    (offset and limit) and with the requested attributes only, the way
+    manageiq serves its collections.
+    """
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+    def resource(self, index):
+        return {
+            'href': 'http://127.0.0.1/api/{name}/{id}'.format(name=self.name, id=index + 1),
+            'id': index + 1,
+            'name': 'vm-{index:06d}'.format(index=index),
+            'vendor': 'redhat',
+            'type': 'ManageIQ::Providers::Redhat::InfraManager::Vm',
+            'power_state': 'on',
+            'guid': '{index:032x}'.format(index=index),
+            'uid_ems': '{index:036x}'.format(index=index),
+            'description': 'generated resource {index} '.format(index=index) * 4,
+            'created_on': '2017-01-01T00:00:00Z',
+            'updated_on': '2017-01-01T00:00:00Z',
+        }
+
+    def listing(self, offset=0, limit=None, attributes=None):
+        end = self.size if limit is None else min(self.size, offset + limit)
+        resources = []
+        for index in range(offset, end):
+            resource = self.resource(index)
+            if attributes:
+                resource = dict((k, v) for k, v in resource.items() if k in attributes or k == 'href')
+            resources.append(resource)
+        return {'name': self.name, 'count': self.size, 'subcount': len(resources), 'resources': resources}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.count('requests')
+        if not self.authenticate():
+            return
+        url = urlparse(self.path)
+        path = url.path.rstrip('/')
+        query = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        collection = self.server.collections.get(path[len('/api/'):])
+        if collection is not None:
+            body = collection.listing(int(query.get('offset', 0)),
+                                      int(query['limit']) if 'limit' in query else None,
+                                      query['attributes'].split(',') if 'attributes' in query else None)
+        elif path == '/api':
+            body = {'name': 'API', 'version': '2.4.0', 'versions': [], 'collections': []}
+        elif path == '/api/auth' and 'Authorization' in self.headers:
+            body = {'auth_token': self.server.new_token(), 'token_ttl': self.server.token_ttl}
+        else:
+            body = {'name': 'stub', 'count': 0, 'subcount': 0, 'resources': []}
+        self.reply(body)
+
+    def do_POST(self):
+        self.server.count('requests')
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        if not self.authenticate():
+            return
+        self.reply({'results': [{'success': True, 'message': 'stub'}]})
+
+    def authenticate(self):
+        # a basic authentication is a full credentials check (an LDAP round
+        # trip on many appliances), a token one is a lookup
+        if 'X-Auth-Token' in self.headers:
+            self.server.count('token_auths')
+            if self.headers['X-Auth-Token'] not in self.server.tokens:
+                self.reply({'error': {'kind': 'unauthorized', 'message': 'Invalid Authentication Token',
+                                      'klass': 'Api::AuthenticationError'}}, status=401)
+                return False
+        elif 'Authorization' in self.headers:
+            self.server.count('basic_auths')
+        return True
+
+    def reply(self, body, status=200):
+        time.sleep(self.server.latency)
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """ Serves StubHandler on a random local port, counting connections
+    (each one a TCP handshake, and a TLS one over https), requests and basic
+    and token authentications.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, handler_class=StubHandler, latency=0.002, token_ttl=600, collections=()):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), handler_class)
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.collections = dict((collection.name, collection) for collection in collections)
+        self.tokens = set()
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def new_token(self):
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.tokens.add(token)
+        return token
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{port}'.format(port=self.server_address[1])
+
+    def count(self, counter):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + 1
+
+    def process_request(self, request, client_address):
+        self.count('connections')
+        ThreadingMixIn.process_request(self, request, client_address)
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+
+    def __enter__(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
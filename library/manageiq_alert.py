@@ -32,6 +32,41 @@ options:
       - the path to a CA_BUNDLE file or directory with certificates
     required: false
     default: null
+  miq_pool_size:
+    description:
+      - the maximal number of connections to manageiq kept alive for reuse, and of calls issued concurrently
+    required: false
+    default: 10
+  miq_token_auth:
+    description:
+      - whether to authenticate once, through /api/auth, and send the X-Auth-Token obtained with the next requests instead of the username and password
+    required: false
+    default: true
+  miq_token_file:
+    description:
+      - a file, readable by the user only, sharing the X-Auth-Tokens between the module processes (e.g. forks and consecutive tasks)
+    required: false
+    default: null
+  cache_mode:
+    description:
+      - whether entities ids looked up by name are cached on disk, to be shared by
+        all the tasks (and forks) running against the same manageiq
+      - On off, ids are always looked up in manageiq
+      - On read, cached ids are used but the cache is left untouched
+      - On readwrite, cached ids are used and ids looked up are cached
+    required: false
+    choices: ['off', 'read', 'readwrite']
+    default: 'off'
+  cache_dir:
+    description:
+      - the directory holding the entities ids cache
+    required: false
+    default: ~/.ansible/manageiq_cache
+  cache_ttl:
+    description:
+      - the number of seconds an entity id is cached for
+    required: false
+    default: 3600
   description:
     description:
       - the alert definition description in manageiq. this is the primary key
@@ -98,7 +133,10 @@ EXAMPLES = '''
 '''
 
 import os
-from manageiq_client.api import ManageIQClient as MiqApi
+from ansible.module_utils.manageiq_utils import PooledManageIQClient as MiqApi, manageiq_argument_spec, manageiq_client, manageiq_client_options
+from ansible.module_utils.manageiq_lookup import EntityLookup
+from ansible.module_utils.manageiq_cache import manageiq_cache
+from ansible.module_utils.manageiq_projections import projection
 
 
 class ManageIQAlert(object):
@@ -117,12 +155,13 @@ class ManageIQAlert(object):
         'miq_server': 'MiqServer', 'middleware_server': 'MiddlewareServer'
     }
 
-    def __init__(self, module, url, user, password, miq_verify_ssl, ca_bundle_path):
+    def __init__(self, module, url, user, password, miq_verify_ssl, ca_bundle_path, cache=None, **client_options):
         self.module        = module
         self.api_url       = url + '/api'
         self.user          = user
         self.password      = password
-        self.client        = MiqApi(self.api_url, (self.user, self.password), verify_ssl=miq_verify_ssl, ca_bundle_path=ca_bundle_path)
+        self.client        = manageiq_client(MiqApi, self.api_url, self.user, self.password, miq_verify_ssl, ca_bundle_path, **client_options)
+        self.lookup        = EntityLookup(self.client, self.api_url, cache=cache)
         self.changed       = False
 
     def find_alert_by_description(self, description):
@@ -131,12 +170,18 @@ class ManageIQAlert(object):
         Returns:
             the alert id if it exists in manageiq, None otherwise.
         """
+        known, alert_id = self.lookup.known_id('alert_definitions', description, attribute='description')
+        if known:
+            return alert_id
         try:
-            response = self.client.get('{api_url}/alert_definitions?expand=resources'.format(api_url=self.api_url))
+            response = self.client.get('{api_url}/alert_definitions'.format(api_url=self.api_url),
+                                       expand='resources', attributes=projection('alert_descriptions'))
         except Exception as e:
             self.module.fail_json(msg="Failed to query alerts: {error}".format(error=e))
         alerts = response.get('resources', [])
-        return next((alert['id'] for alert in alerts if alert['description'] == description), None)
+        alert_id = next((alert['id'] for alert in alerts if alert['description'] == description), None)
+        self.lookup.remember('alert_definitions', description, alert_id, attribute='description')
+        return alert_id
 
     def delete_alert(self, description):
         """Deletes the alert from manageiq.
@@ -152,6 +197,7 @@ class ManageIQAlert(object):
         try:
             url = '{api_url}/alert_definitions/{alert_id}'.format(api_url=self.api_url, alert_id=alert_id)
             result = self.client.post(url, action='delete')
+            self.lookup.remember('alert_definitions', description, None, attribute='description')
         except Exception as e:
             self.module.fail_json(msg="Failed to delete alert {description}: {error}".format(description=description, error=e))
         self.changed = True
@@ -163,7 +209,7 @@ class ManageIQAlert(object):
         """
         url = "{api_url}/alert_definitions/{alert_id}".format(api_url=self.api_url, alert_id=alert_id)
         try:
-            result = self.client.get(url)
+            result = self.client.get(url, attributes=projection('alert_details'))
         except Exception as e:
             self.module.fail_json(msg="Failed to get alert {description} details. Error: {error}".format(description=description, error=e))
 
@@ -219,6 +265,7 @@ class ManageIQAlert(object):
                     'options': options, 'enabled': enabled}
         try:
             result = self.client.post(url, action='create', resource=resource)
+            self.lookup.invalidate('alert_definitions', description, attribute='description')
             self.changed = True
             return dict(
                 changed=self.changed,
@@ -244,6 +291,7 @@ class ManageIQAlert(object):
 def main():
     module = AnsibleModule(
         argument_spec=dict(
+            manageiq_argument_spec(),
             description=dict(required=True, type='str'),
             entity=dict(required=False, type='str',
                         choices=['container_node', 'vm', 'server', 'host',
@@ -285,7 +333,7 @@ def main():
     enabled         = module.params['enabled']
     state           = module.params['state']
 
-    manageiq = ManageIQAlert(module, miq_url, miq_username, miq_password, miq_verify_ssl, ca_bundle_path)
+    manageiq = ManageIQAlert(module, miq_url, miq_username, miq_password, miq_verify_ssl, ca_bundle_path, cache=manageiq_cache(module.params), **manageiq_client_options(module.params))
     if state == "present":
         res_args = manageiq.create_or_update_alert(description, expression,
                                                    expression_type, entity,
@@ -293,6 +341,7 @@ def main():
     if state == "absent":
         res_args = manageiq.delete_alert(description)
 
+    res_args['lookup_stats'] = manageiq.lookup.stats
     module.exit_json(**res_args)
 
 
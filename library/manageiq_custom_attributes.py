@@ -1,8 +1,12 @@
 #!/usr/bin/python
 
 import os
+from collections import OrderedDict
 from ansible.module_utils.basic import *
-from manageiq_client.api import ManageIQClient as MiqApi
+from ansible.module_utils.manageiq_utils import PooledManageIQClient as MiqApi, manageiq_argument_spec, manageiq_client, manageiq_client_options
+from ansible.module_utils.manageiq_lookup import EntityLookup
+from ansible.module_utils.manageiq_cache import manageiq_cache
+from ansible.module_utils.manageiq_projections import projection
 
 
 DOCUMENTATION = '''
@@ -61,6 +65,41 @@ options:
       - the path to a CA_BUNDLE file or directory with certificates
     required: false
     default: null
+  miq_pool_size:
+    description:
+      - the maximal number of connections to manageiq kept alive for reuse, and of calls issued concurrently
+    required: false
+    default: 10
+  miq_token_auth:
+    description:
+      - whether to authenticate once, through /api/auth, and send the X-Auth-Token obtained with the next requests instead of the username and password
+    required: false
+    default: true
+  miq_token_file:
+    description:
+      - a file, readable by the user only, sharing the X-Auth-Tokens between the module processes (e.g. forks and consecutive tasks)
+    required: false
+    default: null
+  cache_mode:
+    description:
+      - whether entities ids looked up by name are cached on disk, to be shared by
+        all the tasks (and forks) running against the same manageiq
+      - On off, ids are always looked up in manageiq
+      - On read, cached ids are used but the cache is left untouched
+      - On readwrite, cached ids are used and ids looked up are cached
+    required: false
+    choices: ['off', 'read', 'readwrite']
+    default: 'off'
+  cache_dir:
+    description:
+      - the directory holding the entities ids cache
+    required: false
+    default: ~/.ansible/manageiq_cache
+  cache_ttl:
+    description:
+      - the number of seconds an entity id is cached for
+    required: false
+    default: 3600
 '''
 
 EXAMPLES = '''
@@ -93,12 +132,13 @@ class ManageIQCustomAttributes(object):
 
     supported_entities = {'vm': 'vms', 'provider': 'providers'}
 
-    def __init__(self, module, url, user, password, miq_verify_ssl, ca_bundle_path):
+    def __init__(self, module, url, user, password, miq_verify_ssl, ca_bundle_path, cache=None, **client_options):
         self.module        = module
         self.api_url       = url + '/api'
         self.user          = user
         self.password      = password
-        self.client        = MiqApi(self.api_url, (self.user, self.password), verify_ssl=miq_verify_ssl, ca_bundle_path=ca_bundle_path)
+        self.client        = manageiq_client(MiqApi, self.api_url, self.user, self.password, miq_verify_ssl, ca_bundle_path, **client_options)
+        self.lookup        = EntityLookup(self.client, self.api_url, cache=cache)
         self.changed       = False
 
     def find_entity_by_name(self, entity_type, entity_name):
@@ -107,18 +147,17 @@ class ManageIQCustomAttributes(object):
             Returns:
                 the entity id if it exists in manageiq, None otherwise.
         """
-        entities_list = getattr(self.client.collections, ManageIQCustomAttributes.supported_entities[entity_type])
-        return next((e.id for e in entities_list if e.name == entity_name), None)
+        return self.lookup.find_id(ManageIQCustomAttributes.supported_entities[entity_type], entity_name)
 
     def get_entity_custom_attributes(self, entity_type, entity_id):
         """ Returns the entity's custom attributes
         """
         try:
-            url = '{api_url}/{entity_type}/{id}?expand=custom_attributes'.format(
+            url = '{api_url}/{entity_type}/{id}'.format(
                 api_url=self.api_url,
                 entity_type=ManageIQCustomAttributes.supported_entities[entity_type],
                 id=entity_id)
-            result = self.client.get(url)
+            result = self.client.get(url, attributes=projection('custom_attributes'))
             return result.get('custom_attributes', [])
         except Exception as e:
             self.module.fail_json(msg="Failed to get {entity_type} custom attributes. Error: {error}".format(
@@ -137,23 +176,31 @@ class ManageIQCustomAttributes(object):
         except Exception as e:
             self.module.fail_json(msg="Failed to add the custom attributes. Error: {}".format(e))
 
-    def update_custom_attribute(self, entity_type, entity_id, ca, ca_href):
-        """ Returns the updated custom attributes """
+    def update_custom_attributes(self, entity_type, entity_id, edits):
+        """ Updates the values of the custom attributes in a single request
+
+        edits - a list of (custom attribute, href of the existing one) tuples
+
+        Returns:
+            the updated custom attributes
+        """
         try:
             url = '{api_url}/{entity_type}/{id}/custom_attributes'.format(
                 api_url=self.api_url,
                 entity_type=ManageIQCustomAttributes.supported_entities[entity_type],
                 id=entity_id)
-            ca_object = {'name': ca['name'], 'href': ca_href, 'value': ca['value']}
-            result = self.client.post(url, action='edit', resources=[ca_object])
+            ca_objects = [{'name': ca['name'], 'href': ca_href, 'value': ca['value']} for ca, ca_href in edits]
+            result = self.client.post(url, action='edit', resources=ca_objects)
             self.changed = True
             return result['results']
         except Exception as e:
-            self.module.fail_json(msg="Failed to update the custom attribute {ca_name}. Error: {error}".format(ca_name=ca['name'], error=e))
+            self.module.fail_json(msg="Failed to update the custom attributes {ca_names}. Error: {error}".format(
+                ca_names=', '.join(ca['name'] for ca, _ in edits), error=e))
 
     @staticmethod
-    def compare_custom_attributes(ca1, ca2):
-        return (ca1['name'], ca1['section']) == (ca2['name'], ca2['section'])
+    def index_custom_attributes(custom_attributes):
+        """ Returns the custom attributes by (name, section), in order """
+        return OrderedDict(((ca['name'], ca['section']), ca) for ca in custom_attributes)
 
     def add_or_update_custom_attributes(self, entity_type, entity_name, custom_attributes):
         """ Adds custom attributes to an entity in manageiq or updates the
@@ -171,14 +218,18 @@ class ManageIQCustomAttributes(object):
             self.module.fail_json(
                 msg="Failed to set the custom attributes. {entity_type} {entity_name} does not exist".format(entity_type=entity_type, entity_name=entity_name))
 
-        entity_cas = self.get_entity_custom_attributes(entity_type, entity_id)
-        for new_ca in custom_attributes:
-            existing_ca = next((ca for ca in entity_cas if self.compare_custom_attributes(ca, new_ca)), None)
-            if existing_ca:
-                if new_ca['value'] != existing_ca['value']:
-                    updated.extend(self.update_custom_attribute(entity_type, entity_id, new_ca, existing_ca['href']))
-            else:
-                added.extend(self.add_custom_attributes(entity_type, entity_id, [new_ca]))
+        existing = self.index_custom_attributes(self.get_entity_custom_attributes(entity_type, entity_id))
+        desired = self.index_custom_attributes(custom_attributes)
+        missing = set(desired) - set(existing)
+        common = set(desired) & set(existing)
+        additions = [ca for key, ca in desired.items() if key in missing]
+        edits = [(ca, existing[key]['href']) for key, ca in desired.items()
+                 if key in common and ca['value'] != existing[key]['value']]
+
+        if additions:
+            added = self.add_custom_attributes(entity_type, entity_id, additions)
+        if edits:
+            updated = self.update_custom_attributes(entity_type, entity_id, edits)
 
         if added or updated:
             message = "Successfully set the custom attributes to {entity_name} {entity_type}"
@@ -191,20 +242,26 @@ class ManageIQCustomAttributes(object):
             updates={"Added": added, "Updated": updated}
         )
 
-    def delete_custom_attribute(self, ca, ca_href, entity_type, entity_id):
-        """ Returns the deleted custom attribute
+    def delete_entity_custom_attributes(self, entity_type, entity_id, deletions):
+        """ Deletes the custom attributes in a single request
+
+        deletions - a list of (custom attribute, href of the existing one) tuples
+
+        Returns:
+            the deleted custom attributes
         """
         try:
             url = '{api_url}/{entity_type}/{id}/custom_attributes'.format(
                 api_url=self.api_url,
                 entity_type=ManageIQCustomAttributes.supported_entities[entity_type],
                 id=entity_id)
-            ca_object = {'name': ca['name'], 'href': ca_href}
-            result = self.client.post(url, action='delete', resources=[ca_object])
+            ca_objects = [{'name': ca['name'], 'href': ca_href} for ca, ca_href in deletions]
+            result = self.client.post(url, action='delete', resources=ca_objects)
             self.changed = True
             return result['results']
         except Exception as e:
-            self.module.fail_json(msg="Failed to delete the custom attribute {ca}. Error: {error}".format(ca=ca, error=e))
+            self.module.fail_json(msg="Failed to delete the custom attributes {cas}. Error: {error}".format(
+                cas=[ca for ca, _ in deletions], error=e))
 
     def delete_custom_attributes(self, entity_type, entity_name, custom_attributes):
         """ Deletes the custom attributes from the entity, if exist
@@ -219,11 +276,12 @@ class ManageIQCustomAttributes(object):
             self.module.fail_json(
                 msg="Failed to delete the custom attributes. {entity_type} {entity_name} does not exist".format(entity_type=entity_type, entity_name=entity_name))
 
-        entity_cas = self.get_entity_custom_attributes(entity_type, entity_id)
-        for new_ca in custom_attributes:
-            ca_href = next((ca['href'] for ca in entity_cas if self.compare_custom_attributes(ca, new_ca)), None)
-            if ca_href:
-                deleted.extend(self.delete_custom_attribute(new_ca, ca_href, entity_type, entity_id))
+        existing = self.index_custom_attributes(self.get_entity_custom_attributes(entity_type, entity_id))
+        desired = self.index_custom_attributes(custom_attributes)
+        common = set(desired) & set(existing)
+        deletions = [(ca, existing[key]['href']) for key, ca in desired.items() if key in common]
+        if deletions:
+            deleted = self.delete_entity_custom_attributes(entity_type, entity_id, deletions)
 
         return dict(
             msg="Successfully deleted the following custom attributes from {entity_name} {entity_type}: {deleted}".format(entity_name=entity_name, entity_type=entity_type, deleted=deleted),
@@ -234,6 +292,7 @@ class ManageIQCustomAttributes(object):
 def main():
     module = AnsibleModule(
         argument_spec=dict(
+            manageiq_argument_spec(),
             entity_name=dict(required=True, type='str'),
             entity_type=dict(required=True, type='str',
                              choices=['provider', 'vm']),
@@ -266,13 +325,14 @@ def main():
         if 'section' not in ca:
             ca['section'] = 'metadata'
 
-    manageiq = ManageIQCustomAttributes(module, miq_url, miq_username, miq_password, miq_verify_ssl, ca_bundle_path)
+    manageiq = ManageIQCustomAttributes(module, miq_url, miq_username, miq_password, miq_verify_ssl, ca_bundle_path, cache=manageiq_cache(module.params), **manageiq_client_options(module.params))
     if state == 'present':
         res_args = manageiq.add_or_update_custom_attributes(entity_type, entity_name,
                                                             custom_attributes)
     elif state == 'absent':
         res_args = manageiq.delete_custom_attributes(entity_type, entity_name,
                                                      custom_attributes)
+    res_args['lookup_stats'] = manageiq.lookup.stats
     module.exit_json(**res_args)
 
 
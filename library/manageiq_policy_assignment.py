@@ -1,8 +1,15 @@
 #!/usr/bin/python
 
 import os
+from collections import OrderedDict
+from functools import partial
 from ansible.module_utils.basic import *
-from manageiq_client.api import ManageIQClient as MiqApi
+from ansible.module_utils.manageiq_utils import DEFAULT_POOL_SIZE, PooledManageIQClient as MiqApi, manageiq_argument_spec, manageiq_client, manageiq_client_options, run_concurrently
+from ansible.module_utils.manageiq_lookup import EntityLookup
+from ansible.module_utils.manageiq_cache import manageiq_cache
+from ansible.module_utils.manageiq_paging import iter_batches, iter_resources
+from ansible.module_utils.manageiq_polling import Poller, poller, poller_argument_spec
+from ansible.module_utils.manageiq_projections import projection
 
 
 DOCUMENTATION = '''
@@ -33,7 +40,14 @@ options:
   entity_name:
     description:
       - the entity name in manageiq
-    required: true
+      - one of entity_name or entity_names is required
+    required: false
+    default: null
+  entity_names:
+    description:
+      - the names of the entities, all of them assigned or unassigned together, in a single request per resource
+      - one of entity_name or entity_names is required
+    required: false
     default: null
   resource:
     description:
@@ -44,8 +58,54 @@ options:
   resource_name:
     description:
       - the relevant resource name in manageiq
-    required: true
+      - one of resource_name, resource_names or resource_filter is required
+    required: false
     default: null
+  resource_names:
+    description:
+      - the names of the resources, updated concurrently
+      - one of resource_name, resource_names or resource_filter is required
+    required: false
+    default: null
+  resource_filter:
+    description:
+      - manageiq filter expressions (e.g. "name='prod%'", "ems_id=3"), all of which the resources match
+      - the matching resources are listed page by page, and the resources of each page updated concurrently as it arrives
+      - one of resource_name, resource_names or resource_filter is required
+    required: false
+    default: null
+  batch_size:
+    description:
+      - the number of resources listed, and updated, at a time when using resource_filter, and of resources in a
+        single compliance check request
+    required: false
+    default: 100
+  check_compliance:
+    description:
+      - whether to check the compliance of the resources after the assignment, and wait for the results
+      - supported on vm, host, container node and container image resources
+    required: false
+    default: false
+  compliance_interval:
+    description:
+      - the number of seconds to wait before checking the compliance results again, after checking right away
+    required: false
+    default: 0.5
+  compliance_multiplier:
+    description:
+      - the factor the interval between checks grows by after every check
+    required: false
+    default: 2
+  compliance_max_interval:
+    description:
+      - the maximal number of seconds to wait between checks
+    required: false
+    default: 10
+  compliance_timeout:
+    description:
+      - the number of seconds after which the resources not checked yet are reported unchecked, shared by all the resources
+    required: false
+    default: 600
   state:
     description:
       - On present, it will assign the entity on the resource, if not already assigned
@@ -64,6 +124,41 @@ options:
       - the path to a CA_BUNDLE file or directory with certificates
     required: false
     default: null
+  miq_pool_size:
+    description:
+      - the maximal number of connections to manageiq kept alive for reuse, and of calls issued concurrently
+    required: false
+    default: 10
+  miq_token_auth:
+    description:
+      - whether to authenticate once, through /api/auth, and send the X-Auth-Token obtained with the next requests instead of the username and password
+    required: false
+    default: true
+  miq_token_file:
+    description:
+      - a file, readable by the user only, sharing the X-Auth-Tokens between the module processes (e.g. forks and consecutive tasks)
+    required: false
+    default: null
+  cache_mode:
+    description:
+      - whether entities ids looked up by name are cached on disk, to be shared by
+        all the tasks (and forks) running against the same manageiq
+      - On off, ids are always looked up in manageiq
+      - On read, cached ids are used but the cache is left untouched
+      - On readwrite, cached ids are used and ids looked up are cached
+    required: false
+    choices: ['off', 'read', 'readwrite']
+    default: 'off'
+  cache_dir:
+    description:
+      - the directory holding the entities ids cache
+    required: false
+    default: ~/.ansible/manageiq_cache
+  cache_ttl:
+    description:
+      - the number of seconds an entity id is cached for
+    required: false
+    default: 3600
 '''
 
 EXAMPLES = '''
@@ -77,9 +172,41 @@ EXAMPLES = '''
     miq_url: 'http://localhost:3000'
     miq_username: 'admin'
     miq_password: '******'
+
+# Assign a baseline of policy profiles to hosts
+  manageiq_policy_assignment:
+    entity: 'policy profile'
+    entity_names:
+    - 'host baseline'
+    - 'host compliance'
+    resource_names:
+    - 'host01'
+    - 'host02'
+    resource: 'host'
+    miq_url: 'http://localhost:3000'
+    miq_username: 'admin'
+    miq_password: '******'
+
+# Assign a policy profile to all the container nodes of a provider, and check their compliance
+  manageiq_policy_assignment:
+    entity: 'policy profile'
+    entity_name: 'node compliance'
+    resource_filter:
+    - "ems_id=2"
+    resource: 'container node'
+    check_compliance: true
+    compliance_timeout: 300
+    miq_url: 'http://localhost:3000'
+    miq_username: 'admin'
+    miq_password: '******'
 '''
 
 
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_COMPLIANCE_TIMEOUT = 600
+COMPLIANCE_RESOURCES = ['vm', 'host', 'container node', 'container image']
+
+
 class ManageIQ(object):
     """ ManageIQ object to execute policy assignments in manageiq
 
@@ -101,13 +228,16 @@ class ManageIQ(object):
         'present': 'assign', 'absent': 'unassign'
     }
 
-    def __init__(self, module, url, user, password, miq_verify_ssl, ca_bundle_path):
+    def __init__(self, module, url, user, password, miq_verify_ssl, ca_bundle_path, cache=None, track_targets=False, **client_options):
         self.module        = module
         self.api_url       = url + '/api'
         self.user          = user
         self.password      = password
-        self.client        = MiqApi(self.api_url, (self.user, self.password), verify_ssl=miq_verify_ssl, ca_bundle_path=ca_bundle_path)
+        self.client        = manageiq_client(MiqApi, self.api_url, self.user, self.password, miq_verify_ssl, ca_bundle_path, **client_options)
+        self.lookup        = EntityLookup(self.client, self.api_url, cache=cache)
         self.changed       = False
+        self.targeted      = [] if track_targets else None
+        self.max_concurrency = client_options.get('pool_size', DEFAULT_POOL_SIZE)
 
     def find_entity_by_name(self, entity_type, entity_name):
         """ Searches the entity name in ManageIQ.
@@ -115,24 +245,29 @@ class ManageIQ(object):
         Returns:
             the entity id if it exists in manageiq, None otherwise.
         """
-        entities_list = getattr(self.client.collections, entity_type)
-        return next((e.id for e in entities_list if e.name == entity_name), None)
+        return self.lookup.find_id(entity_type, entity_name)
+
+    def assigned_entity_ids(self, entity_type, resource_type, resource_id):
+        """ Returns the set of the ids of the policies or policy profiles
+        assigned to the resource, requesting their ids only.
+        """
+        url = '{api_url}/{resource_type}/{resource_id}/{entity_type}'.format(api_url=self.api_url, resource_type=resource_type, resource_id=resource_id, entity_type=entity_type)
+        result = self.client.get(url, expand='resources', attributes=projection('resource_policies'))
+        return set(ae['id'] for ae in result.get('resources', []))
 
     def query_resource_policies_or_profiles(self, entity_type, resource_type, resource_id):
-        """ Returns the policies or policy profiles assigned to the resource.
+        """ Returns the set of the ids of the policies or policy profiles
+        assigned to the resource.
         """
         try:
-            url = '{api_url}/{resource_type}/{resource_id}/{entity_type}?expand=resources'.format(api_url=self.api_url, resource_type=resource_type, resource_id=resource_id, entity_type=entity_type)
-            result = self.client.get(url)
-            return result.get('resources', [])
+            return self.assigned_entity_ids(entity_type, resource_type, resource_id)
         except Exception as e:
             self.module.fail_json(msg="Failed to query resource {entity_type}: {error}".format(entity_type=entity_type, error=e))
 
     def entity_assigned(self, entity_type, entity_id, resource_type, resource_id):
-        """Return True if the action is needed on the resource, False otherwise.
+        """Return True if the entity is assigned to the resource, False otherwise.
         """
-        assigned_entities = self.query_resource_policies_or_profiles(entity_type, resource_type, resource_id)
-        return any(ae['id'] == entity_id for ae in assigned_entities)
+        return entity_id in self.query_resource_policies_or_profiles(entity_type, resource_type, resource_id)
 
     def execute_action(self, entity_type, entity_id, resource_type, resource_id, action):
         """Executes the action for the relevant entity on the resource.
@@ -165,15 +300,18 @@ class ManageIQ(object):
         """
         entity_type = self.manageiq_entities[entity]
         resource_type = self.manageiq_entities[resource]
-        entity_id = self.find_entity_by_name(entity_type, entity_name)
+        entity_id, resource_id = run_concurrently(self.client, [
+            partial(self.find_entity_by_name, entity_type, entity_name),
+            partial(self.find_entity_by_name, resource_type, resource_name)
+        ], self.max_concurrency)
         if not entity_id:  # entity doesn't exist
             self.module.fail_json(
                 msg="Failed to {action} {entity}: {entity_name} does not exist in manageiq".format(action=ManageIQ.policy_actions[state], entity=entity, entity_name=entity_name))
 
-        resource_id = self.find_entity_by_name(resource_type, resource_name)
         if not resource_id:  # resource doesn't exist
             self.module.fail_json(
                 msg="Failed to {action} {entity}: {resource_name} {resource} does not exist in manageiq".format(action=ManageIQ.policy_actions[state], entity=entity, resource_name=resource_name, resource=resource))
+        self.track_targets([dict(id=resource_id, name=resource_name)])
 
         assigned = self.entity_assigned(entity_type, entity_id, resource_type, resource_id)
         if assigned and state == 'absent':
@@ -186,14 +324,249 @@ class ManageIQ(object):
             changed=self.changed,
             msg="{entity_name} {entity} already {action}ed".format(entity_name=entity_name, entity=entity, action=ManageIQ.policy_actions[state]))
 
+    def track_targets(self, resources):
+        """ Remembers the resources the action targeted, to check their
+        compliance afterwards, if tracking them.
+
+        resources - a list of dicts of the resources ids and names
+        """
+        if self.targeted is not None:
+            self.targeted.extend(resources)
+
+    def find_entities_by_name(self, entity_type, entity_names):
+        """ Searches the entities names in ManageIQ, listing the collection
+        once when there are many of them.
+
+        Returns:
+            a dict of the entities ids by name, None for the entities that
+            don't exist in manageiq.
+        """
+        if len(set(entity_names)) > 1:
+            self.lookup.load_index(entity_type)
+        return OrderedDict((name, self.find_entity_by_name(entity_type, name)) for name in entity_names)
+
+    def fail_on_missing(self, entity, entity_ids, action):
+        """ Fails the module if any of the entities (policies, profiles or
+        resources) doesn't exist in manageiq.
+        """
+        missing = [name for name, entity_id in entity_ids.items() if not entity_id]
+        if missing:
+            self.module.fail_json(
+                msg="Failed to {action}: {entity} {names} do not exist in manageiq".format(action=action, entity=entity, names=', '.join(missing)))
+
+    def apply_to_resource(self, entity_type, entity_ids, resource_type, resource_id, state):
+        """ Assigns or unassigns the entities on the resource, the ones that
+        need it only, in a single request, reporting a failure instead of
+        failing the module, so that the other resources are still updated.
+
+        entity_ids - the set of the ids of the entities
+
+        Returns:
+            a (changed, error message) tuple.
+        """
+        action = ManageIQ.policy_actions[state]
+        url = '{api_url}/{resource_type}/{resource_id}/{entity_type}'.format(api_url=self.api_url, resource_type=resource_type, resource_id=resource_id, entity_type=entity_type)
+        try:
+            assigned = self.assigned_entity_ids(entity_type, resource_type, resource_id)
+            delta = entity_ids - assigned if state == 'present' else entity_ids & assigned
+            if not delta:
+                return False, None
+            hrefs = [{'href': '{api_url}/{entity_type}/{entity_id}'.format(api_url=self.api_url, entity_type=entity_type, entity_id=entity_id)}
+                     for entity_id in sorted(delta)]
+            results = self.client.post(url, action=action, resources=hrefs)['results']
+        except Exception as e:
+            return False, "Failed to {action}: {error}".format(action=action, error=e)
+        failed = [result['message'] for result in results if not result['success']]
+        if failed:
+            return len(failed) < len(results), "Failed to {action}: {fail_messages}".format(action=action, fail_messages='; '.join(failed))
+        return True, None
+
+    def apply_to_resources(self, entity_type, entity_ids, resource_type, resources, state):
+        """ Assigns or unassigns the entities on the resources concurrently.
+
+        resources - a list of dicts of the resources ids and names
+
+        Returns:
+            the names of the resources updated and the messages of the
+            resources the action failed for.
+        """
+        self.track_targets(resources)
+        outcomes = run_concurrently(self.client, [
+            partial(self.apply_to_resource, entity_type, entity_ids, resource_type, resource['id'], state)
+            for resource in resources], self.max_concurrency)
+        updated, failures = [], []
+        for resource, (changed, error) in zip(resources, outcomes):
+            if changed:
+                self.changed = True
+                updated.append(resource['name'])
+            if error:
+                failures.append("{name}: {error}".format(name=resource['name'], error=error))
+        return updated, failures
+
+    def assign_or_unassign_entities(self, entity, entity_names, resource, resource_names, state):
+        """ Assign or unassign the entities on the manageiq resources, reading
+        the assignments of every resource once and updating each resource in
+        a single request.
+
+        Returns:
+            Whether or not a change took place, a message describing the
+            operation executed and the names of the resources updated.
+        """
+        action = ManageIQ.policy_actions[state]
+        entity_ids, resource_ids = run_concurrently(self.client, [
+            partial(self.find_entities_by_name, self.manageiq_entities[entity], entity_names),
+            partial(self.find_entities_by_name, self.manageiq_entities[resource], resource_names)
+        ], self.max_concurrency)
+        self.fail_on_missing(entity, entity_ids, action)
+        self.fail_on_missing(resource, resource_ids, action)
+        resources = [dict(id=resource_id, name=name) for name, resource_id in resource_ids.items()]
+        updated, failures = self.apply_to_resources(self.manageiq_entities[entity], set(entity_ids.values()),
+                                                    self.manageiq_entities[resource], resources, state)
+        return self.bulk_result(entity, list(entity_ids), self.manageiq_entities[resource], action, len(resources), updated, failures)
+
+    def assign_or_unassign_entity_by_filter(self, entity, entity_names, resource, resource_filter, state, batch_size=DEFAULT_BATCH_SIZE):
+        """ Assign or unassign the entities on the manageiq resources matching
+        all the filter expressions, listing them batch_size at a time and
+        updating the resources of each page concurrently before reading the
+        next one.
+
+        Returns:
+            Whether or not a change took place, a message describing the
+            operation executed and the names of the resources updated.
+        """
+        resource_type = self.manageiq_entities[resource]
+        action = ManageIQ.policy_actions[state]
+        entity_ids = self.find_entities_by_name(self.manageiq_entities[entity], entity_names)
+        self.fail_on_missing(entity, entity_ids, action)
+
+        url = '{api_url}/{resource_type}'.format(api_url=self.api_url, resource_type=resource_type)
+        matched, updated, failures = 0, [], []
+        try:
+            for batch in iter_batches(iter_resources(self.client, url, ['id', 'name'], batch_size,
+                                                     **{'filter[]': resource_filter}), batch_size):
+                matched += len(batch)
+                batch_updated, batch_failures = self.apply_to_resources(self.manageiq_entities[entity], set(entity_ids.values()),
+                                                                        resource_type, batch, state)
+                updated.extend(batch_updated)
+                failures.extend(batch_failures)
+        except Exception as e:
+            self.module.fail_json(msg="Failed to query {resource_type}: {error}".format(resource_type=resource_type, error=e))
+        return self.bulk_result(entity, list(entity_ids), resource_type, action, matched, updated, failures)
+
+    def bulk_result(self, entity, entity_names, resource_type, action, count, updated, failures):
+        """ Returns the result of the action on count resources, failing the
+        module if the action failed for any of them.
+        """
+        if failures:
+            self.module.fail_json(msg="Failed to {action} {entity} on {count} {resource_type}: {failures}".format(
+                action=action, entity=entity, count=len(failures), resource_type=resource_type, failures='; '.join(failures)))
+        if not updated:
+            return dict(
+                changed=self.changed,
+                msg="{entity_names} {entity} already {action}ed on all {count} {resource_type}".format(
+                    entity_names=', '.join(entity_names), entity=entity, action=action, count=count, resource_type=resource_type),
+                updated=[])
+        return dict(
+            changed=self.changed,
+            msg="Successfully {action}ed {entity_names} {entity} on {updated} of {count} {resource_type}".format(
+                action=action, entity_names=', '.join(entity_names), entity=entity, updated=len(updated), count=count,
+                resource_type=resource_type),
+            updated=updated)
+
+    def compliance_state(self, resource_type, resource_id):
+        """ Returns the status and timestamp of the last compliance check of
+        the resource.
+        """
+        url = '{api_url}/{resource_type}/{resource_id}'.format(api_url=self.api_url, resource_type=resource_type, resource_id=resource_id)
+        result = self.client.get(url, attributes=projection('compliance_state'))
+        return dict(compliant=result.get('last_compliance_status'), checked_on=result.get('last_compliance_timestamp'))
+
+    def trigger_compliance_checks(self, resource_type, resources, batch_size=DEFAULT_BATCH_SIZE):
+        """ Triggers the compliance checks of the resources, batch_size
+        resources per request on the collection.
+
+        Returns:
+            the messages of the resources the checks couldn't be triggered for.
+        """
+        url = '{api_url}/{resource_type}'.format(api_url=self.api_url, resource_type=resource_type)
+        failures = []
+        for batch in iter_batches(resources, batch_size):
+            hrefs = [{'href': '{url}/{id}'.format(url=url, id=resource['id'])} for resource in batch]
+            try:
+                results = self.client.post(url, action='check_compliance', resources=hrefs)['results']
+            except Exception as e:
+                self.module.fail_json(msg="Failed to check compliance: {error}".format(error=e))
+            failures.extend("{name}: {message}".format(name=resource['name'], message=result['message'])
+                            for resource, result in zip(batch, results) if not result['success'])
+        return failures
+
+    def check_compliance(self, resource_type, resources, compliance_poller=None, batch_size=DEFAULT_BATCH_SIZE):
+        """ Checks the compliance of the resources and waits for the results,
+        reading the resources still checked concurrently, at most
+        max_concurrency at a time, right away then backing off, until a single
+        deadline for all of them. A resource is checked once the timestamp of
+        its last compliance check changed.
+
+        resources - a list of dicts of the resources ids and names
+
+        Returns:
+            the number of compliant, non compliant and unchecked resources and
+            the outcome of every resource.
+        """
+        compliance_poller = compliance_poller or Poller(timeout=DEFAULT_COMPLIANCE_TIMEOUT)
+        resources = list(OrderedDict((resource['id'], resource) for resource in resources).values())
+        try:
+            baselines = run_concurrently(self.client, [partial(self.compliance_state, resource_type, resource['id'])
+                                                       for resource in resources], self.max_concurrency)
+        except Exception as e:
+            self.module.fail_json(msg="Failed to query {resource_type} compliance: {error}".format(resource_type=resource_type, error=e))
+        failures = self.trigger_compliance_checks(resource_type, resources, batch_size)
+        if failures:
+            self.module.fail_json(msg="Failed to check compliance of {count} {resource_type}: {failures}".format(
+                count=len(failures), resource_type=resource_type, failures='; '.join(failures)))
+
+        outcomes = OrderedDict((resource['id'], dict(name=resource['name'], checked=False, compliant=None, checked_on=None))
+                               for resource in resources)
+        pending = OrderedDict((resource['id'], baseline['checked_on']) for resource, baseline in zip(resources, baselines))
+
+        def check_pending():
+            ids = list(pending)
+
+            def attempt(resource_id):
+                try:
+                    return self.compliance_state(resource_type, resource_id)
+                except Exception:
+                    return None  # read again on the next check
+
+            states = run_concurrently(self.client, [partial(attempt, resource_id) for resource_id in ids], self.max_concurrency)
+            for resource_id, state in zip(ids, states):
+                if state and state['checked_on'] and state['checked_on'] != pending[resource_id]:
+                    outcomes[resource_id].update(state, checked=True)
+                    del pending[resource_id]
+            return not pending, None
+
+        compliance_poller.poll(check_pending)
+        results = list(outcomes.values())
+        return dict(
+            compliant=sum(1 for outcome in results if outcome['checked'] and outcome['compliant']),
+            non_compliant=sum(1 for outcome in results if outcome['checked'] and not outcome['compliant']),
+            unchecked=sum(1 for outcome in results if not outcome['checked']),
+            resources=results)
+
 
 def main():
     module = AnsibleModule(
         argument_spec=dict(
+            manageiq_argument_spec(),
             entity=dict(required=True, type='str',
                         choices=['policy', 'policy profile']),
-            entity_name=dict(required=True, type='str'),
-            resource_name=dict(required=True, type='str'),
+            entity_name=dict(required=False, type='str'),
+            entity_names=dict(required=False, type='list'),
+            resource_name=dict(required=False, type='str'),
+            resource_names=dict(required=False, type='list'),
+            resource_filter=dict(required=False, type='list'),
+            batch_size=dict(required=False, type='int', default=DEFAULT_BATCH_SIZE),
+            check_compliance=dict(required=False, type='bool', default=False),
             resource=dict(required=True, type='str',
                           choices=['provider', 'host', 'vm', 'container node',
                                    'pod', 'replicator', 'container image']),
@@ -204,27 +577,47 @@ def main():
             miq_password=dict(default=os.environ.get('MIQ_PASSWORD', None), no_log=True),
             miq_verify_ssl=dict(require=False, type='bool', default=True),
             ca_bundle_path=dict(required=False, type='str', defualt=None),
-        )
+            **poller_argument_spec('compliance', timeout=DEFAULT_COMPLIANCE_TIMEOUT)
+        ),
+        mutually_exclusive=[['entity_name', 'entity_names'], ['resource_name', 'resource_names', 'resource_filter']],
+        required_one_of=[['entity_name', 'entity_names'], ['resource_name', 'resource_names', 'resource_filter']],
     )
 
     for arg in ['miq_url', 'miq_username', 'miq_password']:
         if module.params[arg] in (None, ''):
             module.fail_json(msg="missing required argument: {}".format(arg))
+    if module.params['check_compliance'] and module.params['resource'] not in COMPLIANCE_RESOURCES:
+        module.fail_json(msg="check_compliance is supported on {resources} resources only".format(resources=', '.join(COMPLIANCE_RESOURCES)))
 
-    miq_url        = module.params['miq_url']
-    miq_username   = module.params['miq_username']
-    miq_password   = module.params['miq_password']
-    entity         = module.params['entity']
-    entity_name    = module.params['entity_name']
-    resource       = module.params['resource']
-    resource_name  = module.params['resource_name']
-    state          = module.params['state']
-    miq_verify_ssl = module.params['miq_verify_ssl']
-    ca_bundle_path = module.params['ca_bundle_path']
+    miq_url          = module.params['miq_url']
+    miq_username     = module.params['miq_username']
+    miq_password     = module.params['miq_password']
+    entity           = module.params['entity']
+    entity_name      = module.params['entity_name']
+    entity_names     = module.params['entity_names']
+    resource         = module.params['resource']
+    resource_name    = module.params['resource_name']
+    resource_names   = module.params['resource_names']
+    resource_filter  = module.params['resource_filter']
+    batch_size       = module.params['batch_size']
+    check_compliance = module.params['check_compliance']
+    state            = module.params['state']
+    miq_verify_ssl   = module.params['miq_verify_ssl']
+    ca_bundle_path   = module.params['ca_bundle_path']
 
-    manageiq = ManageIQ(module, miq_url, miq_username, miq_password, miq_verify_ssl, ca_bundle_path)
-    res_args = manageiq.assign_or_unassign_entity(entity, entity_name, resource, resource_name, state)
+    manageiq = ManageIQ(module, miq_url, miq_username, miq_password, miq_verify_ssl, ca_bundle_path, cache=manageiq_cache(module.params),
+                        track_targets=check_compliance, **manageiq_client_options(module.params))
+    if resource_filter:
+        res_args = manageiq.assign_or_unassign_entity_by_filter(entity, entity_names or [entity_name], resource, resource_filter, state, batch_size)
+    elif entity_names or resource_names:
+        res_args = manageiq.assign_or_unassign_entities(entity, entity_names or [entity_name], resource, resource_names or [resource_name], state)
+    else:
+        res_args = manageiq.assign_or_unassign_entity(entity, entity_name, resource, resource_name, state)
 
+    if check_compliance:
+        res_args['compliance'] = manageiq.check_compliance(ManageIQ.manageiq_entities[resource], manageiq.targeted,
+                                                           poller(module.params, 'compliance'), batch_size)
+    res_args['lookup_stats'] = manageiq.lookup.stats
     module.exit_json(**res_args)
 
 
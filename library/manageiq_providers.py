@@ -0,0 +1,519 @@
+#!/usr/bin/python
+
+import os
+from functools import partial
+from ansible.module_utils.basic import *
+from ansible.module_utils.manageiq_utils import DEFAULT_POOL_SIZE, PooledManageIQClient as MiqApi, manageiq_argument_spec, manageiq_client, manageiq_client_options, run_concurrently
+from ansible.module_utils.manageiq_lookup import EntityLookup
+from ansible.module_utils.manageiq_cache import manageiq_cache
+from ansible.module_utils.manageiq_polling import Poller, poller, poller_argument_spec
+from ansible.module_utils.manageiq_refresh_scheduler import RefreshScheduler
+from ansible.module_utils.manageiq_provider_base import DEFAULT_REFRESH_TIMEOUT, EDIT_MODES, ManageIQProviderBase, PROVIDER_REQUIRED_IF, provider_argument_spec
+
+
+DOCUMENTATION = '''
+---
+module: manageiq_providers
+description: The manageiq_providers module adds, updates and deletes many OpenShift, Amazon EC2 and Hawkular Datawarehouse providers in ManageIQ at once, concurrently.
+short_description: add, update, delete many providers in ManageIQ
+requirements: [ ManageIQ/manageiq-api-client-python ]
+author: Daniel Korn (@dkorn)
+options:
+  miq_url:
+    description:
+      - the manageiq environment url
+    default: MIQ_URL env var if set. otherwise, it is required to pass it
+  miq_username:
+    description:
+      - manageiq username
+    default: MIQ_USERNAME env var if set. otherwise, it is required to pass it
+  miq_password:
+    description:
+      - manageiq password
+    default: MIQ_PASSWORD env var if set. otherwise, it is required to pass it
+  miq_verify_ssl:
+    description:
+      - whether SSL certificates should be verified for HTTPS requests to ManageIQ
+    required: false
+    default: True
+    choices: ['True', 'False']
+  ca_bundle_path:
+    description:
+      - the path to a CA_BUNDLE file or directory with certificates
+    required: false
+    default: null
+  miq_pool_size:
+    description:
+      - the maximal number of connections to manageiq kept alive for reuse, and of calls issued concurrently
+    required: false
+    default: 10
+  miq_token_auth:
+    description:
+      - whether to authenticate once, through /api/auth, and send the X-Auth-Token obtained with the next requests instead of the username and password
+    required: false
+    default: true
+  miq_token_file:
+    description:
+      - a file, readable by the user only, sharing the X-Auth-Tokens between the module processes (e.g. forks and consecutive tasks)
+    required: false
+    default: null
+  cache_mode:
+    description:
+      - whether entities ids looked up by name are cached on disk, to be shared by
+        all the tasks (and forks) running against the same manageiq
+      - On off, ids are always looked up in manageiq
+      - On read, cached ids are used but the cache is left untouched
+      - On readwrite, cached ids are used and ids looked up are cached
+    required: false
+    choices: ['off', 'read', 'readwrite']
+    default: 'off'
+  cache_dir:
+    description:
+      - the directory holding the entities ids cache
+    required: false
+    default: ~/.ansible/manageiq_cache
+  cache_ttl:
+    description:
+      - the number of seconds an entity id is cached for
+    required: false
+    default: 3600
+  providers:
+    description:
+      - the providers, each described by the options of the manageiq_provider module
+    required: true
+    suboptions:
+      name:
+        description:
+          - the provider name in manageiq
+        required: true
+        default: null
+      provider_type:
+        description:
+          - the provider's type
+        required: true
+        choices: ['openshift-origin', 'openshift-enterprise', 'amazon', 'hawkular-datawarehouse']
+      state:
+        description:
+          - the state of the provider
+          - On present, it will add the provider if it does not exist or update the
+            provider if the associated data is different
+          - On absent, it will delete the provider if it exists
+          - On refreshed, it will refresh the inventory of the existing provider, without adding or updating it
+        required: False
+        choices: ['present', 'absent', 'refreshed']
+        default: 'present'
+      zone:
+        description:
+          - the provider zone name in manageiq
+        required: false
+        default: null
+      provider_api_hostname:
+        description:
+          - the provider API hostname
+        required: true
+        default: null
+      provider_api_port:
+        description:
+          - the port used by the provider API
+        required: true
+        default: null
+      provider_api_auth_token:
+        description:
+          - the provider api auth token
+        required: true
+        default: null
+      provider_verify_ssl:
+        description:
+          - whether SSL certificates should be verified for HTTPS requests between
+            ManageIQ and the provider
+        required: false
+        default: True
+        choices: ['True', 'False']
+      provider_ca_path:
+        description:
+          - path to a file with certificate authoritie(s) to trust, in PEM format
+          - to remove a previously defined ca pass null or omit
+        required: false
+        default: null
+      monitoring:
+        description:
+          - type of monitoring endpoint to create, if any
+        required: false
+        default: null
+        choices: ['hawkular', 'prometheus', null]
+      monitoring_hostname:
+        description:
+          - the hostname used for monitoring endpoint
+        required: false
+        default: null
+      monitoring_port:
+        description:
+          - the port used for monitoring endpoint
+        required: false
+        default: null
+      provider_region:
+        description:
+          - the provider region name, required for amazon providers
+        required: false
+        default: null
+      access_key_id:
+        description:
+          - the amazon access key id, required for amazon providers
+        required: false
+        default: null
+      secret_access_key:
+        description:
+          - the amazon secret access key, required for amazon providers
+        required: false
+        default: null
+  validate_provider_auth:
+    description:
+      - disable the provider authentication validation
+    required: false
+    default: true
+  initiate_refresh:
+    description:
+      - disable the provider inventory refresh initiation
+    required: false
+    default: true
+  edit_mode:
+    description:
+      - how an existing provider is updated
+      - On full, all the endpoints are sent, with their credentials, and validated again
+      - On changed, every endpoint is sent, the added ones in full and the others with their changed fields only,
+        with the credentials of the added endpoints and of the endpoints whose hostname, port or SSL settings changed, and only those
+        credentials are validated again. Endpoints removals are sent in full.
+    required: false
+    choices: ['full', 'changed']
+    default: 'full'
+  wait_for_refresh:
+    description:
+      - wait for the provider inventory refresh to complete, that is the provider last refresh date to advance,
+        and fail if the refresh failed
+    required: false
+    default: false
+  refresh_max_in_flight:
+    description:
+      - the maximal number of providers refreshes in flight, the next queued refresh starts as soon as one completes.
+        Refreshes are waited for whenever they are limited. 0 for no limit
+    required: false
+    default: 0
+  refresh_max_per_zone:
+    description:
+      - the maximal number of providers refreshes in flight in any zone, 0 for no limit
+    required: false
+    default: 0
+  validation_interval:
+    description:
+      - the number of seconds to wait before checking the authentication validation again, after checking right away
+    required: false
+    default: 0.5
+  validation_multiplier:
+    description:
+      - the factor the interval between validation checks grows by after every check
+    required: false
+    default: 2
+  validation_max_interval:
+    description:
+      - the maximal number of seconds to wait between validation checks
+    required: false
+    default: 10
+  validation_timeout:
+    description:
+      - the number of seconds after which the authentication validation is reported as timed out
+    required: false
+    default: 50
+  refresh_interval:
+    description:
+      - the number of seconds to wait before checking the inventory refresh again, after checking right away
+    required: false
+    default: 0.5
+  refresh_multiplier:
+    description:
+      - the factor the interval between refresh checks grows by after every check
+    required: false
+    default: 2
+  refresh_max_interval:
+    description:
+      - the maximal number of seconds to wait between refresh checks
+    required: false
+    default: 10
+  refresh_timeout:
+    description:
+      - the number of seconds after which the inventory refresh is reported as timed out
+    required: false
+    default: 600
+'''
+
+EXAMPLES = '''
+# Add an Openshift Containers Provider and an Amazon EC2 Cloud provider to ManageIQ
+  manageiq_providers:
+    providers:
+    - name: 'Openshift01'
+      provider_type: 'openshift-enterprise'
+      provider_api_hostname: 'oshift01.redhat.com'
+      provider_api_port: '8443'
+      provider_api_auth_token: '******'
+      provider_verify_ssl: false
+    - name: 'AWS01'
+      provider_type: 'amazon'
+      provider_region: 'us-west-2'
+      access_key_id: '******'
+      secret_access_key: '******'
+    miq_url: 'http://miq.example.com'
+    miq_username: 'admin'
+    miq_password: '******'
+    miq_verify_ssl: false
+'''
+
+
+class ProviderFailed(Exception):
+    pass
+
+
+class ProviderModule(object):
+    """ Stands for the AnsibleModule in the operations on a single provider
+    of the list, failing that provider only.
+    """
+
+    def __init__(self, module):
+        self.module = module
+
+    def fail_json(self, msg, **kwargs):
+        raise ProviderFailed(msg)
+
+    def __getattr__(self, name):
+        return getattr(self.module, name)
+
+
+class ManageIQProviders(object):
+    """ ManageIQ object to add, update, delete and refresh many providers in
+    manageiq, concurrently.
+
+    url            - manageiq environment url
+    user           - the username in manageiq
+    password       - the user password in manageiq
+    miq_verify_ssl - whether SSL certificates should be verified for HTTPS requests
+    ca_bundle_path - the path to a CA_BUNDLE file or directory with certificates
+    """
+
+    def __init__(self, module, url, user, password, miq_verify_ssl, ca_bundle_path, cache=None, **client_options):
+        self.module          = module
+        self.api_url         = url + '/api'
+        self.user            = user
+        self.password        = password
+        self.client          = manageiq_client(MiqApi, self.api_url, self.user, self.password, miq_verify_ssl, ca_bundle_path, **client_options)
+        self.lookup          = EntityLookup(self.client, self.api_url, cache=cache)
+        self.max_concurrency = client_options.get('pool_size', DEFAULT_POOL_SIZE)
+
+    def provider_manager(self):
+        """ Returns a ManageIQProviderBase for the operations on a single
+        provider, sharing the client and the lookup. The operations on the
+        providers run concurrently, each one issues its own calls in turn.
+        """
+        return ManageIQProviderBase(ProviderModule(self.module), self.client, self.api_url, self.lookup, max_concurrency=1)
+
+    def run_each(self, calls):
+        """ Runs the calls, one per provider, concurrently. A call failing
+        fails its own provider only.
+
+        Returns:
+            a list of (result, error message) tuples, in order.
+        """
+        def attempt(call):
+            try:
+                return call(), None
+            except ProviderFailed as e:
+                return None, str(e)
+            except Exception as e:
+                return None, "Error: {!r}".format(e)
+        return run_concurrently(self.client, [partial(attempt, call) for call in calls], self.max_concurrency)
+
+    def validate_providers(self, managers, submissions, validation_poller=None):
+        """ Polls the authentication validations of all the submitted
+        providers together, until all of them completed or the deadline.
+
+        Returns:
+            a dict of (result, details) tuples (see verify_authenticaion_validation)
+            or error messages, by index of the submission.
+        """
+        validations = {}
+        pending = dict(submissions)
+
+        def check_all():
+            indices = list(pending)
+            checks = self.run_each([partial(managers[i].validation_check, pending[i]['provider_id'],
+                                            pending[i]['old_validation_details'], pending[i]['authtypes_to_verify'])
+                                    for i in indices])
+            for i, (check, error) in zip(indices, checks):
+                if error:
+                    validations[i] = error
+                    del pending[i]
+                else:
+                    done, (result, details) = check
+                    validations[i] = (result, details) if done else ("Timed out", details)
+                    if done:
+                        del pending[i]
+            return not pending, None
+
+        (validation_poller or Poller()).poll(check_all)
+        return validations
+
+    def wait_for_refreshes(self, managers, providers, results, refresh_poller=None, max_in_flight=0, max_per_zone=0):
+        """ Runs the queued refreshes of all the providers with a
+        RefreshScheduler, at most max_in_flight at a time and max_per_zone
+        at a time in any zone, polling them together until all of them
+        completed or the deadline, and reports their outcomes in the
+        providers results (see report_refresh).
+        """
+        scheduler = RefreshScheduler(self.client, max_in_flight, max_per_zone, refresh_poller, self.max_concurrency)
+        for i, result in enumerate(results):
+            if not result.get('failed') and 'refresh' in result:
+                scheduler.add(i, providers[i]['zone'] or 'default',
+                              partial(managers[i].start_refresh, result['provider_id']),
+                              partial(managers[i].refresh_check, result['provider_id']))
+
+        for i, outcome in scheduler.run().items():
+            if 'error' in outcome:
+                error = outcome['error']
+                results[i] = dict(failed=True, msg=str(error) if isinstance(error, ProviderFailed) else "Error: {!r}".format(error))
+                continue
+            refresh = outcome['refresh']
+            if refresh['state'] != 'Queued':
+                refresh = managers[i].refresh_outcome(refresh, outcome['done'], outcome['state'], outcome['duration'])
+            try:
+                results[i] = managers[i].report_refresh(providers[i]['name'], results[i], refresh)
+            except ProviderFailed as e:
+                results[i] = dict(results[i], failed=True, msg=str(e), refresh=refresh)
+
+    def add_update_or_delete_providers(self, providers, validate_provider_auth=True, initiate_refresh=True,
+                                       validation_poller=None, edit_mode='full', wait_for_refresh=False,
+                                       refresh_poller=None, refresh_max_in_flight=0, refresh_max_per_zone=0):
+        """ Adds, updates, deletes or refreshes the providers, each one a dict
+        of the manageiq_provider module options. The providers are first
+        submitted, then their authentication validations are polled together,
+        and the valid ones are refreshed. With wait_for_refresh, or limits to
+        the refreshes in flight, the refreshes are queued and then released by
+        a RefreshScheduler, which polls them together.
+
+        Returns:
+            whether or not a change took place, a short message and the
+            per provider results, which are those of manageiq_provider plus
+            the provider name and whether it failed.
+        """
+        # a single listing of the providers (and zones) answers all the lookups
+        run_concurrently(self.client, [partial(self.lookup.load_index, 'providers'),
+                                       partial(self.lookup.load_index, 'zones')], self.max_concurrency)
+        managers = [self.provider_manager() for _ in providers]
+        results = [None] * len(providers)
+        queue_refresh = bool(wait_for_refresh or refresh_max_in_flight or refresh_max_per_zone)
+
+        def submit(manager, provider):
+            if provider['state'] == 'absent':
+                return manager.delete_provider(provider['name'])
+            if provider['state'] == 'refreshed':
+                return manager.refresh_existing_provider(provider['name'], queue_refresh=queue_refresh)
+            return manager.submit_provider(provider['name'], provider['provider_type'],
+                                           manager.generate_endpoints(provider),
+                                           provider['zone'], provider['provider_region'], edit_mode)
+
+        submitted = self.run_each([partial(submit, manager, provider) for manager, provider in zip(managers, providers)])
+        submissions = {}
+        for i, (submission, error) in enumerate(submitted):
+            if error:
+                results[i] = dict(failed=True, msg=error)
+            elif providers[i]['state'] in ('absent', 'refreshed'):
+                results[i] = submission
+            elif not submission['operation']:
+                results[i] = dict(msg="Provider %s already exists" % providers[i]['name'])
+            else:
+                submissions[i] = submission
+
+        if validate_provider_auth:
+            validations = self.validate_providers(managers, submissions, validation_poller)
+        else:
+            validations = dict((i, ("Skipped Validation", "Skipped Validation")) for i in submissions)
+
+        completions = [i for i in submissions if not isinstance(validations[i], str)]
+        for i in submissions:
+            if i not in completions:
+                results[i] = dict(failed=True, msg=validations[i])
+        outcomes = self.run_each([partial(managers[i].complete_provider, providers[i]['name'], submissions[i],
+                                          validations[i][0], validations[i][1], initiate_refresh,
+                                          queue_refresh=queue_refresh)
+                                  for i in completions])
+        for i, (outcome, error) in zip(completions, outcomes):
+            results[i] = dict(failed=True, msg=error) if error else outcome
+
+        if queue_refresh:
+            self.wait_for_refreshes(managers, providers, results, refresh_poller,
+                                    refresh_max_in_flight, refresh_max_per_zone)
+
+        for i, (provider, manager) in enumerate(zip(providers, managers)):
+            results[i].update(name=provider['name'], changed=manager.changed)
+            results[i].setdefault('failed', False)
+        failed = [result['name'] for result in results if result['failed']]
+        if failed:
+            message = "Failed to manage {count} of {total} providers: {names}".format(count=len(failed), total=len(results), names=', '.join(failed))
+        else:
+            message = "Successfully managed {total} providers".format(total=len(results))
+        return dict(
+            changed=any(result['changed'] for result in results),
+            failed=bool(failed),
+            msg=message,
+            results=results
+        )
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            manageiq_argument_spec(),
+            providers=dict(required=True, type='list', elements='dict',
+                           options=provider_argument_spec(), required_if=PROVIDER_REQUIRED_IF),
+            miq_url=dict(default=os.environ.get('MIQ_URL', None)),
+            miq_username=dict(default=os.environ.get('MIQ_USERNAME', None)),
+            miq_password=dict(default=os.environ.get('MIQ_PASSWORD', None), no_log=True),
+            miq_verify_ssl=dict(require=False, type='bool', default=True),
+            ca_bundle_path=dict(required=False, type='str', defualt=None),
+            initiate_refresh=dict(required=False, type='bool', default=True),
+            validate_provider_auth=dict(required=False, type='bool', default=True),
+            edit_mode=dict(required=False, type='str', default='full', choices=EDIT_MODES),
+            wait_for_refresh=dict(required=False, type='bool', default=False),
+            refresh_max_in_flight=dict(required=False, type='int', default=0),
+            refresh_max_per_zone=dict(required=False, type='int', default=0),
+            **dict(poller_argument_spec('validation'), **poller_argument_spec('refresh', timeout=DEFAULT_REFRESH_TIMEOUT))
+        ),
+    )
+
+    for arg in ['miq_url', 'miq_username', 'miq_password']:
+        if module.params[arg] in (None, ''):
+            module.fail_json(msg="missing required argument: {}".format(arg))
+
+    miq_url                = module.params['miq_url']
+    miq_username           = module.params['miq_username']
+    miq_password           = module.params['miq_password']
+    miq_verify_ssl         = module.params['miq_verify_ssl']
+    ca_bundle_path         = module.params['ca_bundle_path']
+    providers              = module.params['providers']
+    validate_provider_auth = module.params['validate_provider_auth']
+    initiate_refresh       = module.params['initiate_refresh']
+    edit_mode              = module.params['edit_mode']
+    wait_for_refresh       = module.params['wait_for_refresh']
+    refresh_max_in_flight  = module.params['refresh_max_in_flight']
+    refresh_max_per_zone   = module.params['refresh_max_per_zone']
+
+    manageiq = ManageIQProviders(module, miq_url, miq_username, miq_password, miq_verify_ssl, ca_bundle_path, cache=manageiq_cache(module.params), **manageiq_client_options(module.params))
+    res_args = manageiq.add_update_or_delete_providers(providers, validate_provider_auth, initiate_refresh,
+                                                       poller(module.params, 'validation'), edit_mode,
+                                                       wait_for_refresh, poller(module.params, 'refresh'),
+                                                       refresh_max_in_flight, refresh_max_per_zone)
+    res_args['lookup_stats'] = manageiq.lookup.stats
+
+    if res_args['failed']:
+        module.fail_json(**res_args)
+    module.exit_json(**res_args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
 #!/usr/bin/python
 
 import os
+from collections import OrderedDict
 from ansible.module_utils.basic import *
-from manageiq_client.api import ManageIQClient as MiqApi
+from manageiq_client.api import APIException
+from manageiq_client.filters import gen_filter
+from manageiq_client.utils import unicode_process
+from ansible.module_utils.manageiq_utils import PooledManageIQClient as MiqApi, manageiq_argument_spec, manageiq_client, manageiq_client_options
+from ansible.module_utils.manageiq_lookup import EntityLookup
+from ansible.module_utils.manageiq_cache import manageiq_cache
+from ansible.module_utils.manageiq_paging import DEFAULT_PAGE_SIZE, iter_batches, iter_resources
+from ansible.module_utils.manageiq_projections import PROJECTIONS, projection
 
 
 DOCUMENTATION = '''
@@ -40,8 +48,34 @@ options:
   resource_name:
     description:
       - the relevant resource name in manageiq
-    required: true
+      - one of resource_name, resource_names or resource_filter is required
+    required: false
+    default: null
+  resource_names:
+    description:
+      - the names of the resources, all of them tagged in the same run, through bulk actions
+      - one of resource_name, resource_names or resource_filter is required
+    required: false
+    default: null
+  resource_filter:
+    description:
+      - manageiq filter expressions (e.g. "name='prod%'", "ems_id=3"), all of which the resources to tag match
+      - the matching resources are listed page by page and tagged through bulk actions as pages arrive
+      - one of resource_name, resource_names or resource_filter is required
+    required: false
     default: null
+  batch_size:
+    description:
+      - the maximal number of resources in a single bulk action, when tagging resource_names or resource_filter
+    required: false
+    default: 100
+  exclusive:
+    description:
+      - On present, whether the tags listed are the only tags left assigned in their categories
+      - the other tags of these categories are unassigned, except in single_value categories a tag is assigned in,
+        where manageiq replaces them
+    required: false
+    default: false
   state:
     description:
       - On present, it will assign the tag on the resource, if not already assigned
@@ -60,6 +94,41 @@ options:
       - the path to a CA_BUNDLE file or directory with certificates
     required: false
     default: null
+  miq_pool_size:
+    description:
+      - the maximal number of connections to manageiq kept alive for reuse, and of calls issued concurrently
+    required: false
+    default: 10
+  miq_token_auth:
+    description:
+      - whether to authenticate once, through /api/auth, and send the X-Auth-Token obtained with the next requests instead of the username and password
+    required: false
+    default: true
+  miq_token_file:
+    description:
+      - a file, readable by the user only, sharing the X-Auth-Tokens between the module processes (e.g. forks and consecutive tasks)
+    required: false
+    default: null
+  cache_mode:
+    description:
+      - whether entities ids looked up by name are cached on disk, to be shared by
+        all the tasks (and forks) running against the same manageiq
+      - On off, ids are always looked up in manageiq
+      - On read, cached ids are used but the cache is left untouched
+      - On readwrite, cached ids are used and ids looked up are cached
+    required: false
+    choices: ['off', 'read', 'readwrite']
+    default: 'off'
+  cache_dir:
+    description:
+      - the directory holding the entities ids cache
+    required: false
+    default: ~/.ansible/manageiq_cache
+  cache_ttl:
+    description:
+      - the number of seconds an entity id is cached for
+    required: false
+    default: 3600
 '''
 
 EXAMPLES = '''
@@ -76,9 +145,52 @@ EXAMPLES = '''
     miq_url: 'http://localhost:3000'
     miq_username: 'admin'
     miq_password: '******'
+
+# Make prod the only environment of a provider
+  manageiq_tag_assignment:
+    tags:
+    - category: environment
+      name: prod
+    exclusive: true
+    resource_name: 'OpenShift01'
+    resource: 'provider'
+    miq_url: 'http://localhost:3000'
+    miq_username: 'admin'
+    miq_password: '******'
+
+# Assign tags on many vms at once, 500 vms per request
+  manageiq_tag_assignment:
+    tags:
+    - category: environment
+      name: prod
+    resource_names: "{{ prod_vms }}"
+    resource: 'vm'
+    batch_size: 500
+    miq_url: 'http://localhost:3000'
+    miq_username: 'admin'
+    miq_password: '******'
+
+# Assign tags on all the vms of a provider whose names start with web
+  manageiq_tag_assignment:
+    tags:
+    - category: department
+      name: web
+    resource_filter:
+    - "ems_id=3"
+    - "name='web%'"
+    resource: 'vm'
+    miq_url: 'http://localhost:3000'
+    miq_username: 'admin'
+    miq_password: '******'
 '''
 
 
+DEFAULT_BATCH_SIZE = 100
+# The number of names looked up in a single filtered listing, keeping the
+# url of the request short.
+NAME_FILTER_CHUNK = 50
+
+
 class ManageIQTagAssignment(object):
     """ ManageIQ object to execute tag assignments in manageiq
 
@@ -98,12 +210,15 @@ class ManageIQTagAssignment(object):
     }
     actions = {'present': 'assign', 'absent': 'unassign'}
 
-    def __init__(self, module, url, user, password, miq_verify_ssl, ca_bundle_path):
+    def __init__(self, module, url, user, password, miq_verify_ssl, ca_bundle_path, cache=None, **client_options):
         self.module   = module
         self.api_url  = url + '/api'
         self.user     = user
         self.password = password
-        self.client   = MiqApi(self.api_url, (self.user, self.password), verify_ssl=miq_verify_ssl, ca_bundle_path=ca_bundle_path)
+        self.client   = manageiq_client(MiqApi, self.api_url, self.user, self.password, miq_verify_ssl, ca_bundle_path, **client_options)
+        self.lookup   = EntityLookup(self.client, self.api_url, cache=cache)
+        self.cache    = cache
+        self.catalog  = None
         self.changed  = False
 
     def find_entity_by_name(self, entity_type, entity_name):
@@ -112,15 +227,14 @@ class ManageIQTagAssignment(object):
         Returns:
             the entity id if it exists in manageiq, None otherwise.
         """
-        entities_list = getattr(self.client.collections, entity_type)
-        return next((e.id for e in entities_list if e.name == entity_name), None)
+        return self.lookup.find_id(entity_type, entity_name)
 
     def query_resource_tags(self, resource_type, resource_id):
         """ Returns a set of the full tag names assigned to the resource
         """
         try:
-            url = '{api_url}/{resource_type}/{resource_id}/tags?expand=resources'.format(api_url=self.api_url, resource_type=resource_type, resource_id=resource_id)
-            response = self.client.get(url)
+            url = '{api_url}/{resource_type}/{resource_id}/tags'.format(api_url=self.api_url, resource_type=resource_type, resource_id=resource_id)
+            response = self.client.get(url, expand='resources', attributes=projection('resource_tags'))
         except Exception as e:
             self.module.fail_json(msg="Failed to query {resource_type} tags: {error}".format(resource_type=resource_type, error=e))
         tags = response.get('resources', [])
@@ -147,13 +261,209 @@ class ManageIQTagAssignment(object):
         full_tag_name = '/managed/{category_name}/{tag_name}'.format(category_name=tag['category'], tag_name=tag['name'])
         return full_tag_name
 
-    def assign_or_unassign_tag(self, tags, resource, resource_name, state):
+    def tags_delta(self, tags, assigned_tags, state):
+        """ Returns the tags to assign and the tags to unassign on a resource
+        given the full names of the tags assigned to it.
+        """
+        if state == 'present':
+            return [tag for tag in tags if self.full_tag_name(tag) not in assigned_tags], []
+        return [], [tag for tag in tags if self.full_tag_name(tag) in assigned_tags]
+
+    def exclusive_tags_delta(self, tags, assigned_tags, single_value_categories):
+        """ Returns the tags to assign and the tags to unassign on a resource,
+        given the full names of the tags assigned to it, for the tags to be
+        the only ones assigned in their categories. The other tags of a
+        single_value category a tag is assigned in aren't unassigned, manageiq
+        replaces them.
+        """
+        wanted = set(self.full_tag_name(tag) for tag in tags)
+        categories = set(tag['category'] for tag in tags)
+        to_assign = [tag for tag in tags if self.full_tag_name(tag) not in assigned_tags]
+        replaced = set(tag['category'] for tag in to_assign) & single_value_categories
+        to_unassign = []
+        for full_name in sorted(assigned_tags - wanted):
+            parts = full_name.split('/', 3)
+            if len(parts) == 4 and parts[1] == 'managed' and parts[2] in categories and parts[2] not in replaced:
+                to_unassign.append(dict(category=parts[2], name=parts[3]))
+        return to_assign, to_unassign
+
+    def query_tag_catalog(self):
+        """ Lists the categories, requesting only their names, single_value
+        flags and tags.
+
+        Returns:
+            a dict of the categories by name, each one a dict of its
+            single_value flag and sorted list of tag names.
+        """
+        url = '{api_url}/categories'.format(api_url=self.api_url)
+        catalog = {}
+        try:
+            for category in iter_resources(self.client, url, PROJECTIONS['tag_catalog'], DEFAULT_PAGE_SIZE):
+                catalog[category['name']] = dict(
+                    single_value=bool(category.get('single_value')),
+                    tags=sorted(tag['name'].rsplit('/', 1)[-1] for tag in category.get('tags') or []))
+        except Exception as e:
+            self.module.fail_json(msg="Failed to query categories: {error}".format(error=e))
+        return catalog
+
+    def tag_catalog(self, refresh=False):
+        """ Returns the tag names and single_value flag of every category,
+        as sets, read once per run and shared with the other runs through the
+        persistent cache, until its ttl expires.
+
+        refresh - whether to read the catalog again from manageiq
+        """
+        if self.catalog is None or refresh:
+            catalog = None if refresh or not self.cache else self.cache.get_document('tag_catalog')
+            if catalog is None:
+                catalog = self.query_tag_catalog()
+                if self.cache:
+                    self.cache.put_document('tag_catalog', catalog)
+            self.catalog = {name: dict(single_value=category['single_value'], tags=set(category['tags']))
+                            for name, category in catalog.items()}
+        return self.catalog
+
+    def unknown_tags(self, tags, catalog):
+        """ Returns the category/name of the tags missing from the catalog.
+        """
+        return ['{category}/{name}'.format(category=tag['category'], name=tag['name']) for tag in tags
+                if tag['name'] not in catalog.get(tag['category'], {}).get('tags', ())]
+
+    def validate_tags(self, tags, action):
+        """ Fails the module, before any write, if any of the tags doesn't
+        exist in manageiq. A cached catalog missing some of the tags is read
+        again first, in case they were created since.
+        """
+        unknown = self.unknown_tags(tags, self.tag_catalog())
+        if unknown and self.cache:
+            unknown = self.unknown_tags(tags, self.tag_catalog(refresh=True))
+        if unknown:
+            self.module.fail_json(msg="Failed to {action} tags: unknown tags {tags}".format(
+                action=action, tags=', '.join(unknown)))
+
+    def tags_delta_function(self, tags, state, exclusive=False):
+        """ Returns the function of the full names of the tags assigned to a
+        resource returning the tags to assign and the tags to unassign on it.
+        """
+        if not (exclusive and state == 'present'):
+            return lambda assigned_tags: self.tags_delta(tags, assigned_tags, state)
+        single_value_categories = set(name for name, category in self.tag_catalog().items() if category['single_value'])
+        return lambda assigned_tags: self.exclusive_tags_delta(tags, assigned_tags, single_value_categories)
+
+    def query_resources_tags(self, resource_type, resource_names):
+        """ Lists the named resources only, with their ids, names and tags,
+        filtering the collection by NAME_FILTER_CHUNK names at a time. When
+        manageiq rejects the filter, the resources are looked up by name and
+        their tags read one resource at a time.
+
+        Returns:
+            a dict of the named resources found, by name, each one a dict of
+            its id, name and set of full tag names.
+        """
+        url = '{api_url}/{resource_type}'.format(api_url=self.api_url, resource_type=resource_type)
+        names = list(OrderedDict.fromkeys(unicode_process(name) for name in resource_names))
+        resources = {}
+        try:
+            for chunk in iter_batches(names, NAME_FILTER_CHUNK):
+                name_filter = [gen_filter('name', '=', name, is_or=i > 0) for i, name in enumerate(chunk)]
+                try:
+                    listed = list(iter_resources(self.client, url, PROJECTIONS['resources_tags'], DEFAULT_PAGE_SIZE,
+                                                 **{'filter[]': name_filter}))
+                except APIException:
+                    listed = self.query_resources_tags_by_id(resource_type, chunk)
+                for resource in listed:
+                    # '%' and '*' in a filter value are wildcards, keep exact matches only
+                    name = resource.get('name') and unicode_process(resource['name'])
+                    if name in chunk and name not in resources:
+                        resources[name] = self.tagged_resource(resource)
+        except Exception as e:
+            self.module.fail_json(msg="Failed to query {resource_type} tags: {error}".format(resource_type=resource_type, error=e))
+        return resources
+
+    def query_resources_tags_by_id(self, resource_type, resource_names):
+        """ Looks the named resources up, then reads the tags of the ones
+        found.
+
+        Returns:
+            a list of the resources found, as listed with their tags.
+        """
+        resources = []
+        for name in resource_names:
+            resource_id = self.lookup.find_id(resource_type, name)
+            if resource_id:
+                url = '{api_url}/{resource_type}/{resource_id}'.format(api_url=self.api_url, resource_type=resource_type, resource_id=resource_id)
+                resources.append(dict(self.client.get(url, attributes=projection('resources_tags')), id=resource_id, name=name))
+        return resources
+
+    def tagged_resource(self, resource):
+        """ Returns the id, name and set of full tag names of a resource
+        listed with its tags.
+        """
+        return dict(id=resource['id'], name=resource.get('name'),
+                    tags=set(tag['name'] for tag in resource.get('tags') or []))
+
+    def execute_bulk_action(self, resource_type, resources, action):
+        """ Executes the action (assign or unassign) of the tags of all the
+        resources in a single request on the collection.
+
+        resources - a list of dicts of the resource href and its tags
+
+        Returns:
+            a list of the messages of the resources the action failed for.
+        """
+        url = '{api_url}/{resource_type}'.format(api_url=self.api_url, resource_type=resource_type)
+        try:
+            response = self.client.post(url, action='{action}_tags'.format(action=action), resources=resources)
+        except Exception as e:
+            self.module.fail_json(msg="Failed to {action} tags: {error}".format(action=action, error=e))
+        failures = []
+        for resource, result in zip(resources, response['results']):
+            if result['success']:
+                self.changed = True
+            else:
+                failures.append("{href}: {message}".format(href=resource['href'], message=result['message']))
+        return failures
+
+    def execute_bulk_actions(self, resource_type, resources, tags, state, batch_size=DEFAULT_BATCH_SIZE, exclusive=False):
+        """ Assigns or unassigns the tags on the resources that need it, in
+        bulk actions of at most batch_size resources each, posting every
+        batch as soon as it is full.
+
+        resources - an iterable of dicts of the resource id, name and set of
+                    full tag names, e.g. listed page by page
+
+        Returns:
+            the names of the resources updated and the messages of the
+            resources the actions failed for.
+        """
+        tags_delta = self.tags_delta_function(tags, state, exclusive)
+        updated = OrderedDict()
+        failures = []
+        pending = {'assign': [], 'unassign': []}
+        for resource in resources:
+            to_assign, to_unassign = tags_delta(resource['tags'])
+            href = '{api_url}/{resource_type}/{id}'.format(api_url=self.api_url, resource_type=resource_type, id=resource['id'])
+            for action, delta in (('unassign', to_unassign), ('assign', to_assign)):
+                if not delta:
+                    continue
+                updated[resource['name']] = True
+                pending[action].append(dict(href=href, tags=delta))
+                if len(pending[action]) >= batch_size:
+                    failures.extend(self.execute_bulk_action(resource_type, pending[action], action))
+                    pending[action] = []
+        for action in ('unassign', 'assign'):
+            if pending[action]:
+                failures.extend(self.execute_bulk_action(resource_type, pending[action], action))
+        return list(updated), failures
+
+    def assign_or_unassign_tag(self, tags, resource, resource_name, state, exclusive=False):
         """ Assign or unassign the tag on a manageiq resource.
 
         Returns:
             Whether or not a change took place and a message describing the
             operation executed.
         """
+        self.validate_tags(tags, ManageIQTagAssignment.actions[state])
         resource_type = self.manageiq_entities[resource]
         resource_id = self.find_entity_by_name(resource_type, resource_name)
         if not resource_id:  # resource doesn't exist
@@ -162,32 +472,110 @@ class ManageIQTagAssignment(object):
                     action=ManageIQTagAssignment.actions[state],
                     resource_name=resource_name, resource=resource))
 
-        tags_to_execute = []
         assigned_tags = self.query_resource_tags(resource_type, resource_id)
-        for tag in tags:
-            assigned = self.full_tag_name(tag) in assigned_tags
-
-            if assigned and state == 'absent':
-                tags_to_execute.append(tag)
-            elif (not assigned) and state == 'present':
-                tags_to_execute.append(tag)
+        to_assign, to_unassign = self.tags_delta_function(tags, state, exclusive)(assigned_tags)
+        if to_unassign and to_assign:
+            self.execute_action(resource_type, resource_id, to_unassign, 'unassign')
+            self.execute_action(resource_type, resource_id, to_assign, 'assign')
+            return dict(
+                changed=self.changed,
+                msg="Successfully assigned {assigned} and unassigned {unassigned} tags".format(
+                    assigned=len(to_assign), unassigned=len(to_unassign)))
 
+        tags_to_execute = to_assign or to_unassign
         if not tags_to_execute:
             return dict(
                 changed=self.changed,
                 msg="Tags already {action}ed, nothing to do".format(action=ManageIQTagAssignment.actions[state]))
         else:
-            self.execute_action(resource_type, resource_id, tags_to_execute, ManageIQTagAssignment.actions[state])
+            action = 'assign' if to_assign else 'unassign'
+            self.execute_action(resource_type, resource_id, tags_to_execute, action)
+            return dict(
+                changed=self.changed,
+                msg="Successfully {action}ed tags".format(action=action))
+
+    def assign_or_unassign_tags(self, tags, resource, resource_names, state, batch_size=DEFAULT_BATCH_SIZE, exclusive=False):
+        """ Assign or unassign the tags on many manageiq resources, reading
+        the named resources and their tags only (see query_resources_tags)
+        and updating them through bulk actions of at most batch_size
+        resources.
+
+        Returns:
+            Whether or not a change took place, a message describing the
+            operation executed and the names of the resources updated.
+        """
+        resource_type = self.manageiq_entities[resource]
+        action = ManageIQTagAssignment.actions[state]
+        self.validate_tags(tags, action)
+        resources = self.query_resources_tags(resource_type, resource_names)
+        missing = [name for name in resource_names if unicode_process(name) not in resources]
+        if missing:
+            self.module.fail_json(
+                msg="Failed to {action} tags: {resource} {names} do not exist in manageiq".format(
+                    action=action, resource=resource, names=', '.join(missing)))
+
+        named = [resources[name] for name in OrderedDict.fromkeys(unicode_process(name) for name in resource_names)]
+        updated, failures = self.execute_bulk_actions(resource_type, named, tags, state, batch_size, exclusive)
+        return self.bulk_result(resource_type, action, len(named), updated, failures)
+
+    def assign_or_unassign_tags_by_filter(self, tags, resource, resource_filter, state, batch_size=DEFAULT_BATCH_SIZE, exclusive=False):
+        """ Assign or unassign the tags on the manageiq resources matching
+        all the filter expressions, listing them (and their tags) batch_size
+        at a time and updating each page through bulk actions before reading
+        the next one.
+
+        Returns:
+            Whether or not a change took place, a message describing the
+            operation executed and the names of the resources updated.
+        """
+        resource_type = self.manageiq_entities[resource]
+        action = ManageIQTagAssignment.actions[state]
+        self.validate_tags(tags, action)
+        url = '{api_url}/{resource_type}'.format(api_url=self.api_url, resource_type=resource_type)
+        matched = [0]
+
+        def matching():
+            try:
+                for resource in iter_resources(self.client, url, PROJECTIONS['resources_tags'], batch_size,
+                                               **{'filter[]': resource_filter}):
+                    matched[0] += 1
+                    yield self.tagged_resource(resource)
+            except Exception as e:
+                self.module.fail_json(msg="Failed to query {resource_type} tags: {error}".format(resource_type=resource_type, error=e))
+
+        updated, failures = self.execute_bulk_actions(resource_type, matching(), tags, state, batch_size, exclusive)
+        return self.bulk_result(resource_type, action, matched[0], updated, failures)
+
+    def bulk_result(self, resource_type, action, count, updated, failures):
+        """ Returns the result of the bulk actions on count resources, failing
+        the module if the action failed for any of them.
+        """
+        if failures:
+            self.module.fail_json(msg="Failed to {action} tags on {count} {resource_type}: {failures}".format(
+                action=action, count=len(failures), resource_type=resource_type, failures='; '.join(failures)))
+        if not updated:
             return dict(
                 changed=self.changed,
-                msg="Successfully {action}ed tags".format(action=ManageIQTagAssignment.actions[state]))
+                msg="Tags already {action}ed on all {count} {resource_type}, nothing to do".format(
+                    action=action, count=count, resource_type=resource_type),
+                updated=[])
+        return dict(
+            changed=self.changed,
+            msg="Successfully {action}ed tags on {updated} of {count} {resource_type}".format(
+                action=action, updated=len(updated), count=count, resource_type=resource_type),
+            updated=updated)
 
 
 def main():
     module = AnsibleModule(
         argument_spec=dict(
+            manageiq_argument_spec(),
             tags=dict(required=True, type='list'),
-            resource_name=dict(required=True, type='str'),
+            resource_name=dict(required=False, type='str'),
+            resource_names=dict(required=False, type='list'),
+            resource_filter=dict(required=False, type='list'),
+            batch_size=dict(required=False, type='int', default=DEFAULT_BATCH_SIZE),
+            exclusive=dict(required=False, type='bool', default=False),
             resource=dict(required=True, type='str',
                           choices=['provider', 'host', 'vm', 'blueprint', 'category',
                                    'cluster', 'data store', 'group', 'resource pool',
@@ -200,26 +588,38 @@ def main():
             miq_password=dict(default=os.environ.get('MIQ_PASSWORD', None), no_log=True),
             miq_verify_ssl=dict(require=False, type='bool', default=True),
             ca_bundle_path=dict(required=False, type='str', defualt=None),
-        )
+        ),
+        mutually_exclusive=[['resource_name', 'resource_names', 'resource_filter']],
+        required_one_of=[['resource_name', 'resource_names', 'resource_filter']],
     )
 
     for arg in ['miq_url', 'miq_username', 'miq_password']:
         if module.params[arg] in (None, ''):
             module.fail_json(msg="missing required argument: {}".format(arg))
 
-    miq_url        = module.params['miq_url']
-    miq_username   = module.params['miq_username']
-    miq_password   = module.params['miq_password']
-    tags           = module.params['tags']
-    resource       = module.params['resource']
-    resource_name  = module.params['resource_name']
-    state          = module.params['state']
-    miq_verify_ssl = module.params['miq_verify_ssl']
-    ca_bundle_path = module.params['ca_bundle_path']
+    miq_url         = module.params['miq_url']
+    miq_username    = module.params['miq_username']
+    miq_password    = module.params['miq_password']
+    tags            = module.params['tags']
+    resource        = module.params['resource']
+    resource_name   = module.params['resource_name']
+    resource_names  = module.params['resource_names']
+    resource_filter = module.params['resource_filter']
+    batch_size      = module.params['batch_size']
+    exclusive       = module.params['exclusive']
+    state           = module.params['state']
+    miq_verify_ssl  = module.params['miq_verify_ssl']
+    ca_bundle_path  = module.params['ca_bundle_path']
 
-    manageiq = ManageIQTagAssignment(module, miq_url, miq_username, miq_password, miq_verify_ssl, ca_bundle_path)
-    res_args = manageiq.assign_or_unassign_tag(tags, resource, resource_name, state)
+    manageiq = ManageIQTagAssignment(module, miq_url, miq_username, miq_password, miq_verify_ssl, ca_bundle_path, cache=manageiq_cache(module.params), **manageiq_client_options(module.params))
+    if resource_names:
+        res_args = manageiq.assign_or_unassign_tags(tags, resource, resource_names, state, batch_size, exclusive)
+    elif resource_filter:
+        res_args = manageiq.assign_or_unassign_tags_by_filter(tags, resource, resource_filter, state, batch_size, exclusive)
+    else:
+        res_args = manageiq.assign_or_unassign_tag(tags, resource, resource_name, state, exclusive)
 
+    res_args['lookup_stats'] = manageiq.lookup.stats
     module.exit_json(**res_args)
 
 
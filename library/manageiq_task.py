@@ -0,0 +1,225 @@
+#!/usr/bin/python
+
+import os
+from collections import OrderedDict
+from functools import partial
+from ansible.module_utils.basic import *
+from ansible.module_utils.manageiq_utils import DEFAULT_POOL_SIZE, PooledManageIQClient as MiqApi, manageiq_argument_spec, manageiq_client, manageiq_client_options, run_concurrently
+from ansible.module_utils.manageiq_polling import Poller, poller, poller_argument_spec
+from ansible.module_utils.manageiq_projections import projection
+
+
+DOCUMENTATION = '''
+---
+module: manageiq_task
+description: The manageiq_task module waits for asynchronous ManageIQ tasks (e.g. provider deletions) to finish.
+short_description: wait for tasks in ManageIQ
+requirements: [ ManageIQ/manageiq-api-client-python ]
+author: Daniel Korn (@dkorn)
+options:
+  miq_url:
+    description:
+      - the manageiq environment url
+    default: MIQ_URL env var if set. otherwise, it is required to pass it
+  miq_username:
+    description:
+      - manageiq username
+    default: MIQ_USERNAME env var if set. otherwise, it is required to pass it
+  miq_password:
+    description:
+      - manageiq password
+    default: MIQ_PASSWORD env var if set. otherwise, it is required to pass it
+  miq_verify_ssl:
+    description:
+      - whether SSL certificates should be verified for HTTPS requests to ManageIQ
+    required: false
+    default: True
+    choices: ['True', 'False']
+  ca_bundle_path:
+    description:
+      - the path to a CA_BUNDLE file or directory with certificates
+    required: false
+    default: null
+  miq_pool_size:
+    description:
+      - the maximal number of connections to manageiq kept alive for reuse, and of calls issued concurrently
+    required: false
+    default: 10
+  miq_token_auth:
+    description:
+      - whether to authenticate once, through /api/auth, and send the X-Auth-Token obtained with the next requests instead of the username and password
+    required: false
+    default: true
+  miq_token_file:
+    description:
+      - a file, readable by the user only, sharing the X-Auth-Tokens between the module processes (e.g. forks and consecutive tasks)
+    required: false
+    default: null
+  task_ids:
+    description:
+      - the ids of the tasks to wait for, all of them polled concurrently
+    required: true
+  fail_fast:
+    description:
+      - stop waiting as soon as any task failed, instead of waiting for all the tasks to finish
+    required: false
+    default: false
+  wait_interval:
+    description:
+      - the number of seconds to wait before checking the tasks again, after checking right away
+    required: false
+    default: 0.5
+  wait_multiplier:
+    description:
+      - the factor the interval between checks grows by after every check
+    required: false
+    default: 2
+  wait_max_interval:
+    description:
+      - the maximal number of seconds to wait between checks
+    required: false
+    default: 10
+  wait_timeout:
+    description:
+      - the number of seconds after which the tasks that didn't finish are reported as timed out, shared by all the tasks
+    required: false
+    default: 600
+'''
+
+EXAMPLES = '''
+# Wait for the provider deletions registered in deletions to finish
+  manageiq_task:
+    task_ids: "{{ deletions.results | map(attribute='task_id') | select | list }}"
+    fail_fast: true
+    wait_timeout: 300
+    miq_url: 'http://miq.example.com'
+    miq_username: 'admin'
+    miq_password: '******'
+'''
+
+
+DEFAULT_WAIT_TIMEOUT = 600
+FINISHED_STATES = ['Finished']
+FAILED_STATUSES = ['Error', 'Timeout', 'Expired']
+
+
+class ManageIQTask(object):
+    """ ManageIQ object to wait for tasks in manageiq
+
+    url            - manageiq environment url
+    user           - the username in manageiq
+    password       - the user password in manageiq
+    miq_verify_ssl - whether SSL certificates should be verified for HTTPS requests
+    ca_bundle_path - the path to a CA_BUNDLE file or directory with certificates
+    """
+
+    def __init__(self, module, url, user, password, miq_verify_ssl, ca_bundle_path, **client_options):
+        self.module          = module
+        self.api_url         = url + '/api'
+        self.user            = user
+        self.password        = password
+        self.client          = manageiq_client(MiqApi, self.api_url, self.user, self.password, miq_verify_ssl, ca_bundle_path, **client_options)
+        self.max_concurrency = client_options.get('pool_size', DEFAULT_POOL_SIZE)
+
+    def task_state(self, task_id):
+        """ Returns the task state, status, message and timestamps, or only
+        the error reading them (read_error) if the task can't be read.
+        """
+        try:
+            result = self.client.get('{api_url}/tasks/{id}'.format(api_url=self.api_url, id=task_id),
+                                     attributes=projection('task_state'))
+        except Exception as e:
+            return dict(read_error="Failed to get task data. Error: {!r}".format(e))
+        return {attribute: result.get(attribute) for attribute in ('state', 'status', 'message', 'created_on', 'updated_on')}
+
+    def wait_for_tasks(self, task_ids, fail_fast=False, task_poller=None):
+        """ Waits for the tasks to finish, checking all the unfinished ones
+        concurrently on every check, until a single deadline.
+
+        fail_fast   - whether to stop waiting as soon as any task failed
+        task_poller - the Poller checking the tasks, right away then backing off
+
+        Returns:
+            whether any task failed or didn't finish, a short message and the
+            state, status, message and timestamps of every task, with the
+            seconds waited for it (None if it didn't finish). A task that
+            can't be read is read again on the next check, and the error of
+            its last read (read_error) is reported only if it didn't finish.
+        """
+        task_poller = task_poller or Poller(timeout=DEFAULT_WAIT_TIMEOUT)
+        started = task_poller.clock()
+        tasks = OrderedDict((task_id, dict(id=task_id, finished=False, elapsed=None)) for task_id in task_ids)
+        pending = list(tasks)
+
+        def check_all():
+            states = run_concurrently(self.client, [partial(self.task_state, task_id) for task_id in pending],
+                                      self.max_concurrency)
+            elapsed = round(task_poller.clock() - started, 3)
+            for task_id, state in zip(list(pending), states):
+                tasks[task_id].pop('read_error', None)
+                tasks[task_id].update(state)
+                if state.get('state') in FINISHED_STATES:
+                    tasks[task_id].update(finished=True, elapsed=elapsed)
+                    pending.remove(task_id)
+            failed = any(task.get('status') in FAILED_STATUSES for task in tasks.values() if task['finished'])
+            return not pending or (fail_fast and failed), None
+
+        task_poller.poll(check_all)
+
+        results = list(tasks.values())
+        failed = [str(task['id']) for task in results if task['finished'] and task['status'] in FAILED_STATUSES]
+        unfinished = [str(task['id']) for task in results if not task['finished']]
+        if failed:
+            message = "{count} of {total} tasks failed: {ids}".format(count=len(failed), total=len(results), ids=', '.join(failed))
+        elif unfinished:
+            message = "Timed out waiting for {count} of {total} tasks: {ids}".format(count=len(unfinished), total=len(results), ids=', '.join(unfinished))
+            unread = ["{id}: {error}".format(id=task['id'], error=task['read_error']) for task in results if task.get('read_error')]
+            if unread:
+                message += " ({errors})".format(errors='; '.join(unread))
+        else:
+            message = "All {total} tasks finished".format(total=len(results))
+        return dict(
+            changed=False,
+            failed=bool(failed or unfinished),
+            msg=message,
+            tasks=results
+        )
+
+
+def main():
+    module = AnsibleModule(
+        argument_spec=dict(
+            manageiq_argument_spec(cache=False),
+            task_ids=dict(required=True, type='list'),
+            fail_fast=dict(required=False, type='bool', default=False),
+            miq_url=dict(default=os.environ.get('MIQ_URL', None)),
+            miq_username=dict(default=os.environ.get('MIQ_USERNAME', None)),
+            miq_password=dict(default=os.environ.get('MIQ_PASSWORD', None), no_log=True),
+            miq_verify_ssl=dict(require=False, type='bool', default=True),
+            ca_bundle_path=dict(required=False, type='str', defualt=None),
+            **poller_argument_spec('wait', timeout=DEFAULT_WAIT_TIMEOUT)
+        ),
+    )
+
+    for arg in ['miq_url', 'miq_username', 'miq_password']:
+        if module.params[arg] in (None, ''):
+            module.fail_json(msg="missing required argument: {}".format(arg))
+
+    miq_url        = module.params['miq_url']
+    miq_username   = module.params['miq_username']
+    miq_password   = module.params['miq_password']
+    miq_verify_ssl = module.params['miq_verify_ssl']
+    ca_bundle_path = module.params['ca_bundle_path']
+    task_ids       = module.params['task_ids']
+    fail_fast      = module.params['fail_fast']
+
+    manageiq = ManageIQTask(module, miq_url, miq_username, miq_password, miq_verify_ssl, ca_bundle_path, **manageiq_client_options(module.params))
+    res_args = manageiq.wait_for_tasks(task_ids, fail_fast, poller(module.params, 'wait'))
+
+    if res_args['failed']:
+        module.fail_json(**res_args)
+    module.exit_json(**res_args)
+
+
+if __name__ == "__main__":
+    main()
@@ -66,6 +66,41 @@ options:
       - the path to a CA_BUNDLE file or directory with certificates
     required: false
     default: null
+  miq_pool_size:
+    description:
+      - the maximal number of connections to manageiq kept alive for reuse, and of calls issued concurrently
+    required: false
+    default: 10
+  miq_token_auth:
+    description:
+      - whether to authenticate once, through /api/auth, and send the X-Auth-Token obtained with the next requests instead of the username and password
+    required: false
+    default: true
+  miq_token_file:
+    description:
+      - a file, readable by the user only, sharing the X-Auth-Tokens between the module processes (e.g. forks and consecutive tasks)
+    required: false
+    default: null
+  cache_mode:
+    description:
+      - whether entities ids looked up by name are cached on disk, to be shared by
+        all the tasks (and forks) running against the same manageiq
+      - On off, ids are always looked up in manageiq
+      - On read, cached ids are used but the cache is left untouched
+      - On readwrite, cached ids are used and ids looked up are cached
+    required: false
+    choices: ['off', 'read', 'readwrite']
+    default: 'off'
+  cache_dir:
+    description:
+      - the directory holding the entities ids cache
+    required: false
+    default: ~/.ansible/manageiq_cache
+  cache_ttl:
+    description:
+      - the number of seconds an entity id is cached for
+    required: false
+    default: 3600
 '''
 
 EXAMPLES = '''
@@ -84,7 +119,10 @@ EXAMPLES = '''
 '''
 
 import os
-from manageiq_client.api import ManageIQClient as MiqApi
+from ansible.module_utils.manageiq_utils import PooledManageIQClient as MiqApi, manageiq_argument_spec, manageiq_client, manageiq_client_options
+from ansible.module_utils.manageiq_lookup import EntityLookup
+from ansible.module_utils.manageiq_cache import manageiq_cache
+from ansible.module_utils.manageiq_projections import projection
 
 
 class ManageIQUser(object):
@@ -97,12 +135,13 @@ class ManageIQUser(object):
     ca_bundle_path - the path to a CA_BUNDLE file or directory with certificates
     """
 
-    def __init__(self, module, url, user, password, miq_verify_ssl, ca_bundle_path):
+    def __init__(self, module, url, user, password, miq_verify_ssl, ca_bundle_path, cache=None, **client_options):
         self.module        = module
         self.api_url       = url + '/api'
         self.user          = user
         self.password      = password
-        self.client        = MiqApi(self.api_url, (self.user, self.password), verify_ssl=miq_verify_ssl, ca_bundle_path=ca_bundle_path)
+        self.client        = manageiq_client(MiqApi, self.api_url, self.user, self.password, miq_verify_ssl, ca_bundle_path, **client_options)
+        self.lookup        = EntityLookup(self.client, self.api_url, cache=cache)
         self.changed       = False
 
     def find_group_by_name(self, group_name):
@@ -111,8 +150,7 @@ class ManageIQUser(object):
         Returns:
             the group id if it exists in manageiq, None otherwise.
         """
-        groups = self.client.collections.groups
-        return next((group.id for group in groups if group.description == group_name), None)
+        return self.lookup.find_id('groups', group_name, attribute='description')
 
     def find_user_by_userid(self, userid):
         """ Searches the userid in ManageIQ.
@@ -120,8 +158,7 @@ class ManageIQUser(object):
         Returns:
             the user's id if it exists in manageiq, None otherwise.
         """
-        users = self.client.collections.users
-        return next((user.id for user in users if user.userid == userid), None)
+        return self.lookup.find_id('users', userid, attribute='userid')
 
     def delete_user(self, userid):
         """Deletes the user from manageiq.
@@ -137,6 +174,7 @@ class ManageIQUser(object):
         try:
             url = '{api_url}/users/{user_id}'.format(api_url=self.api_url, user_id=user_id)
             result = self.client.post(url, action='delete')
+            self.lookup.remember('users', userid, None, attribute='userid')
             self.changed = True
             return dict(changed=self.changed, msg=result['message'])
         except Exception as e:
@@ -148,7 +186,7 @@ class ManageIQUser(object):
         """
         try:
             url = "{api_url}/users/{user_id}".format(api_url=self.api_url, user_id=user_id)
-            result = self.client.get(url)
+            result = self.client.get(url, attributes=projection('user_details'))
             return result['name'] != username or result['current_group_id'] != group_id or result.get('email') != email
         except Exception as e:
             self.module.fail_json(msg="Failed to get user {userid} details. Error: {error}".format(userid=userid, error=e))
@@ -188,6 +226,7 @@ class ManageIQUser(object):
             resource = {'userid': userid, 'name': username, 'password': password,
                         'group': {'id': group_id}, 'email': email}
             result = self.client.post(url, action='create', resource=resource)
+            self.lookup.invalidate('users', userid, attribute='userid')
             self.changed = True
             return dict(
                 changed=self.changed,
@@ -217,6 +256,7 @@ class ManageIQUser(object):
 def main():
     module = AnsibleModule(
         argument_spec=dict(
+            manageiq_argument_spec(),
             name=dict(required=True, type='str'),
             fullname=dict(required=False, type='str'),
             password=dict(required=False, type='str', no_log=True),
@@ -251,13 +291,14 @@ def main():
     email          = module.params['email']
     state          = module.params['state']
 
-    manageiq = ManageIQUser(module, miq_url, miq_username, miq_password, miq_verify_ssl, ca_bundle_path)
+    manageiq = ManageIQUser(module, miq_url, miq_username, miq_password, miq_verify_ssl, ca_bundle_path, cache=manageiq_cache(module.params), **manageiq_client_options(module.params))
     if state == "present":
         res_args = manageiq.create_or_update_user(name, fullname, password,
                                                   group, email)
     if state == "absent":
         res_args = manageiq.delete_user(name)
 
+    res_args['lookup_stats'] = manageiq.lookup.stats
     module.exit_json(**res_args)
 
 
@@ -0,0 +1,70 @@
+""" An asyncio front of the manageiq api client, for the modules to issue
+independent calls concurrently instead of one after the other.
+
+Requires python 3.5 or later, manageiq_utils.run_concurrently falls back to
+sequential calls on older pythons.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+
+DEFAULT_MAX_CONCURRENCY = 10
+
+
+class AsyncManageIQClient(object):
+    """ Exposes the get and post methods of a manageiq api client as
+    coroutines. The calls run in a pool of threads sharing the client (and
+    its connections pool), so at most max_concurrency of them are in flight
+    at any time, however many coroutines are awaiting them.
+
+    client          - the manageiq api client
+    max_concurrency - the maximal number of calls in flight
+    """
+
+    def __init__(self, client, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.client          = client
+        self.max_concurrency = max_concurrency
+        self.executor        = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    async def call(self, func, *args, **kwargs):
+        """ Runs func(*args, **kwargs) in the calls pool, returning its result.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    async def get(self, api_endpoint_url=None, **get_params):
+        return await self.call(self.client.get, api_endpoint_url, **get_params)
+
+    async def post(self, api_endpoint_url=None, **payload):
+        return await self.call(self.client.post, api_endpoint_url, **payload)
+
+    def run(self, *coroutines):
+        """ Runs the coroutines to completion in a new event loop, for
+        synchronous code to await them.
+
+        Returns:
+            the list of the coroutines results, in order. Raises the first
+            exception raised by any of them, once all of them completed.
+        """
+        async def gather():
+            return await asyncio.gather(*coroutines, return_exceptions=True)
+
+        loop = asyncio.new_event_loop()
+        try:
+            results = loop.run_until_complete(gather())
+        finally:
+            loop.close()
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    def run_calls(self, calls):
+        """ Runs the calls, functions taking no arguments, concurrently.
+
+        Returns:
+            the list of the calls results, in order.
+        """
+        return self.run(*[self.call(call) for call in calls])
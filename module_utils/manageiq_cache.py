@@ -0,0 +1,132 @@
+""" An on-disk cache of manageiq entities ids, shared by the module processes
+running in parallel (e.g. ansible forks) and by consecutive tasks.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+CACHE_MODES = ['off', 'read', 'readwrite']
+DEFAULT_CACHE_DIR = os.path.join('~', '.ansible', 'manageiq_cache')
+DEFAULT_CACHE_TTL = 3600
+# The fraction of the ttl a cached id is trusted for without checking it
+# still belongs to the same entity.
+FRESH_FRACTION = 0.25
+
+
+class PersistentCache(object):
+    """ Cache of entities ids by collection and attribute value, for one
+    manageiq appliance, stored in an sqlite database. sqlite locks the
+    database file, so any number of processes can share it.
+
+    cache_dir     - the directory holding the cache database
+    appliance_url - the manageiq url the cached ids belong to
+    ttl           - the number of seconds an id is cached for
+    mode          - 'read' to only consult the cache, 'readwrite' to update it too
+    fresh_for     - the number of seconds a cached id is fresh for, a fraction
+                    of the ttl by default (see FRESH_FRACTION)
+    """
+
+    FILENAME = 'entities.sqlite'
+    LOCK_TIMEOUT = 30
+
+    def __init__(self, cache_dir, appliance_url, ttl=DEFAULT_CACHE_TTL, mode='readwrite', clock=time.time, fresh_for=None):
+        self.appliance_url = appliance_url
+        self.ttl           = ttl
+        self.fresh_for     = ttl * FRESH_FRACTION if fresh_for is None else fresh_for
+        self.mode          = mode
+        self.clock         = clock
+        self.lock          = threading.Lock()
+        cache_dir = os.path.expanduser(cache_dir)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0o700)
+        self.connection = sqlite3.connect(os.path.join(cache_dir, self.FILENAME),
+                                          timeout=self.LOCK_TIMEOUT, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS entities ('
+                ' appliance TEXT, collection TEXT, attribute TEXT, value TEXT,'
+                ' entity_id, stored_on REAL,'
+                ' PRIMARY KEY (appliance, collection, attribute, value))')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS documents ('
+                ' appliance TEXT, name TEXT, content TEXT, stored_on REAL,'
+                ' PRIMARY KEY (appliance, name))')
+
+    @property
+    def writable(self):
+        return self.mode == 'readwrite'
+
+    def get(self, collection_name, value, attribute='name'):
+        """ Returns the cached entity id, None if it isn't cached or expired.
+        """
+        return self.get_fresh(collection_name, value, attribute)[0]
+
+    def get_fresh(self, collection_name, value, attribute='name'):
+        """ Returns a (entity id, fresh) tuple of the cached entity id, None if
+        it isn't cached or expired, and whether it was cached less than
+        fresh_for seconds ago.
+        """
+        now = self.clock()
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT entity_id, stored_on FROM entities WHERE appliance = ? AND collection = ?'
+                ' AND attribute = ? AND value = ? AND stored_on > ?',
+                (self.appliance_url, collection_name, attribute, value, now - self.ttl)).fetchone()
+        if not row:
+            return None, False
+        return row[0], row[1] > now - self.fresh_for
+
+    def put(self, collection_name, value, entity_id, attribute='name'):
+        """ Caches the entity id, if the cache is writable.
+        """
+        if not self.writable:
+            return
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?, ?)',
+                (self.appliance_url, collection_name, attribute, value, entity_id, self.clock()))
+
+    def delete(self, collection_name, value, attribute='name'):
+        """ Drops the cached entity id, if the cache is writable.
+        """
+        if not self.writable:
+            return
+        with self.lock, self.connection:
+            self.connection.execute(
+                'DELETE FROM entities WHERE appliance = ? AND collection = ? AND attribute = ? AND value = ?',
+                (self.appliance_url, collection_name, attribute, value))
+
+    def get_document(self, name):
+        """ Returns the cached document (e.g. a catalog read in a single
+        listing), None if it isn't cached or expired.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT content FROM documents WHERE appliance = ? AND name = ? AND stored_on > ?',
+                (self.appliance_url, name, self.clock() - self.ttl)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_document(self, name, document):
+        """ Caches the document, anything json can encode, if the cache is
+        writable.
+        """
+        if not self.writable:
+            return
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)',
+                (self.appliance_url, name, json.dumps(document), self.clock()))
+
+
+def manageiq_cache(params):
+    """ Returns the PersistentCache the module params ask for, None if the
+    cache is off.
+    """
+    if params['cache_mode'] == 'off':
+        return None
+    return PersistentCache(params['cache_dir'], params['miq_url'],
+                           ttl=params['cache_ttl'], mode=params['cache_mode'])
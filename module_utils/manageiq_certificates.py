@@ -0,0 +1,72 @@
+""" Comparison of certificate authorities by digest, so that CA bundles are
+compared (and sent to manageiq) only when their certificates changed, not
+whenever their text differs.
+
+The CA files and digests are remembered in the module process only, so they
+are read and computed once per module run, e.g. for a CA shared by the many
+providers of a manageiq_providers task, but again by every task.
+"""
+
+import hashlib
+import os
+import re
+import threading
+
+
+PEM_CERTIFICATE = re.compile(r'-----BEGIN CERTIFICATE-----(.*?)-----END CERTIFICATE-----', re.DOTALL)
+WHITESPACE = re.compile(r'\s+')
+
+_ca_files = {}  # path -> (mtime, size, content, digest)
+_digests = {}   # PEM text -> digest
+_ca_files_lock = threading.Lock()
+
+
+def normalized_certificates(pem):
+    """ Returns the sorted set of the certificates in the PEM text, each one
+    as its base64 body without whitespace, ignoring the text around them.
+    Text without any PEM certificate is taken as a whole, without whitespace.
+    """
+    certificates = PEM_CERTIFICATE.findall(pem)
+    if not certificates:
+        certificates = [pem]
+    return sorted(set(WHITESPACE.sub('', certificate) for certificate in certificates))
+
+
+def certificates_digest(pem):
+    """ Returns the SHA-256 digest of the certificates in the PEM text, the
+    same whatever the order of the certificates and the whitespace around
+    them, or None if there is no PEM text. Digests are computed once per
+    text in a module run, e.g. a CA bundle shared by many providers.
+    """
+    if not pem:
+        return None
+    with _ca_files_lock:
+        digest = _digests.get(pem)
+    if digest is None:
+        certificates = '\n'.join(normalized_certificates(pem))
+        digest = 'sha256:' + hashlib.sha256(certificates.encode('utf-8')).hexdigest()
+        with _ca_files_lock:
+            _digests[pem] = digest
+    return digest
+
+
+def read_ca_file(path):
+    """ Reads the CA file at path, remembering its content and digest for the
+    rest of the module run, until the file is modified.
+
+    Returns:
+        a (content, digest) tuple
+    """
+    stat = os.stat(path)
+    with _ca_files_lock:
+        cached = _ca_files.get(path)
+    if cached and cached[:2] == (stat.st_mtime, stat.st_size):
+        return cached[2:]
+    with open(path, 'r') as ca_file:
+        content = ca_file.read()
+    digest = certificates_digest(content)
+    with _ca_files_lock:
+        _ca_files[path] = (stat.st_mtime, stat.st_size, content, digest)
+        if cached:
+            _digests.pop(cached[2], None)
+    return content, digest
@@ -0,0 +1,198 @@
+""" Lookups of manageiq entities ids by name (or any other unique attribute).
+"""
+
+import threading
+
+from manageiq_client.api import APIException, Collection
+from manageiq_client.filters import gen_filter
+from manageiq_client.utils import unicode_process
+from ansible.module_utils.manageiq_paging import DEFAULT_PAGE_SIZE, find_first, iter_resources
+
+
+class EntityLookup(object):
+    """ Resolves the ids of entities in manageiq collections, remembering
+    every id resolved for the rest of the run.
+
+    client    - the manageiq api client
+    api_url   - the manageiq api url
+    cache     - a PersistentCache shared with other processes, consulted before
+                asking manageiq, or None
+    page_size - the number of entities requested at a time when scanning
+                collections
+    """
+
+    def __init__(self, client, api_url, cache=None, page_size=DEFAULT_PAGE_SIZE):
+        self.client    = client
+        self.api_url   = api_url
+        self.cache     = cache
+        self.page_size = page_size
+        self.hits       = 0
+        self.cache_hits = 0
+        self.misses     = 0
+        self._index    = {}     # (collection, attribute) -> {value: id or None}
+        self._complete = set()  # (collection, attribute) indexed from a full listing
+        self._lock     = threading.Lock()
+
+    @property
+    def stats(self):
+        """ The number of lookups answered by the index (hits), by the
+        persistent cache (cache_hits) and by manageiq (misses).
+        """
+        return dict(hits=self.hits, cache_hits=self.cache_hits, misses=self.misses)
+
+    def find_id(self, collection_name, value, attribute='name'):
+        """ Searches the entity whose attribute equals value in the collection.
+
+        Answers from the index when the value was already resolved (or the
+        whole collection was listed), then from the persistent cache, if the
+        id was cached recently or still belongs to the entity. Otherwise asks manageiq
+        for the matching entity only, scans the collection page by page until
+        the entity is found when the filter is rejected, and lists the whole
+        collection when it can't be queried (e.g. a plain list of entities).
+
+        Returns:
+            the entity id if it exists in manageiq, None otherwise.
+        """
+        key = (collection_name, attribute)
+        value = unicode_process(value)
+        known, entity_id = self.known_id(collection_name, value, attribute)
+        if known:
+            return entity_id
+
+        if isinstance(getattr(self.client.collections, collection_name), Collection):
+            for find in (self.filtered_find_id, self.scan_find_id):
+                try:
+                    entity_id = find(collection_name, value, attribute)
+                except APIException:
+                    continue
+                self.remember(collection_name, value, entity_id, attribute)
+                return entity_id
+        self.load_index(collection_name, attribute)
+        entity_id = self._index[key].get(value)
+        if self.cache and entity_id is not None:
+            self.cache.put(collection_name, value, entity_id, attribute)
+        return entity_id
+
+    def known_id(self, collection_name, value, attribute='name'):
+        """ Searches the entity in the index, then in the persistent cache.
+        A fresh cached id is trusted as is, an older one is checked to still
+        belong to the entity first, which costs a request.
+
+        Returns:
+            a (known, entity_id) tuple, known is False if the entity has to be
+            looked up in manageiq.
+        """
+        key = (collection_name, attribute)
+        value = unicode_process(value)
+        with self._lock:
+            index = self._index.get(key, {})
+            if value in index or key in self._complete:
+                self.hits += 1
+                return True, index.get(value)
+
+        if self.cache:
+            entity_id, fresh = self.cache.get_fresh(collection_name, value, attribute)
+            if entity_id is not None:
+                if fresh:
+                    # not stored again, so that it is checked once it gets old
+                    with self._lock:
+                        self._index.setdefault(key, {})[value] = entity_id
+                        self.cache_hits += 1
+                    return True, entity_id
+                if self.still_valid(collection_name, entity_id, value, attribute):
+                    self.remember(collection_name, value, entity_id, attribute)
+                    with self._lock:
+                        self.cache_hits += 1
+                    return True, entity_id
+                self.cache.delete(collection_name, value, attribute)
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def still_valid(self, collection_name, entity_id, value, attribute='name'):
+        """ Returns True if the entity with the id still exists and its
+        attribute still equals value, fetching only that attribute.
+        """
+        url = '{api_url}/{collection}/{id}'.format(api_url=self.api_url, collection=collection_name, id=entity_id)
+        try:
+            result = self.client.get(url, attributes=attribute)
+        except APIException:
+            return False
+        return result.get(attribute) is not None and unicode_process(result[attribute]) == value
+
+    def filtered_find_id(self, collection_name, value, attribute='name'):
+        """ Queries the collection for the entities whose attribute equals
+        value, requesting only their ids and that attribute.
+
+        Returns:
+            the entity id if it exists in manageiq, None otherwise.
+        """
+        url = '{api_url}/{collection}'.format(api_url=self.api_url, collection=collection_name)
+        result = self.client.get(url, **{'filter[]': [gen_filter(attribute, '=', value)],
+                                         'expand': 'resources',
+                                         'attributes': 'id,{attribute}'.format(attribute=attribute)})
+        # '%' and '*' in a filter value are wildcards, keep exact matches only
+        value = unicode_process(value)
+        return next((r['id'] for r in result.get('resources', [])
+                     if r.get(attribute) is not None and unicode_process(r[attribute]) == value), None)
+
+    def scan_find_id(self, collection_name, value, attribute='name'):
+        """ Scans the collection page by page, requesting only the ids and
+        the attribute of the entities, until the entity whose attribute
+        equals value is found.
+
+        Returns:
+            the entity id if it exists in manageiq, None otherwise.
+        """
+        url = '{api_url}/{collection}'.format(api_url=self.api_url, collection=collection_name)
+        value = unicode_process(value)
+        found = find_first(self.client, url,
+                           lambda r: r.get(attribute) is not None and unicode_process(r[attribute]) == value,
+                           attributes=['id', attribute], page_size=self.page_size)
+        return found and found['id']
+
+    def load_index(self, collection_name, attribute='name'):
+        """ Indexes the ids of all the entities in the collection by attribute,
+        listing only their ids and that attribute, page by page.
+        """
+        collection = getattr(self.client.collections, collection_name)
+        entities = None
+        if isinstance(collection, Collection):
+            url = '{api_url}/{collection}'.format(api_url=self.api_url, collection=collection_name)
+            try:
+                entities = [(r.get(attribute), r['id'])
+                            for r in iter_resources(self.client, url, ['id', attribute], self.page_size)]
+            except APIException:
+                pass
+        if entities is None:
+            entities = [(getattr(e, attribute, None), e.id) for e in collection]
+
+        index = {unicode_process(value): entity_id for value, entity_id in entities if value is not None}
+        with self._lock:
+            self._index[(collection_name, attribute)] = index
+            self._complete.add((collection_name, attribute))
+
+    def remember(self, collection_name, value, entity_id, attribute='name'):
+        """ Records the id of the entity whose attribute equals value, e.g.
+        after creating it. None records the entity doesn't exist (anymore).
+        """
+        value = unicode_process(value)
+        with self._lock:
+            self._index.setdefault((collection_name, attribute), {})[value] = entity_id
+        if self.cache:
+            if entity_id is None:
+                self.cache.delete(collection_name, value, attribute)
+            else:
+                self.cache.put(collection_name, value, entity_id, attribute)
+
+    def invalidate(self, collection_name, value, attribute='name'):
+        """ Forgets the entity whose attribute equals value, so the next
+        lookup asks manageiq again.
+        """
+        key = (collection_name, attribute)
+        value = unicode_process(value)
+        with self._lock:
+            self._index.get(key, {}).pop(value, None)
+            self._complete.discard(key)
+        if self.cache:
+            self.cache.delete(collection_name, value, attribute)
@@ -0,0 +1,63 @@
+""" Paged iteration over manageiq collections, for collections too large to be
+listed in a single response.
+"""
+
+
+DEFAULT_PAGE_SIZE = 1000
+
+
+def iter_resources(client, url, attributes=None, page_size=DEFAULT_PAGE_SIZE, **params):
+    """ Iterates over the resources of the collection at url, requesting them
+    page_size at a time (with offset and limit), so that only one page is
+    held in memory whatever the collection size, and no more pages are
+    requested once the caller stops iterating.
+
+    client     - the manageiq api client
+    url        - the collection (or subcollection) url
+    attributes - the attributes of the resources to request, e.g. ['id', 'name'],
+                 or None for all of them
+    params     - more query parameters, e.g. filters
+
+    Yields:
+        the resources, as dicts of the requested attributes.
+    """
+    if attributes:
+        params['attributes'] = ','.join(attributes)
+    offset = 0
+    while True:
+        result = client.get(url, expand='resources', offset=offset, limit=page_size, **params)
+        resources = result.get('resources', [])
+        for resource in resources:
+            yield resource
+        offset += len(resources)
+        # manageiq may return pages smaller than the limit asked for, trust
+        # the number of matching resources it reports when it does
+        total = result.get('subquery_count', result.get('count'))
+        if not resources or (offset >= total if total is not None else len(resources) < page_size):
+            return
+
+
+def find_first(client, url, predicate, attributes=None, page_size=DEFAULT_PAGE_SIZE, **params):
+    """ Returns the first resource of the collection at url the predicate
+    holds for, None if there is none, requesting no more pages once found.
+    """
+    return next((resource for resource in iter_resources(client, url, attributes, page_size, **params)
+                 if predicate(resource)), None)
+
+
+def iter_batches(items, batch_size):
+    """ Groups the items, e.g. the resources of a paged listing, in lists of
+    at most batch_size items, consuming the items only as batches are
+    requested, so that a batch can be acted on before the next page is read.
+
+    Yields:
+        the lists of items, in order.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
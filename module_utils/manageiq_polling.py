@@ -0,0 +1,81 @@
+""" Polling manageiq for the completion of asynchronous operations (e.g.
+authentication validations), checking right away and then backing off
+exponentially, until an overall deadline.
+"""
+
+import time
+
+
+DEFAULT_INTERVAL = 0.5
+DEFAULT_MULTIPLIER = 2
+DEFAULT_MAX_INTERVAL = 10
+DEFAULT_TIMEOUT = 50
+
+
+class Poller(object):
+    """ Polls until a check is done or the deadline passes.
+
+    interval     - the number of seconds to wait after the first check
+    multiplier   - the factor the interval grows by after every check
+    max_interval - the maximal number of seconds to wait between checks
+    timeout      - the number of seconds after which polling gives up
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, multiplier=DEFAULT_MULTIPLIER,
+                 max_interval=DEFAULT_MAX_INTERVAL, timeout=DEFAULT_TIMEOUT,
+                 clock=time.time, sleep=time.sleep):
+        self.interval     = interval
+        self.multiplier   = multiplier
+        self.max_interval = max_interval
+        self.timeout      = timeout
+        self.clock        = clock
+        self.sleep        = sleep
+
+    def intervals(self):
+        """ Yields the successive intervals between checks """
+        interval = self.interval
+        while True:
+            yield interval
+            interval = min(interval * self.multiplier, self.max_interval)
+
+    def poll(self, check, deadline=None):
+        """ Calls check until it reports it is done, sleeping the backed off
+        interval between calls, but never past the deadline.
+
+        check    - a function returning a (done, value) tuple
+        deadline - the clock time to give up at, defaults to timeout seconds
+                   from now. Pollers waiting on related operations can share it.
+
+        Returns:
+            the (done, value) tuple of the last check.
+        """
+        if deadline is None:
+            deadline = self.clock() + self.timeout
+        intervals = self.intervals()
+        while True:
+            done, value = check()
+            remaining = deadline - self.clock()
+            if done or remaining <= 0:
+                return done, value
+            self.sleep(min(next(intervals), remaining))
+
+
+def poller_argument_spec(prefix, timeout=DEFAULT_TIMEOUT):
+    """ Returns the argument spec of the options of a Poller, named after
+    prefix, e.g. validation_interval, validation_timeout...
+    """
+    return {
+        prefix + '_interval': dict(required=False, type='float', default=DEFAULT_INTERVAL),
+        prefix + '_multiplier': dict(required=False, type='float', default=DEFAULT_MULTIPLIER),
+        prefix + '_max_interval': dict(required=False, type='float', default=DEFAULT_MAX_INTERVAL),
+        prefix + '_timeout': dict(required=False, type='float', default=timeout),
+    }
+
+
+def poller(params, prefix):
+    """ Returns the Poller the module params named after prefix ask for.
+    """
+    return Poller(interval=params[prefix + '_interval'],
+                  multiplier=params[prefix + '_multiplier'],
+                  max_interval=params[prefix + '_max_interval'],
+                  timeout=params[prefix + '_timeout'])
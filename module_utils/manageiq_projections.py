@@ -0,0 +1,36 @@
+""" The attributes each read of the modules requests from manageiq, so that
+responses carry only what the modules compare, not whole records.
+
+Keep an operation's projection in sync with the fields the module reads out
+of the response.
+"""
+
+
+PROJECTIONS = {
+    # manageiq_provider
+    'provider_config': ['endpoints', 'authentications', 'zone_id', 'provider_region'],
+    'provider_authentications': ['authentications'],
+    'provider_refresh': ['last_refresh_date', 'last_refresh_error'],
+    # manageiq_alert
+    'alert_descriptions': ['id', 'description'],
+    'alert_details': ['expression', 'db', 'options', 'enabled'],
+    # manageiq_tag_assignment
+    'resource_tags': ['name'],
+    'resources_tags': ['id', 'name', 'tags'],
+    'tag_catalog': ['name', 'single_value', 'tags'],
+    # manageiq_policy_assignment
+    'resource_policies': ['id'],
+    'compliance_state': ['last_compliance_status', 'last_compliance_timestamp'],
+    # manageiq_custom_attributes
+    'custom_attributes': ['custom_attributes'],
+    # manageiq_task
+    'task_state': ['state', 'status', 'message', 'created_on', 'updated_on'],
+    # manageiq_user
+    'user_details': ['name', 'current_group_id', 'email'],
+}
+
+
+def projection(operation):
+    """ Returns the attributes parameter of the operation's read.
+    """
+    return ','.join(PROJECTIONS[operation])
@@ -0,0 +1,663 @@
+""" Operations on manageiq providers, shared by the manageiq_provider module,
+managing one provider, and the manageiq_providers module, managing many.
+"""
+
+from functools import partial
+
+from ansible.module_utils.manageiq_utils import DEFAULT_POOL_SIZE, run_concurrently
+from ansible.module_utils.manageiq_certificates import certificates_digest, read_ca_file
+from ansible.module_utils.manageiq_projections import projection
+from ansible.module_utils.manageiq_polling import Poller
+
+
+OPENSHIFT_DEFAULT_PORT = '8443'
+
+PROVIDER_TYPES = {
+    'openshift-origin': 'ManageIQ::Providers::Openshift::ContainerManager',
+    'openshift-enterprise': 'ManageIQ::Providers::OpenshiftEnterprise::ContainerManager',
+    'amazon': 'ManageIQ::Providers::Amazon::CloudManager',
+    'hawkular-datawarehouse': "ManageIQ::Providers::Hawkular::DatawarehouseManager",
+}
+
+EDIT_MODES = ['full', 'changed']
+
+DEFAULT_REFRESH_TIMEOUT = 600
+
+# Changing these fields of an endpoint points its credentials to another
+# server, or changes how that server is trusted, either of which can make them
+# invalid, so the credentials are sent, and validated, again.
+CREDENTIALS_CHECK_FIELDS = {'hostname', 'port', 'verify_ssl', 'security_protocol', 'certificate_authority'}
+
+PROVIDER_REQUIRED_IF = [
+    ('provider_type', 'openshift-origin', ['provider_api_hostname', 'provider_api_port', 'provider_api_auth_token']),
+    ('provider_type', 'openshift-enterprise', ['provider_api_hostname', 'provider_api_port', 'provider_api_auth_token']),
+    ('monitoring', 'hawkular', ['monitoring_hostname', 'monitoring_port']),
+    ('monitoring', 'prometheus', ['monitoring_hostname', 'monitoring_port']),
+    ('provider_type', 'amazon', ['access_key_id', 'secret_access_key', 'provider_region']),
+    ('provider_type', 'hawkular-datawarehouse', ['provider_api_hostname', 'provider_api_port', 'provider_api_auth_token'])
+]
+
+
+def provider_argument_spec():
+    """ Returns the argument spec of the options describing a provider.
+    """
+    return dict(
+        name=dict(required=True),
+        zone=dict(required=False, type='str'),
+        provider_type=dict(required=True,
+                           choices=list(PROVIDER_TYPES.keys())),
+        state=dict(required=False, default='present',
+                   choices=['present', 'absent', 'refreshed']),
+        provider_api_port=dict(default=OPENSHIFT_DEFAULT_PORT,
+                               required=False),
+        provider_api_hostname=dict(required=False),
+        provider_api_auth_token=dict(required=False, no_log=True),
+        provider_verify_ssl=dict(require=False, type='bool', default=True),
+        provider_ca_path=dict(required=False, type='str', defualt=None),
+        provider_region=dict(required=False, type='str'),
+        access_key_id=dict(required=False, type='str', no_log=True),
+        secret_access_key=dict(required=False, type='str', no_log=True),
+        monitoring=dict(required=False, default=None,
+                        choices=['hawkular', 'prometheus', None]),
+        monitoring_hostname=dict(required=False),
+        monitoring_port=dict(required=False),
+    )
+
+
+class ManageIQProviderBase(object):
+    """ Executes the operations on providers in manageiq, with a client and
+    a lookup possibly shared with other instances (e.g. one per provider).
+
+    module          - the AnsibleModule, or a stand-in failing a single provider
+    client          - the manageiq api client
+    api_url         - the manageiq api url
+    lookup          - the EntityLookup of the client
+    max_concurrency - the maximal number of calls issued concurrently
+    """
+
+    OPENSHIFT_DEFAULT_PORT = OPENSHIFT_DEFAULT_PORT
+    PROVIDER_TYPES = PROVIDER_TYPES
+
+    def __init__(self, module, client, api_url, lookup, max_concurrency=DEFAULT_POOL_SIZE):
+        self.module          = module
+        self.client          = client
+        self.api_url         = api_url
+        self.lookup          = lookup
+        self.max_concurrency = max_concurrency
+        self.changed         = False
+        self.providers_url   = self.api_url + '/providers'
+
+    def auths_validation_details(self, provider_id):
+        try:
+            result = self.client.get('{providers_url}/{id}'.format(providers_url=self.providers_url, id=provider_id),
+                                     attributes=projection('provider_authentications'))
+            return self.auths_by_type(result)
+        except Exception as e:
+            self.module.fail_json(msg="Failed to get provider data. Error: {!r}".format(e))
+
+    def auths_by_type(self, provider):
+        """ Returns the provider authentications by authtype """
+        auths = provider.get('authentications', [])
+        return {auth['authtype']: auth for auth in auths}
+
+    def verify_authenticaion_validation(self, provider_id, old_validation_details, authtypes_to_verify, validation_poller=None):
+        """ Verifies that the provider's authentication validation passed.
+        provider_id            - the provider's id manageiq
+        old_validation_details - a tuple of (last_valid_on, last_invalid_on), representing the last time
+                                 that the authentication validation occured (success or failure).
+        authtypes_to_verify    - a list of autentication types that require validation
+        validation_poller      - the Poller checking the validation, right away then backing off
+
+        Returns a (result, details) tuple:
+            result: 'Valid' if authentication validation passed for all endpoints, 'Invalid' if failed for any endpoint,
+                    'Timed out' if any validation didn't complete in the assigned time
+            details: Authentication validation details, 'Validation didn't complete' in case it timed out
+        """
+        check = partial(self.validation_check, provider_id, old_validation_details, authtypes_to_verify)
+        done, (result, details) = (validation_poller or Poller()).poll(check)
+        if not done:
+            return "Timed out", details
+        return result, details
+
+    def validation_check(self, provider_id, old_validation_details, authtypes_to_verify):
+        """ Checks once whether the provider's authentication validation completed.
+
+        Returns a (done, (result, details)) tuple, see verify_authenticaion_validation.
+        """
+        def validated(old, new):
+            """ Returns True if the validation timestamp, valid or invalid, is different
+            from the old validation timestamp, False otherwise
+            """
+            return (old.get('last_valid_on'), old.get('last_invalid_on')) != (new.get('last_valid_on'), new.get('last_invalid_on'))
+
+        if not authtypes_to_verify:
+            return True, ("Valid", {})
+        new_validation_details = self.auths_validation_details(provider_id)
+
+        validations_done = True
+        all_done_valid = "Valid"  # Out of the (re)validated ones.
+        details = {}
+        for t in authtypes_to_verify:
+            old = old_validation_details.get(t, {})
+            new = new_validation_details.get(t, {})
+            if not validated(old, new):
+                details[t] = "Validation didn't complete"
+                validations_done = False
+            else:
+                details[t] = (new.get('status'), new.get('status_details'))
+                if new.get('status') != 'Valid':
+                    all_done_valid = "Invalid"
+
+        return validations_done, (all_done_valid, details)
+
+    def get_provider_config(self, provider_id):
+        """ get the endpoints, authentications, zone and region of existing provider from manageiq API"""
+        try:
+            result = self.client.get('{providers_url}/{id}'.format(providers_url=self.providers_url, id=provider_id),
+                                     attributes=projection('provider_config'))
+            return result
+        except Exception as e:
+            self.module.fail_json(msg="Failed to get provider data. Error: {!r}".format(e))
+
+    def get_provider_config_and_validation_details(self, provider_id):
+        """ Gets the endpoints of the existing provider and its authentications
+        validation details, in a single read.
+
+        Returns:
+            a (provider config, validation details) tuple
+        """
+        config = self.get_provider_config(provider_id)
+        return config, self.auths_by_type(config)
+
+    def required_updates(self, provider_id, endpoints, zone_id, provider_region, existing_config):
+        """ Checks whether an update is required for the provider
+
+        Returns:
+            Empty Hash (None) - If the hostname, port, zone and region passed equals
+                                the provider's current values
+            Hash of Changes   - Changes that need to be made if any endpoint, zone
+                                or region are different than the current values of the
+                                provider. The hash will have three entries:
+                                    Updated, Removed, Added
+                                that will contain all the changed endpoints
+                                and their values.
+        """
+        def host_port_ssl(endpoint):
+            # certificate authorities are compared by the digest of their certificates
+            return {'hostname': endpoint.get('hostname'),
+                    'port': endpoint.get('port'),
+                    'verify_ssl': endpoint.get('verify_ssl'),
+                    'certificate_authority': certificates_digest(endpoint.get('certificate_authority')),
+                    'security_protocol': endpoint.get('security_protocol')}
+
+        desired_by_role = {e['endpoint']['role']: host_port_ssl(e['endpoint']) for e in endpoints}
+        existing_by_role = {e['role']: host_port_ssl(e) for e in existing_config['endpoints']}
+        existing_provider_region = existing_config.get('provider_region') or None
+        if existing_by_role == desired_by_role and existing_config['zone_id'] == zone_id and existing_provider_region == provider_region:
+            return {}
+        updated = {role: {k: v for k, v in ep.items()
+                          if k not in existing_by_role[role] or v != existing_by_role[role][k]}
+                   for role, ep in desired_by_role.items()
+                   if role in existing_by_role and ep != existing_by_role[role]}
+        added = {role: ep for role, ep in desired_by_role.items()
+                 if role not in existing_by_role}
+        removed = {role: ep for role, ep in existing_by_role.items()
+                   if role not in desired_by_role}
+        if existing_config['zone_id'] != zone_id:
+            updated['zone_id'] = zone_id
+        if existing_provider_region != provider_region:
+            updated['provider_region'] = provider_region
+        return {"Updated": updated, "Added": added, "Removed": removed}
+
+    def refresh_provider(self, provider_id):
+        """ Performs a refresh of provider's inventory
+        """
+        try:
+            self.client.post('{api_url}/providers/{id}'.format(api_url=self.api_url, id=provider_id),
+                             action='refresh')
+            self.changed = True
+        except Exception as e:
+            self.module.fail_json(msg="Failed to refresh provider. Error: {!r}".format(e))
+
+    def refresh_state(self, provider_id):
+        """ Returns the date and error of the provider's last refresh """
+        try:
+            result = self.client.get('{providers_url}/{id}'.format(providers_url=self.providers_url, id=provider_id),
+                                     attributes=projection('provider_refresh'))
+        except Exception as e:
+            self.module.fail_json(msg="Failed to get provider data. Error: {!r}".format(e))
+        return dict(last_refresh_date=result.get('last_refresh_date'),
+                    last_refresh_error=result.get('last_refresh_error'))
+
+    def start_refresh(self, provider_id):
+        """ Performs a refresh of provider's inventory, reading the date of its
+        last refresh first, to tell when the refresh completes.
+
+        Returns:
+            the refresh, a dict of its state ('Initiated') and the previous
+            refresh date
+        """
+        previous_refresh_date = self.refresh_state(provider_id)['last_refresh_date']
+        self.refresh_provider(provider_id)
+        return dict(state='Initiated', previous_refresh_date=previous_refresh_date)
+
+    def refresh_check(self, provider_id, refresh):
+        """ Checks once whether the provider's refresh completed, that is its
+        last refresh date advanced.
+
+        Returns a (done, refresh state) tuple, see refresh_state.
+        """
+        state = self.refresh_state(provider_id)
+        return state['last_refresh_date'] not in (None, refresh['previous_refresh_date']), state
+
+    def refresh_outcome(self, refresh, done, state, duration):
+        """ Returns the refresh, updated with its last check: its state
+        ('Finished', 'Failed' or 'Timed out'), the last refresh date and error
+        and the seconds waited for it to complete.
+        """
+        if not done:
+            return dict(refresh, state='Timed out', duration=None, **state)
+        return dict(refresh, state='Failed' if state['last_refresh_error'] else 'Finished',
+                    duration=round(duration, 3), **state)
+
+    def wait_for_refresh(self, provider_id, refresh, refresh_poller=None):
+        """ Waits for the provider's refresh (see start_refresh) to complete,
+        checking right away then backing off.
+
+        Returns:
+            the refresh outcome, see refresh_outcome
+        """
+        refresh_poller = refresh_poller or Poller(timeout=DEFAULT_REFRESH_TIMEOUT)
+        started = refresh_poller.clock()
+        done, state = refresh_poller.poll(partial(self.refresh_check, provider_id, refresh))
+        return self.refresh_outcome(refresh, done, state, refresh_poller.clock() - started)
+
+    def report_refresh(self, provider_name, res_args, refresh):
+        """ Adds the refresh outcome to the results of the provider operation,
+        failing if the refresh failed.
+        """
+        if refresh['state'] == 'Failed':
+            self.module.fail_json(msg="Failed to refresh {provider} provider inventory. Error: {error}".format(provider=provider_name, error=refresh['last_refresh_error']))
+        elif refresh['state'] == 'Finished':
+            message = "{msg}. Refreshed in {duration} seconds".format(msg=res_args['msg'], duration=refresh['duration'])
+        elif refresh['state'] == 'Queued':
+            message = "{msg}. Refresh not started before the timeout".format(msg=res_args['msg'])
+        else:
+            message = "{msg}. Refresh timed out".format(msg=res_args['msg'])
+        return dict(res_args, msg=message, refresh=refresh)
+
+    def refresh_existing_provider(self, provider_name, wait_for_refresh=False, refresh_poller=None,
+                                  queue_refresh=False):
+        """ Performs a refresh of the existing provider's inventory
+
+        wait_for_refresh, refresh_poller and queue_refresh - see complete_provider
+
+        Returns:
+            the provider id, whether or not a change took place, a short
+            message and the refresh if waiting for it
+        """
+        provider_id = self.find_provider_by_name(provider_name)
+        if not provider_id:
+            self.module.fail_json(msg="Provider {provider} doesn't exist".format(provider=provider_name))
+        res_args = dict(provider_id=provider_id, msg="Refreshing {provider} provider inventory".format(provider=provider_name))
+        if queue_refresh:
+            res_args['refresh'] = dict(state='Queued')
+        elif wait_for_refresh:
+            refresh = self.start_refresh(provider_id)
+            res_args = self.report_refresh(provider_name, res_args, self.wait_for_refresh(provider_id, refresh, refresh_poller))
+        else:
+            self.refresh_provider(provider_id)
+        return dict(res_args, changed=self.changed)
+
+    def update_provider(self, provider_id, provider_name, endpoints, zone_id, provider_region):
+        """ Updates the existing provider with new parameters
+        """
+        try:
+            self.client.post('{api_url}/providers/{id}'.format(api_url=self.api_url, id=provider_id),
+                             action='edit',
+                             zone={'id': zone_id},
+                             connection_configurations=endpoints,
+                             provider_region=provider_region)
+            self.changed = True
+        except Exception as e:
+            self.module.fail_json(msg="Failed to update provider. Error: {!r}".format(e))
+
+    def edit_provider(self, provider_id, connection_configurations, updates, zone_id, provider_region):
+        """ Edits the existing provider, sending only the changed endpoints
+        (see changed_connection_configurations), and the zone and region if
+        they changed.
+        """
+        payload = {}
+        if connection_configurations:
+            payload['connection_configurations'] = connection_configurations
+        if 'zone_id' in updates['Updated']:
+            payload['zone'] = {'id': zone_id}
+        if 'provider_region' in updates['Updated']:
+            payload['provider_region'] = provider_region
+        try:
+            self.client.post('{api_url}/providers/{id}'.format(api_url=self.api_url, id=provider_id),
+                             action='edit', **payload)
+            self.changed = True
+        except Exception as e:
+            self.module.fail_json(msg="Failed to update provider. Error: {!r}".format(e))
+
+    def changed_connection_configurations(self, endpoints, updates):
+        """ Returns the connection configurations of all the endpoints, or none
+        if no endpoint changed. manageiq deletes the endpoints (and their
+        authentications) left out of the connection configurations of an edit,
+        so every endpoint is sent: the added endpoints in full, the updated
+        endpoints with their changed fields only, and the others with their
+        role only. The authentication of an updated endpoint is left out,
+        unless its changes require the credentials to be validated again.
+        """
+        roles = [e['endpoint']['role'] for e in endpoints]
+        if not any(role in updates['Added'] or role in updates['Updated'] for role in roles):
+            return []
+        configs = []
+        for e in endpoints:
+            role = e['endpoint']['role']
+            if role in updates['Added']:
+                configs.append(e)
+                continue
+            fields = updates['Updated'].get(role, {})
+            config = {'endpoint': dict(((k, e['endpoint'].get(k)) for k in fields), role=role)}
+            if CREDENTIALS_CHECK_FIELDS & set(fields):
+                config['authentication'] = e['authentication']
+            configs.append(config)
+        return configs
+
+    def add_new_provider(self, provider_name, provider_type, endpoints, zone_id, provider_region):
+        """ Adds a provider to manageiq
+
+        Returns:
+            the added provider id
+        """
+        try:
+            result = self.client.post(self.providers_url, name=provider_name,
+                                      type=self.PROVIDER_TYPES[provider_type],
+                                      zone={'id': zone_id},
+                                      connection_configurations=endpoints,
+                                      provider_region=provider_region)
+            provider_id = result['results'][0]['id']
+            self.lookup.remember('providers', provider_name, provider_id)
+            self.changed = True
+        except Exception as e:
+            self.module.fail_json(msg="Failed to add provider. Error: {!r}".format(e))
+        return provider_id
+
+    def find_zone_by_name(self, zone_name):
+        """ Searches the zone name in manageiq existing zones
+
+        Returns:
+            the zone id if it exists in manageiq, None otherwise
+        """
+        return self.lookup.find_id('zones', zone_name)
+
+    def find_provider_by_name(self, provider_name):
+        """ Searches the provider name in manageiq existing providers
+
+        Returns:
+            the provider id if it exists in manageiq, None otherwise
+        """
+        return self.lookup.find_id('providers', provider_name)
+
+    def generate_auth_key_config(self, role, authtype, hostname, port, token, provider_verify_ssl, provider_ca_path):
+        """ Returns an openshift provider endpoint dictionary.
+        """
+        config = {'endpoint': {'role': role, 'hostname': hostname,
+                               'port': int(port),
+                               'verify_ssl': provider_verify_ssl},
+                  'authentication': {'authtype': authtype, 'auth_key': token}}
+
+        if provider_ca_path:
+            provider_ca_content, _ = read_ca_file(provider_ca_path)
+            config['endpoint']['certificate_authority'] = provider_ca_content
+        else:
+            config['endpoint']['certificate_authority'] = None
+
+        # deduce security_protocol from provider_verify_ssl and provider_ca_path
+        if provider_verify_ssl:
+            if provider_ca_path:
+                config['endpoint']['security_protocol'] = 'ssl-with-validation-custom-ca'
+            else:
+                config['endpoint']['security_protocol'] = 'ssl-with-validation'
+        else:
+            config['endpoint']['security_protocol'] = 'ssl-without-validation'
+
+        return config
+
+    def generate_amazon_config(self, role, authtype, userid, password):
+        """ Returns an amazon provider endpoint dictionary.
+        """
+        return {'endpoint': {'role': role},
+                'authentication': {'authtype': authtype, 'userid': userid,
+                                   'password': password}}
+
+    def generate_endpoints(self, params):
+        """ Returns the endpoints of the provider described by params, the
+        options of a provider (see provider_argument_spec).
+        """
+        provider_type = params['provider_type']
+        if provider_type in ("openshift-enterprise", "openshift-origin"):
+            endpoints = [self.generate_auth_key_config(role='default',
+                                                       authtype='bearer',
+                                                       hostname=params['provider_api_hostname'],
+                                                       port=params['provider_api_port'],
+                                                       token=params['provider_api_auth_token'],
+                                                       provider_verify_ssl=params['provider_verify_ssl'],
+                                                       provider_ca_path=params['provider_ca_path'])]
+            monitoring = params['monitoring']
+            if monitoring:
+                endpoints.append(self.generate_auth_key_config(role=monitoring,
+                                                               authtype=monitoring,
+                                                               hostname=params['monitoring_hostname'],
+                                                               port=params['monitoring_port'],
+                                                               token=params['provider_api_auth_token'],
+                                                               provider_verify_ssl=params['provider_verify_ssl'],
+                                                               provider_ca_path=params['provider_ca_path']))
+        elif provider_type == "amazon":
+            endpoints = [self.generate_amazon_config(role='default',
+                                                     authtype='default',
+                                                     userid=params['access_key_id'],
+                                                     password=params['secret_access_key'])]
+        elif provider_type == "hawkular-datawarehouse":
+            endpoints = [self.generate_auth_key_config(role='default',
+                                                       authtype='default',
+                                                       hostname=params['provider_api_hostname'],
+                                                       port=params['provider_api_port'],
+                                                       token=params['provider_api_auth_token'],
+                                                       provider_verify_ssl=params['provider_verify_ssl'],
+                                                       provider_ca_path=params['provider_ca_path'])]
+        return endpoints
+
+    def delete_provider(self, provider_name):
+        """ Deletes the provider
+
+        Returns:
+            the delete task id if a task was generated, whether or not
+            a change took place and a short message describing the operation
+            executed.
+        """
+        provider_id = self.find_provider_by_name(provider_name)
+        if provider_id:
+            try:
+                url = '{providers_url}/{id}'.format(providers_url=self.providers_url, id=provider_id)
+                result = self.client.post(url, action='delete')
+                if result['success']:
+                    self.lookup.remember('providers', provider_name, None)
+                    self.changed = True
+                    return dict(task_id=result['task_id'], changed=self.changed, msg=result['message'])
+                else:
+                    return dict(task_id=None, changed=self.changed, api_error=result, msg="Failed to delete {provider_name} provider".format(provider_name=provider_name))
+            except Exception as e:
+                self.module.fail_json(msg="Failed to delete {provider_name} provider. Error: {error!r}".format(provider_name=provider_name, error=e))
+        else:
+            return dict(task_id=None, changed=self.changed, msg="Provider {provider_name} doesn't exist".format(provider_name=provider_name))
+
+    def filter_unsupported_fields_from_config(self, configs, existing_endpoints, fields):
+        """
+        Only update fields that already exist in the endpoint with empty values.
+        :param configs: New configuration. method mutates this param inplace
+        :param existing_endpoints: current provider endpoints
+        :param fields: a list of fields that we want to check if already exist in provider, and if not remove empty occurences from endpoints
+        """
+        for field in fields:
+            if not any(field in e for e in existing_endpoints):
+                for c in configs:
+                    endpoint = c['endpoint']
+                    if field in endpoint and endpoint[field] is None:
+                        del endpoint[field]
+
+    def drop_unchanged_certificate_authorities(self, configs, existing_endpoints):
+        """ Removes the certificate authority from the endpoints whose existing
+        certificate authority has the same certificates, so they're not sent
+        again. manageiq leaves an omitted certificate authority unmodified.
+        :param configs: New configuration. method mutates this param inplace
+        :param existing_endpoints: current provider endpoints
+        """
+        existing_digests = {e['role']: certificates_digest(e.get('certificate_authority'))
+                            for e in existing_endpoints if 'certificate_authority' in e}
+        for c in configs:
+            endpoint = c['endpoint']
+            if 'certificate_authority' not in endpoint or endpoint['role'] not in existing_digests:
+                continue
+            if certificates_digest(endpoint['certificate_authority']) == existing_digests[endpoint['role']]:
+                del endpoint['certificate_authority']
+
+    def submit_provider(self, provider_name, provider_type, endpoints, zone, provider_region, edit_mode='full'):
+        """ Adds a provider to manageiq or update its attributes in case
+        a provider with the same name already exists, without waiting for
+        the authentication validation.
+
+        edit_mode - 'full' to send all the endpoints of an updated provider,
+                    'changed' to send only its changes (see edit_provider).
+                    Endpoints removals are always sent in full.
+
+        Returns:
+            a dict of the provider_id, the operation executed ('addition',
+            'update' or None if the provider is up to date), the updates, and
+            the validation details before the operation and the authtypes
+            whose validation it triggered.
+        """
+        # check if provider with the same name already exists
+        zone_id, provider_id = run_concurrently(self.client, [
+            partial(self.find_zone_by_name, zone or 'default'),
+            partial(self.find_provider_by_name, provider_name)
+        ], self.max_concurrency)
+        if provider_id:  # provider exists
+            # the validation details are only needed if the provider is updated,
+            # but reading them along with the config costs no extra round trip
+            existing_config, old_validation_details = self.get_provider_config_and_validation_details(provider_id)
+
+            # ManageIQ Euwe / CFME 5.7 API and older versions don't support certificate authority field in endpoint.
+            # If it wasn't returned from existing provider configuration this means it is either unsupported or null,
+            # in both cases we can remove null/empty certificate_authority from endpoints we want to update.
+            self.filter_unsupported_fields_from_config(endpoints, existing_config['endpoints'], {'certificate_authority'})
+
+            updates = self.required_updates(provider_id, endpoints, zone_id, provider_region, existing_config)
+
+            if not updates:
+                return dict(provider_id=provider_id, operation=None, updates=updates)
+
+            operation = "update"
+            self.drop_unchanged_certificate_authorities(endpoints, existing_config['endpoints'])
+            if edit_mode == 'changed' and not updates["Removed"]:
+                configs = self.changed_connection_configurations(endpoints, updates)
+                self.edit_provider(provider_id, configs, updates, zone_id, provider_region)
+                # only the credentials sent are validated again
+                roles_with_changes = {c['endpoint']['role'] for c in configs if 'authentication' in c}
+            else:
+                self.update_provider(provider_id, provider_name, endpoints, zone_id, provider_region)
+                roles_with_changes = set(updates["Added"]) | set(updates["Updated"])
+        else:  # provider doesn't exists, adding it to manageiq
+
+            # ManageIQ Euwe / CFME 5.7 API and older versions don't support certificate authority field in endpoint.
+            # filter empty fields if none on creation - No existing endpoints for new provider
+            self.filter_unsupported_fields_from_config(endpoints, [{}], {'certificate_authority'})
+            updates = None
+            old_validation_details = {}
+            operation = "addition"
+            provider_id = self.add_new_provider(provider_name, provider_type,
+                                                endpoints, zone_id, provider_region)
+            roles_with_changes = [e['endpoint']['role'] for e in endpoints]
+
+        authtypes_to_verify = []
+        for e in endpoints:
+            if e['endpoint']['role'] in roles_with_changes:
+                # todo: Temporary hack. Remove this line when manageiq supports prometheus validation
+                if e['authentication']['authtype'] != 'prometheus':
+                    authtypes_to_verify.append(e['authentication']['authtype'])
+        return dict(provider_id=provider_id, operation=operation, updates=updates,
+                    old_validation_details=old_validation_details,
+                    authtypes_to_verify=authtypes_to_verify)
+
+    def complete_provider(self, provider_name, submission, result, details, initiate_refresh=True,
+                          wait_for_refresh=False, refresh_poller=None, queue_refresh=False):
+        """ Reports the outcome of the provider submission given its
+        authentication validation result and details, refreshing the
+        provider inventory if it is valid and initiate_refresh is set.
+
+        wait_for_refresh - whether to wait for the refresh to complete, with
+                           refresh_poller
+        queue_refresh    - whether to leave the refresh to the caller (e.g. to
+                           a RefreshScheduler), returning it queued instead
+
+        Returns:
+            the added or updated provider id, whether or not a change took
+            place and a short message describing the operation executed,
+            including the authentication validation status
+        """
+        provider_id = submission['provider_id']
+        operation = submission['operation']
+        refresh = None
+        if result == "Invalid":
+            self.module.fail_json(msg="Failed to Validate provider authentication after {operation}. details: {details}".format(operation=operation, details=details))
+        elif result == "Valid" or result == "Skipped Validation":
+            if initiate_refresh:
+                if queue_refresh:
+                    refresh = dict(state='Queued')
+                elif wait_for_refresh:
+                    refresh = self.start_refresh(provider_id)
+                else:
+                    self.refresh_provider(provider_id)
+                message = "Successful {operation} of {provider} provider. Authentication: {validation}. Refreshing provider inventory".format(operation=operation, provider=provider_name, validation=details)
+            else:
+                message = "Successful {operation} of {provider} provider. Authentication: {validation}.".format(operation=operation, provider=provider_name, validation=details)
+        elif result == "Timed out":
+            message = "Provider {provider} validation after {operation} timed out. Authentication: {validation}".format(operation=operation, provider=provider_name, validation=details)
+        res_args = dict(
+            provider_id=provider_id,
+            changed=self.changed,
+            msg=message,
+            updates=submission['updates']
+        )
+        if queue_refresh and refresh:
+            res_args['refresh'] = refresh
+        elif refresh:
+            res_args = self.report_refresh(provider_name, res_args, self.wait_for_refresh(provider_id, refresh, refresh_poller))
+        return res_args
+
+    def add_or_update_provider(self, provider_name, provider_type, endpoints, zone, provider_region,
+                               validate_provider_auth=True, initiate_refresh=True, validation_poller=None,
+                               edit_mode='full', wait_for_refresh=False, refresh_poller=None):
+        """ Adds a provider to manageiq or update its attributes in case
+        a provider with the same name already exists
+
+        Returns:
+            the added or updated provider id, whether or not a change took
+            place and a short message describing the operation executed,
+            including the authentication validation status
+        """
+        submission = self.submit_provider(provider_name, provider_type, endpoints, zone, provider_region, edit_mode)
+        if not submission['operation']:
+            return dict(changed=self.changed,
+                        msg="Provider %s already exists" % provider_name)
+
+        if validate_provider_auth:
+            result, details = self.verify_authenticaion_validation(submission['provider_id'], submission['old_validation_details'],
+                                                                   submission['authtypes_to_verify'], validation_poller)
+        else:
+            result = "Skipped Validation"
+            details = result
+        return self.complete_provider(provider_name, submission, result, details, initiate_refresh,
+                                      wait_for_refresh, refresh_poller)
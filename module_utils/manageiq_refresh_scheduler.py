@@ -0,0 +1,118 @@
+""" Staggered provider refreshes, so that refreshing many providers doesn't
+flood the appliance refresh workers with all of them at once.
+"""
+
+from collections import OrderedDict
+from functools import partial
+
+from ansible.module_utils.manageiq_utils import DEFAULT_POOL_SIZE, run_concurrently
+from ansible.module_utils.manageiq_polling import Poller
+from ansible.module_utils.manageiq_provider_base import DEFAULT_REFRESH_TIMEOUT
+
+
+class RefreshScheduler(object):
+    """ Queues provider refreshes and releases them at most max_in_flight at a
+    time, and at most max_per_zone at a time in any zone, starting the next
+    queued refresh as soon as a refresh in flight completes. The refreshes in
+    flight are checked concurrently, right away then backing off, until a
+    single deadline for all of them.
+
+    client          - the manageiq api client
+    max_in_flight   - the maximal number of refreshes in flight, 0 for no limit
+    max_per_zone    - the maximal number of refreshes in flight in a zone, 0 for no limit
+    poller          - the Poller checking the refreshes in flight
+    max_concurrency - the maximal number of calls issued concurrently
+    """
+
+    def __init__(self, client, max_in_flight=0, max_per_zone=0, poller=None, max_concurrency=DEFAULT_POOL_SIZE):
+        self.client          = client
+        self.max_in_flight   = max_in_flight
+        self.max_per_zone    = max_per_zone
+        self.poller          = poller or Poller(timeout=DEFAULT_REFRESH_TIMEOUT)
+        self.max_concurrency = max_concurrency
+        self.queue           = []
+
+    def add(self, key, zone, start, check):
+        """ Queues a refresh.
+
+        key   - identifies the refresh in the outcomes
+        zone  - the zone of the refreshed provider
+        start - a function initiating the refresh, returning it (see
+                ManageIQProviderBase.start_refresh)
+        check - a function of the refresh, returning a (done, state) tuple
+                (see ManageIQProviderBase.refresh_check)
+        """
+        self.queue.append(dict(key=key, zone=zone, start=start, check=check))
+
+    def releasable(self, queue, in_flight):
+        """ Returns the queued refreshes that can start, in order, given the
+        refreshes in flight.
+        """
+        per_zone = {}
+        for entry in in_flight.values():
+            per_zone[entry['zone']] = per_zone.get(entry['zone'], 0) + 1
+        released = []
+        for item in queue:
+            if self.max_in_flight and len(in_flight) + len(released) >= self.max_in_flight:
+                break
+            if self.max_per_zone and per_zone.get(item['zone'], 0) >= self.max_per_zone:
+                continue
+            per_zone[item['zone']] = per_zone.get(item['zone'], 0) + 1
+            released.append(item)
+        return released
+
+    def run(self):
+        """ Runs the queued refreshes to completion or the deadline.
+
+        Returns:
+            a dict of the outcomes by key, each one a dict of whether the
+            refresh completed (done), the refresh, the state of its last check
+            and the seconds from its start to its completion (duration), or of
+            the exception raised (error). Refreshes not started before the
+            deadline are returned as queued.
+        """
+        def attempt(call):
+            try:
+                return call(), None
+            except Exception as e:
+                return None, e
+
+        queue = list(self.queue)
+        in_flight = OrderedDict()
+        outcomes = {}
+
+        def step():
+            keys = list(in_flight)
+            checks = run_concurrently(self.client, [partial(attempt, partial(in_flight[key]['check'], in_flight[key]['refresh']))
+                                                    for key in keys], self.max_concurrency)
+            now = self.poller.clock()
+            for key, (check, error) in zip(keys, checks):
+                entry = in_flight[key]
+                if error is not None:
+                    outcomes[key] = dict(error=error)
+                    del in_flight[key]
+                    continue
+                done, entry['state'] = check
+                if done:
+                    outcomes[key] = dict(done=True, refresh=entry['refresh'], state=entry['state'],
+                                         duration=now - entry['started'])
+                    del in_flight[key]
+
+            released = self.releasable(queue, in_flight)
+            starts = run_concurrently(self.client, [partial(attempt, item['start']) for item in released],
+                                      self.max_concurrency)
+            for item, (refresh, error) in zip(released, starts):
+                queue.remove(item)
+                if error is not None:
+                    outcomes[item['key']] = dict(error=error)
+                else:
+                    in_flight[item['key']] = dict(zone=item['zone'], check=item['check'], refresh=refresh,
+                                                  state={}, started=now)
+            return not queue and not in_flight, None
+
+        self.poller.poll(step)
+        for key, entry in in_flight.items():
+            outcomes[key] = dict(done=False, refresh=entry['refresh'], state=entry['state'], duration=None)
+        for item in queue:
+            outcomes[item['key']] = dict(done=False, refresh=dict(state='Queued'), state={}, duration=None)
+        return outcomes
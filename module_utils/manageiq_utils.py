@@ -0,0 +1,238 @@
+""" Shared helpers for the manageiq modules.
+
+The modules import this file as ansible.module_utils.manageiq_utils, so it has
+to be on the ansible module_utils path (see README.md).
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from manageiq_client.api import APIException, ManageIQClient
+from ansible.module_utils.manageiq_cache import CACHE_MODES, DEFAULT_CACHE_DIR, DEFAULT_CACHE_TTL
+try:
+    from ansible.module_utils.manageiq_async import AsyncManageIQClient
+except (ImportError, SyntaxError):  # python < 3.5
+    AsyncManageIQClient = None
+
+
+DEFAULT_POOL_SIZE = 10
+
+_clients = {}
+_async_clients = {}
+_tokens = {}
+_tokens_lock = threading.Lock()
+
+
+class TokenStore(object):
+    """ Keeps manageiq X-Auth-Tokens in memory, for the whole process, and
+    optionally in a file only the user can read, shared by the processes
+    running the modules.
+
+    path - the tokens file path, or None to keep the tokens in memory only
+    """
+
+    RENEW_MARGIN = 60  # seconds before expiry a token is renewed
+
+    def __init__(self, path=None, clock=time.time):
+        self.path  = path and os.path.expanduser(path)
+        self.clock = clock
+
+    def get(self, api_url, user):
+        """ Returns the token of the user, None if there is none valid for
+        longer than RENEW_MARGIN.
+        """
+        key = '{user}@{api_url}'.format(user=user, api_url=api_url)
+        with _tokens_lock:
+            entry = _tokens.get(key)
+        if entry is None and self.path:
+            entry = self._read_file().get(key)
+        if entry is None or entry['expires_on'] - self.RENEW_MARGIN <= self.clock():
+            return None
+        with _tokens_lock:
+            _tokens[key] = entry
+        return entry['token']
+
+    def put(self, api_url, user, token, ttl):
+        key = '{user}@{api_url}'.format(user=user, api_url=api_url)
+        entry = dict(token=token, expires_on=self.clock() + ttl)
+        with _tokens_lock:
+            _tokens[key] = entry
+        if self.path:
+            tokens = self._read_file()
+            tokens[key] = entry
+            self._write_file(tokens)
+
+    def drop(self, api_url, user):
+        key = '{user}@{api_url}'.format(user=user, api_url=api_url)
+        with _tokens_lock:
+            _tokens.pop(key, None)
+        if self.path:
+            tokens = self._read_file()
+            if tokens.pop(key, None):
+                self._write_file(tokens)
+
+    def _read_file(self):
+        try:
+            with open(self.path) as tokens_file:
+                return json.load(tokens_file)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write_file(self, tokens):
+        # written aside and renamed over, so other processes never read a partial file
+        directory = os.path.dirname(self.path) or '.'
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)  # mkstemp creates it 0600
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(tokens, tmp_file)
+        os.rename(tmp_path, self.path)
+
+
+class PooledManageIQClient(ManageIQClient):
+    """ ManageIQClient whose session keeps its connections alive in a pool
+    big enough for the requests the module issues concurrently.
+
+    Given a TokenStore, the client authenticates once through /api/auth and
+    sends the X-Auth-Token it got with all its requests, renewing it before
+    it expires, instead of having manageiq check the credentials of every
+    request.
+
+    pool_size - the maximal number of connections kept open to manageiq
+    tokens    - a TokenStore, or None to use basic authentication
+    """
+
+    def __init__(self, entry_point, auth, pool_size=DEFAULT_POOL_SIZE, tokens=None, **kwargs):
+        self.pool_size   = pool_size
+        self.tokens      = tokens
+        self.credentials = tuple(auth[:2]) if isinstance(auth, (tuple, list)) else None
+        self.token_lock  = threading.Lock()
+        super(PooledManageIQClient, self).__init__(entry_point, auth, **kwargs)
+
+    def _load_data(self):
+        if self.tokens is not None and self.credentials:
+            self.use_token()
+            try:
+                return super(PooledManageIQClient, self)._load_data()
+            except APIException:
+                # the stored token may have been revoked, get a new one
+                self.tokens.drop(self._entry_point, self.credentials[0])
+                self.use_token()
+        return super(PooledManageIQClient, self)._load_data()
+
+    def _sending_request(self, func, retries=2):
+        if self.tokens is not None and 'X-Auth-Token' in self._session.headers:
+            self.use_token()
+        return super(PooledManageIQClient, self)._sending_request(func, retries)
+
+    def use_token(self):
+        """ Authenticates the session with the user token, requesting a new
+        one when there is no stored token valid for long enough. Keeps basic
+        authentication if manageiq doesn't grant a token.
+        """
+        user = self.credentials[0]
+        with self.token_lock:
+            token = self.tokens.get(self._entry_point, user)
+            if token is None:
+                try:
+                    result = self._session.get('{api_url}/auth'.format(api_url=self._entry_point),
+                                               auth=self.credentials)
+                    if not result:
+                        return
+                    auth = result.json()
+                    token = auth['auth_token']
+                except (ValueError, KeyError, IOError):
+                    return
+                self.tokens.put(self._entry_point, user, token, auth.get('token_ttl', 600))
+            self._session.auth = None
+            self._session.headers['X-Auth-Token'] = token
+
+    def _build_auth(self, auth):
+        # The session is created right before the auth is built and the first
+        # request (the api entry point) is sent right after it, mounting here
+        # makes sure that first connection is pooled and reused as well.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        super(PooledManageIQClient, self)._build_auth(auth)
+
+
+def manageiq_argument_spec(cache=True):
+    """ Returns the argument spec of the connection options shared by all
+    the manageiq modules, on top of the miq_url and credentials options.
+
+    cache - whether to include the entities ids cache options, for the
+            modules looking entities up
+    """
+    spec = dict(
+        miq_pool_size=dict(required=False, type='int', default=DEFAULT_POOL_SIZE),
+        miq_token_auth=dict(required=False, type='bool', default=True),
+        miq_token_file=dict(required=False, type='path', default=None),
+    )
+    if cache:
+        spec.update(
+            cache_mode=dict(required=False, type='str', default='off', choices=CACHE_MODES),
+            cache_dir=dict(required=False, type='path', default=DEFAULT_CACHE_DIR),
+            cache_ttl=dict(required=False, type='int', default=DEFAULT_CACHE_TTL),
+        )
+    return spec
+
+
+def manageiq_client_options(params):
+    """ Returns the manageiq_client keyword arguments out of the module params.
+    """
+    return dict(pool_size=params['miq_pool_size'],
+                token_auth=params['miq_token_auth'],
+                token_file=params['miq_token_file'])
+
+
+def manageiq_client(client_class, api_url, user, password, miq_verify_ssl, ca_bundle_path,
+                    pool_size=DEFAULT_POOL_SIZE, token_auth=False, token_file=None):
+    """ Returns a client of client_class for the manageiq api.
+
+    Clients are shared by everything in the process connecting to the same
+    api with the same credentials and SSL settings, so connections opened
+    by one of them are reused by all the others instead of each paying its
+    own TCP and TLS handshakes.
+
+    token_auth - whether to authenticate with an X-Auth-Token
+    token_file - the file sharing the tokens with other processes, if any
+    """
+    key = (client_class, api_url, user, password, miq_verify_ssl, ca_bundle_path)
+    if key not in _clients:
+        options = dict(verify_ssl=miq_verify_ssl, ca_bundle_path=ca_bundle_path, pool_size=pool_size)
+        if token_auth:
+            options['tokens'] = TokenStore(token_file)
+        _clients[key] = client_class(api_url, (user, password), **options)
+    return _clients[key]
+
+
+def async_client(client, max_concurrency=DEFAULT_POOL_SIZE):
+    """ Returns the AsyncManageIQClient of the client, None if asyncio isn't
+    available.
+    """
+    if AsyncManageIQClient is None:
+        return None
+    key = (client, max_concurrency)
+    if key not in _async_clients:
+        _async_clients[key] = AsyncManageIQClient(client, max_concurrency)
+    return _async_clients[key]
+
+
+def run_concurrently(client, calls, max_concurrency=DEFAULT_POOL_SIZE):
+    """ Runs independent calls, functions taking no arguments and issuing
+    requests with the client, concurrently, at most max_concurrency at a
+    time. Runs them one after the other if asyncio isn't available.
+
+    Returns:
+        the list of the calls results, in order. Raises the first exception
+        raised by any of them.
+    """
+    concurrent = async_client(client, max_concurrency) if len(calls) > 1 and max_concurrency > 1 else None
+    if concurrent is None:
+        return [call() for call in calls]
+    return concurrent.run_calls(calls)
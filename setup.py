@@ -9,6 +9,7 @@ setup(
     package_dir={'': 'library'},
     py_modules=["manageiq_provider", "manageiq_policy_assignment",
                 "manageiq_custom_attributes", "manageiq_user",
-                "manageiq_tag_assignment", "manageiq_alert"],
+                "manageiq_tag_assignment", "manageiq_alert",
+                "manageiq_providers", "manageiq_task"],
     install_requires='ansible manageiq-client'.split(),
 )
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+import ansible.module_utils
+
+
+# The modules import the shared helpers as ansible.module_utils.*, the way
+# ansible ships them, so make the repository's module_utils part of it.
+MODULE_UTILS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'module_utils')
+ansible.module_utils.__path__.append(MODULE_UTILS_PATH)
+
+
+class Clock(object):
+    """ A clock the pollers and caches sleep on without waiting, recording
+    the seconds slept.
+    """
+
+    def __init__(self, now=1000.0):
+        self.now   = now
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    yield Clock()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import threading
+from functools import partial
+
+import pytest
+from mock import Mock
+
+from manageiq_client.api import APIException, ManageIQClient
+from ansible.module_utils import manageiq_utils
+
+manageiq_async = pytest.importorskip("ansible.module_utils.manageiq_async")
+
+
+MANAGEIQ_API_URL = "http://themanageiq.tld/api"
+
+
+@pytest.fixture
+def client():
+    yield Mock(spec=ManageIQClient)
+
+
+def test_async_client_exposes_get_and_post(client):
+    client.get.return_value = {'resources': []}
+    client.post.return_value = {'results': [{'success': True}]}
+    async_client = manageiq_async.AsyncManageIQClient(client)
+    assert async_client.run(async_client.get(MANAGEIQ_API_URL + '/vms', expand='resources'),
+                            async_client.post(MANAGEIQ_API_URL + '/vms', action='refresh')) == [
+        {'resources': []}, {'results': [{'success': True}]}]
+    client.get.assert_called_once_with(MANAGEIQ_API_URL + '/vms', expand='resources')
+    client.post.assert_called_once_with(MANAGEIQ_API_URL + '/vms', action='refresh')
+
+
+def test_calls_run_concurrently(client):
+    # every call waits for all the others, they only complete if issued together
+    barrier = threading.Barrier(3, timeout=5)
+
+    def call(i):
+        barrier.wait()
+        return i
+    calls = [partial(call, i) for i in range(3)]
+    assert manageiq_utils.run_concurrently(client, calls) == [0, 1, 2]
+
+
+def test_concurrency_is_bounded(client):
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            in_flight.append(1)
+            peak.append(len(in_flight))
+        threading.Event().wait(0.01)
+        with lock:
+            in_flight.pop()
+    manageiq_utils.run_concurrently(client, [call] * 10, max_concurrency=2)
+    assert max(peak) <= 2
+
+
+def test_first_error_is_raised_after_all_calls(client):
+    done = []
+
+    def fail():
+        raise APIException("failed")
+    with pytest.raises(APIException):
+        manageiq_utils.run_concurrently(client, [fail, lambda: done.append(True)])
+    assert done == [True]
+
+
+def test_calls_are_sequential_without_asyncio(client, monkeypatch):
+    monkeypatch.setattr(manageiq_utils, "AsyncManageIQClient", None)
+    order = []
+    manageiq_utils.run_concurrently(client, [lambda: order.append(1), lambda: order.append(2)])
+    assert order == [1, 2]
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import pytest
+from mock import Mock
+
+from manageiq_client.api import APIException, Collection, ManageIQClient
+from ansible.module_utils.manageiq_cache import PersistentCache
+from ansible.module_utils.manageiq_lookup import EntityLookup
+
+
+MANAGEIQ_URL = "http://themanageiq.tld"
+PROVIDER_NAME = u"Provider name 1 with some unicode characters «ταБЬℓσ»"
+PROVIDER_ID = 134
+
+
+@pytest.fixture
+def cache(tmpdir, clock):
+    yield PersistentCache(str(tmpdir), MANAGEIQ_URL, ttl=60, clock=clock)
+
+
+@pytest.fixture
+def client():
+    client = Mock(spec=ManageIQClient)
+    client.collections = Mock()
+    client.collections.providers = Mock(spec=Collection)
+    yield client
+
+
+def test_cached_ids_are_shared_by_processes(tmpdir, cache, clock):
+    cache.put('providers', PROVIDER_NAME, PROVIDER_ID)
+    other_process_cache = PersistentCache(str(tmpdir), MANAGEIQ_URL, ttl=60, clock=clock)
+    assert other_process_cache.get('providers', PROVIDER_NAME) == PROVIDER_ID
+    assert PersistentCache(str(tmpdir), "http://other.tld").get('providers', PROVIDER_NAME) is None
+
+
+def test_cached_ids_expire(cache, clock):
+    cache.put('providers', PROVIDER_NAME, PROVIDER_ID)
+    clock.now += 61
+    assert cache.get('providers', PROVIDER_NAME) is None
+
+
+def test_read_mode_leaves_the_cache_untouched(tmpdir, cache, clock):
+    read_only = PersistentCache(str(tmpdir), MANAGEIQ_URL, ttl=60, mode='read', clock=clock)
+    read_only.put('providers', PROVIDER_NAME, PROVIDER_ID)
+    assert cache.get('providers', PROVIDER_NAME) is None
+
+
+def test_lookup_trusts_fresh_cached_id(cache, client):
+    cache.put('providers', PROVIDER_NAME, PROVIDER_ID)
+    lookup = EntityLookup(client, MANAGEIQ_URL + '/api', cache=cache)
+    assert lookup.find_id('providers', PROVIDER_NAME) == PROVIDER_ID
+    client.get.assert_not_called()
+    assert lookup.stats == {'hits': 0, 'cache_hits': 1, 'misses': 0}
+
+
+def test_lookup_verifies_older_cached_id_with_a_single_get(cache, client, clock):
+    cache.put('providers', PROVIDER_NAME, PROVIDER_ID)
+    clock.now += 16
+    client.get.return_value = {'id': PROVIDER_ID, 'name': PROVIDER_NAME}
+    lookup = EntityLookup(client, MANAGEIQ_URL + '/api', cache=cache)
+    assert lookup.find_id('providers', PROVIDER_NAME) == PROVIDER_ID
+    client.get.assert_called_once_with(
+        '{}/api/providers/{}'.format(MANAGEIQ_URL, PROVIDER_ID), attributes='name')
+    assert lookup.stats == {'hits': 0, 'cache_hits': 1, 'misses': 0}
+
+
+def test_lookup_drops_stale_cached_id(cache, client, clock):
+    cache.put('providers', PROVIDER_NAME, PROVIDER_ID)
+    clock.now += 16
+    client.get.side_effect = [
+        APIException("ActiveRecord::RecordNotFound: Couldn't find Provider"),
+        {'resources': [{'id': 135, 'name': PROVIDER_NAME}]}]
+    lookup = EntityLookup(client, MANAGEIQ_URL + '/api', cache=cache)
+    assert lookup.find_id('providers', PROVIDER_NAME) == 135
+    assert cache.get('providers', PROVIDER_NAME) == 135
+    assert lookup.stats == {'hits': 0, 'cache_hits': 0, 'misses': 1}
+
+
+def test_cached_documents_expire(cache, clock):
+    cache.put_document('tag_catalog', {'environment': {'single_value': True, 'tags': ['prod']}})
+    assert cache.get_document('tag_catalog') == {'environment': {'single_value': True, 'tags': ['prod']}}
+    clock.now += 61
+    assert cache.get_document('tag_catalog') is None
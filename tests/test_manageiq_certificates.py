@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import os
+
+from mock import patch
+
+from ansible.module_utils import manageiq_certificates
+from ansible.module_utils.manageiq_certificates import certificates_digest, read_ca_file
+
+
+FIRST = "-----BEGIN CERTIFICATE-----\nMIIBszCCAVmgAwIBAgIJAO\nFirstCertificateBody==\n-----END CERTIFICATE-----\n"
+SECOND = "-----BEGIN CERTIFICATE-----\nMIIBszCCAVmgAwIBAgIJAP\nSecondCertificateBody=\n-----END CERTIFICATE-----\n"
+
+
+def test_digest_ignores_order_and_whitespace():
+    reformatted = "# bundle\r\n" + SECOND.replace('\n', '\r\n  ') + "\n\n" + FIRST.replace('\nFirst', 'First')
+    assert certificates_digest(FIRST + SECOND) == certificates_digest(reformatted)
+    assert certificates_digest(FIRST + SECOND) == certificates_digest(FIRST + SECOND + FIRST)
+    assert certificates_digest(FIRST + SECOND).startswith('sha256:')
+
+
+def test_digest_tells_certificates_apart():
+    assert certificates_digest(FIRST) != certificates_digest(SECOND)
+    assert certificates_digest(FIRST) != certificates_digest(FIRST + SECOND)
+    assert certificates_digest(None) is None
+    assert certificates_digest('') is None
+
+
+def test_reads_ca_file_again_only_once_modified(tmpdir):
+    ca_file = tmpdir.join('ca.pem')
+    ca_file.write(FIRST)
+    with patch.object(manageiq_certificates, 'open', create=True, side_effect=open) as opened:
+        assert read_ca_file(str(ca_file)) == (FIRST, certificates_digest(FIRST))
+        assert read_ca_file(str(ca_file)) == (FIRST, certificates_digest(FIRST))
+        assert opened.call_count == 1
+
+        ca_file.write(FIRST + SECOND)
+        os.utime(str(ca_file), (0, 0))
+        assert read_ca_file(str(ca_file)) == (FIRST + SECOND, certificates_digest(FIRST + SECOND))
+        assert opened.call_count == 2
+
+
+def test_computes_each_digest_once():
+    bundle = "# computed once\n" + FIRST + SECOND
+    with patch.object(manageiq_certificates, 'normalized_certificates',
+                      side_effect=manageiq_certificates.normalized_certificates) as normalized:
+        digests = set(certificates_digest(bundle) for _ in range(100))
+    assert digests == {certificates_digest(FIRST + SECOND)}
+    assert normalized.call_count == 1
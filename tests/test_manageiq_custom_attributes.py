@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 import pytest
-from mock import Mock
+from mock import ANY, Mock
 
 from ansible.module_utils.basic import AnsibleModule
 
@@ -185,3 +185,36 @@ def test_delete_existing_custom_attribute(miq, miq_api_class):
         'msg': "Successfully deleted the following custom attributes from {provider_name} provider: {deleted}".format(
             provider_name=PROVIDER_NAME, deleted=POST_RETURN_VALUES['added_ca']['results'])
     }
+
+
+def test_delete_only_existing_custom_attributes(miq, miq_api_class):
+    miq_api_class.return_value.get.return_value = GET_RETURN_VALUES['ca_exist']
+    miq_api_class.return_value.post.return_value = POST_RETURN_VALUES['added_ca']
+
+    deleted_cas = [{'name': EXISTING_CA['name'], 'section': DIFFERENT_SECTION},
+                   {'name': NEW_CA['name'], 'section': DEFAULT_SECTION},
+                   {'name': EXISTING_CA['name'], 'section': DEFAULT_SECTION}]
+    miq.delete_custom_attributes('provider', PROVIDER_NAME, deleted_cas)
+    miq_api_class.return_value.post.assert_called_once_with(
+        ANY, action='delete',
+        resources=[{'name': EXISTING_CA['name'], 'href': GET_RETURN_VALUES['ca_exist']['custom_attributes'][0]['href']}])
+
+
+def test_sets_many_custom_attributes_in_one_request_per_action(miq, miq_api_class):
+    existing = [{'href': '{}/api/providers/{}/custom_attributes/{}'.format(MANAGEIQ_HOSTNAME, PROVIDER_ID, i),
+                 'id': i, 'section': DEFAULT_SECTION, 'name': 'ca{}'.format(i), 'value': 'value {}'.format(i)}
+                for i in range(1, 31)]
+    miq_api_class.return_value.get.return_value = {'custom_attributes': existing}
+    miq_api_class.return_value.post.side_effect = lambda url, action, resources: dict(
+        results=[dict(resource, section=DEFAULT_SECTION) for resource in resources])
+
+    cas = [{'name': 'ca{}'.format(i), 'value': 'new value {}'.format(i), 'section': DEFAULT_SECTION} for i in range(1, 31)]
+    cas.append({'name': 'ca31', 'value': 'value 31', 'section': DEFAULT_SECTION})
+    result = miq.add_or_update_custom_attributes('provider', PROVIDER_NAME, cas)
+    assert len(result['updates']['Updated']) == 30
+    assert result['updates']['Added'] == [{'name': 'ca31', 'value': 'value 31', 'section': DEFAULT_SECTION}]
+    assert [call[1]['action'] for call in miq_api_class.return_value.post.call_args_list] == ['add', 'edit']
+    miq_api_class.return_value.post.assert_called_with(
+        ANY, action='edit',
+        resources=[{'name': 'ca{}'.format(i), 'href': existing[i - 1]['href'], 'value': 'new value {}'.format(i)}
+                   for i in range(1, 31)])
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import pytest
+from mock import Mock
+
+from manageiq_client.api import APIException, Collection, ManageIQClient
+from ansible.module_utils.manageiq_lookup import EntityLookup
+
+
+MANAGEIQ_API_URL = "http://themanageiq.tld/api"
+VM_NAME = u"vm 1 with some unicode characters «ταБЬℓσ» and 'quotes'"
+
+
+def entity(entity_id, name):
+    the_entity = Mock()
+    the_entity.id = entity_id
+    the_entity.name = name
+    return the_entity
+
+
+@pytest.fixture
+def client():
+    client = Mock(spec=ManageIQClient)
+    client.collections = Mock()
+    client.collections.vms = Mock(spec=Collection)
+    client.collections.vms.__iter__ = Mock(return_value=iter([entity(1, "other vm"), entity(2, VM_NAME)]))
+    yield client
+
+
+@pytest.fixture
+def lookup(client):
+    yield EntityLookup(client, MANAGEIQ_API_URL)
+
+
+def test_find_id_queries_only_the_matching_entity(lookup, client):
+    client.get.return_value = {'resources': [{'id': 2, 'name': VM_NAME}]}
+    assert lookup.find_id('vms', VM_NAME) == 2
+    client.get.assert_called_once_with(
+        '{}/vms'.format(MANAGEIQ_API_URL),
+        **{'filter[]': [u'name = "{}"'.format(VM_NAME)],
+           'expand': 'resources', 'attributes': 'id,name'})
+
+
+def test_find_id_keeps_exact_matches_only(lookup, client):
+    client.get.return_value = {'resources': [{'id': 3, 'name': 'vm%'}, {'id': 4, 'name': 'vm01'}]}
+    assert lookup.find_id('vms', 'vm01') == 4
+    assert lookup.find_id('vms', 'vm02') is None
+
+
+def test_find_id_scans_when_the_filter_is_rejected(lookup, client):
+    client.get.side_effect = APIException("filter not supported")
+    assert lookup.find_id('vms', VM_NAME) == 2
+
+
+def test_find_id_scans_plain_collections(lookup, client):
+    client.collections.users = [Mock(id=7, userid='admin')]
+    assert lookup.find_id('users', 'admin', attribute='userid') == 7
+    client.get.assert_not_called()
+
+
+def test_find_id_remembers_resolved_ids(lookup, client):
+    client.get.return_value = {'resources': [{'id': 2, 'name': VM_NAME}]}
+    assert lookup.find_id('vms', VM_NAME) == 2
+    assert lookup.find_id('vms', VM_NAME) == 2
+    assert client.get.call_count == 1
+    assert lookup.stats == {'hits': 1, 'cache_hits': 0, 'misses': 1}
+
+
+def test_listed_collection_answers_every_lookup(lookup, client):
+    client.get.return_value = {'resources': [{'id': 1, 'name': 'vm01'}, {'id': 2, 'name': 'vm02'}]}
+    lookup.load_index('vms')
+    assert lookup.find_id('vms', 'vm02') == 2
+    assert lookup.find_id('vms', 'vm03') is None
+    client.get.assert_called_once_with('{}/vms'.format(MANAGEIQ_API_URL), expand='resources',
+                                       offset=0, limit=1000, attributes='id,name')
+    assert lookup.stats == {'hits': 2, 'cache_hits': 0, 'misses': 0}
+
+
+def test_index_is_written_through(lookup, client):
+    client.get.return_value = {'resources': []}
+    lookup.load_index('vms')
+    lookup.remember('vms', 'new vm', 5)
+    assert lookup.find_id('vms', 'new vm') == 5
+    lookup.remember('vms', 'new vm', None)
+    assert lookup.find_id('vms', 'new vm') is None
+    lookup.invalidate('vms', 'new vm')
+    client.get.return_value = {'resources': [{'id': 6, 'name': 'new vm'}]}
+    assert lookup.find_id('vms', 'new vm') == 6
+    assert client.get.call_count == 2
+
+
+def test_scan_stops_at_the_matching_page(client):
+    lookup = EntityLookup(client, MANAGEIQ_API_URL, page_size=2)
+    client.get.side_effect = [
+        APIException("filter not supported"),
+        {'resources': [{'id': 1, 'name': 'vm01'}, {'id': 2, 'name': 'vm02'}]},
+        {'resources': [{'id': 3, 'name': VM_NAME}, {'id': 4, 'name': 'vm04'}]},
+        {'resources': [{'id': 5, 'name': 'vm05'}]}]
+    assert lookup.find_id('vms', VM_NAME) == 3
+    assert client.get.call_count == 3
+    client.get.assert_called_with('{}/vms'.format(MANAGEIQ_API_URL), expand='resources',
+                                  offset=2, limit=2, attributes='id,name')
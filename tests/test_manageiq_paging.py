@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import pytest
+from mock import Mock
+
+from manageiq_client.api import ManageIQClient
+from ansible.module_utils.manageiq_paging import find_first, iter_batches, iter_resources
+
+
+VMS_URL = "http://themanageiq.tld/api/vms"
+
+
+@pytest.fixture
+def client():
+    client = Mock(spec=ManageIQClient)
+    client.get.side_effect = [
+        {'count': 5, 'resources': [{'id': 1}, {'id': 2}]},
+        {'count': 5, 'resources': [{'id': 3}, {'id': 4}]},
+        {'count': 5, 'resources': [{'id': 5}]}]
+    yield client
+
+
+def test_iterates_over_all_the_pages(client):
+    assert [r['id'] for r in iter_resources(client, VMS_URL, ['id'], page_size=2)] == [1, 2, 3, 4, 5]
+    client.get.assert_called_with(VMS_URL, expand='resources', offset=4, limit=2, attributes='id')
+
+
+def test_trusts_the_reported_count_over_short_pages(client):
+    client.get.side_effect = [
+        {'count': 3, 'resources': [{'id': 1}]},
+        {'count': 3, 'resources': [{'id': 2}, {'id': 3}]}]
+    assert [r['id'] for r in iter_resources(client, VMS_URL, page_size=1000)] == [1, 2, 3]
+
+
+def test_find_first_requests_no_more_pages(client):
+    assert find_first(client, VMS_URL, lambda r: r['id'] == 2, page_size=2) == {'id': 2}
+    assert client.get.call_count == 1
+
+
+def test_batches_are_acted_on_as_pages_arrive(client):
+    batches = iter_batches(iter_resources(client, VMS_URL, ['id'], page_size=2), 2)
+    assert [r['id'] for r in next(batches)] == [1, 2]
+    assert client.get.call_count == 1
+    assert [[r['id'] for r in batch] for batch in batches] == [[3, 4], [5]]
@@ -6,6 +6,7 @@ from ansible.module_utils.basic import AnsibleModule
 
 from manageiq_client.api import ManageIQClient
 import manageiq_policy_assignment
+from ansible.module_utils.manageiq_polling import Poller
 
 
 POLICY_PROFILE_NAME = "profile01"
@@ -88,3 +89,82 @@ def test_will_assign_policy_profile_on_resource_if_not_assigned(miq, miq_api_cla
     miq.client.post.assert_called_once_with(
         '{}/api/providers/1/policy_profiles'.format(MANAGEIQ_HOSTNAME),
         action='assign', resource={"href": "{}/api/policy_profiles/1".format(MANAGEIQ_HOSTNAME)})
+
+
+def test_assigns_policy_profile_on_filtered_resources(miq, miq_api_class):
+    listed = {'{}/api/providers'.format(MANAGEIQ_HOSTNAME): {'count': 2, 'resources': [
+        {'id': 1, 'name': 'provider01'}, {'id': 2, 'name': 'provider02'}]}}
+    assigned = {'{}/api/providers/1/policy_profiles'.format(MANAGEIQ_HOSTNAME): [{'id': 1}],
+                '{}/api/providers/2/policy_profiles'.format(MANAGEIQ_HOSTNAME): []}
+    miq_api_class.return_value.get.side_effect = lambda url, **params: listed.get(url) or dict(resources=assigned[url])
+
+    res_args = miq.assign_or_unassign_entity_by_filter(
+        'policy profile', [POLICY_PROFILE_NAME], 'provider', ['ems_type=openshift'], 'present')
+    assert res_args == {
+        "changed": True,
+        "msg": "Successfully assigned profile01 policy profile on 1 of 2 providers",
+        "updated": ['provider02']}
+    miq.client.post.assert_called_once_with(
+        '{}/api/providers/2/policy_profiles'.format(MANAGEIQ_HOSTNAME),
+        action='assign', resources=[{"href": "{}/api/policy_profiles/1".format(MANAGEIQ_HOSTNAME)}])
+    assert miq.targeted is None
+
+
+def profile(profile_id):
+    the_profile = Mock(id=profile_id)
+    the_profile.name = 'profile{:02d}'.format(profile_id)
+    return the_profile
+
+
+def test_assigns_many_policy_profiles_in_one_request_per_resource(miq, miq_api_class, the_provider):
+    other_provider = Mock(id=2)
+    other_provider.name = 'provider02'
+    miq_api_class.return_value.collections.providers = [the_provider, other_provider]
+    miq_api_class.return_value.collections.policy_profiles = [profile(profile_id) for profile_id in range(1, 13)]
+    assigned = {'{}/api/providers/1/policy_profiles'.format(MANAGEIQ_HOSTNAME): [{'id': 1}, {'id': 2}],
+                '{}/api/providers/2/policy_profiles'.format(MANAGEIQ_HOSTNAME): [{'id': i} for i in range(1, 13)]}
+    miq_api_class.return_value.get.side_effect = lambda url, **params: dict(resources=assigned[url])
+    miq_api_class.return_value.post.side_effect = lambda url, action, resources: dict(
+        results=[{'success': True, 'message': 'Assigning Policy Profile'} for _ in resources])
+
+    res_args = miq.assign_or_unassign_entities(
+        'policy profile', ['profile{:02d}'.format(i) for i in range(1, 13)], 'provider', [RESOURCE_NAME, 'provider02'], 'present')
+    assert res_args['updated'] == [RESOURCE_NAME]
+    assert res_args['msg'].endswith(" policy profile on 1 of 2 providers")
+    assert miq_api_class.return_value.get.call_count == 2
+    miq.client.post.assert_called_once_with(
+        '{}/api/providers/1/policy_profiles'.format(MANAGEIQ_HOSTNAME), action='assign',
+        resources=[{"href": "{}/api/policy_profiles/{}".format(MANAGEIQ_HOSTNAME, i)} for i in range(3, 13)])
+
+
+def test_fails_before_assigning_when_policy_profiles_are_missing(miq, miq_api_class):
+    with pytest.raises(AnsibleModuleFailed) as excinfo:
+        miq.assign_or_unassign_entities(
+            'policy profile', [POLICY_PROFILE_NAME, 'profile02', 'profile03'], 'provider', [RESOURCE_NAME], 'present')
+    assert str(excinfo.value) == "Failed to assign: policy profile profile02, profile03 do not exist in manageiq"
+    miq.client.post.assert_not_called()
+
+
+def test_checks_compliance_of_the_resources_concurrently(miq, miq_api_class, clock):
+    before = {'last_compliance_status': True, 'last_compliance_timestamp': '2020-09-22T11:00:00Z'}
+    states = {1: [before, before, {'last_compliance_status': False, 'last_compliance_timestamp': '2020-09-22T12:00:00Z'}],
+              2: [before, {'last_compliance_status': True, 'last_compliance_timestamp': '2020-09-22T12:00:00Z'}],
+              3: [before]}
+
+    def get(url, attributes=None):
+        vm_states = states[int(url.rsplit('/', 1)[1])]
+        return vm_states.pop(0) if len(vm_states) > 1 else vm_states[0]
+
+    miq_api_class.return_value.get.side_effect = get
+    miq_api_class.return_value.post.return_value = dict(results=[{'success': True, 'message': 'Checking compliance'}] * 3)
+    resources = [dict(id=vm_id, name='vm{:02d}'.format(vm_id)) for vm_id in (1, 2, 3)]
+
+    compliance = miq.check_compliance('vms', resources, Poller(interval=1, timeout=5, clock=clock, sleep=clock.sleep))
+    assert (compliance['compliant'], compliance['non_compliant'], compliance['unchecked']) == (1, 1, 1)
+    assert compliance['resources'][0] == dict(name='vm01', checked=True, compliant=False, checked_on='2020-09-22T12:00:00Z')
+    assert compliance['resources'][2] == dict(name='vm03', checked=False, compliant=None, checked_on=None)
+    miq.client.post.assert_called_once_with(
+        '{}/api/vms'.format(MANAGEIQ_HOSTNAME), action='check_compliance',
+        resources=[{'href': '{}/api/vms/{}'.format(MANAGEIQ_HOSTNAME, vm_id)} for vm_id in (1, 2, 3)])
+    miq.client.get.assert_any_call('{}/api/vms/1'.format(MANAGEIQ_HOSTNAME),
+                                   attributes='last_compliance_status,last_compliance_timestamp')
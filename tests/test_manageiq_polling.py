@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from ansible.module_utils.manageiq_polling import Poller
+
+
+def checks(results):
+    results = iter(results)
+    return lambda: next(results)
+
+
+def test_checks_right_away(clock):
+    poller = Poller(clock=clock, sleep=clock.sleep)
+    assert poller.poll(checks([(True, 'Valid')])) == (True, 'Valid')
+    assert clock.slept == []
+
+
+def test_backs_off_up_to_max_interval(clock):
+    poller = Poller(interval=0.5, multiplier=2, max_interval=3, timeout=100, clock=clock, sleep=clock.sleep)
+    results = [(False, None)] * 5 + [(True, 'Valid')]
+    assert poller.poll(checks(results)) == (True, 'Valid')
+    assert clock.slept == [0.5, 1, 2, 3, 3]
+
+
+def test_gives_up_at_the_deadline(clock):
+    poller = Poller(interval=4, multiplier=2, max_interval=10, timeout=10, clock=clock, sleep=clock.sleep)
+    assert poller.poll(lambda: (False, 'pending')) == (False, 'pending')
+    assert clock.slept == [4, 6]
+    assert clock.now == 1010.0
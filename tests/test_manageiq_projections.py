@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+import copy
+import json
+
+import pytest
+from mock import Mock
+
+from ansible.module_utils.basic import AnsibleModule
+
+import manageiq_alert
+import manageiq_custom_attributes
+import manageiq_policy_assignment
+import manageiq_provider
+import manageiq_tag_assignment
+import manageiq_user
+
+
+MANAGEIQ_HOSTNAME = "http://themanageiq.tld"
+API_URL = MANAGEIQ_HOSTNAME + "/api"
+TIMESTAMPS = {"created_on": "2017-04-04T07:42:51Z", "updated_on": "2017-04-04T07:42:51Z"}
+
+
+def recorded_alert(alert_id):
+    return dict(TIMESTAMPS, **{
+        "href": "{}/alert_definitions/{}".format(API_URL, alert_id),
+        "id": alert_id,
+        "guid": "a9d1bc1c-1911-11e7-9c4d-{:012d}".format(alert_id),
+        "description": "Alert {:02d}".format(alert_id),
+        "expression": {"exp": {"eval_method": "dwh_generic", "mode": "internal", "options": {}},
+                       "context_type": None},
+        "options": {"notifications": {"delay_next_evaluation": 600, "evm_event": {}}},
+        "db": "ContainerNode",
+        "enabled": True,
+        "responds_to_events": "dwh_generic",
+        "read_only": False,
+    })
+
+
+def recorded_tag(tag_id, name):
+    return {"href": "{}/tags/{}".format(API_URL, tag_id), "id": tag_id, "name": name,
+            "category": {"id": tag_id, "name": name.split('/')[2], "description": name.split('/')[2],
+                         "single_value": True, "show": True, "read_only": False},
+            "classification": {"id": tag_id, "description": name.split('/')[3]}}
+
+
+def recorded_policy_profile(profile_id):
+    return dict(TIMESTAMPS, **{
+        "href": "{}/policy_profiles/{}".format(API_URL, profile_id),
+        "id": profile_id, "name": "profile{:02d}".format(profile_id),
+        "description": "policy profile {}".format(profile_id), "set_type": "MiqPolicySet",
+        "guid": "0bf2e43a-1211-11e6-aa9c-{:012d}".format(profile_id), "mode": "control",
+        "read_only": False, "set_data": None,
+    })
+
+
+# Responses recorded from a manageiq appliance, as it returns them without
+# an attributes parameter
+RECORDED = {
+    API_URL + "/providers/1": dict(TIMESTAMPS, **{
+        "href": API_URL + "/providers/1", "id": 1, "name": "Openshift01",
+        "guid": "95a2c1fe-1911-11e7-9c4d-02424d459b45", "zone_id": 1, "provider_region": None,
+        "type": "ManageIQ::Providers::Openshift::ContainerManager", "api_version": None,
+        "uid_ems": None, "host_default_vnc_port_start": None, "host_default_vnc_port_end": None,
+        "last_refresh_error": None, "last_refresh_date": "2017-04-04T08:02:51Z",
+        "realm": None, "tenant_id": 1, "project": None, "parent_ems_id": None,
+        "subscription": None, "tenant_mapping_enabled": None, "enabled": True,
+        "endpoints": [{"id": 1, "role": "default", "ipaddress": None, "hostname": "openshift.tld",
+                       "port": 8443, "resource_type": "ExtManagementSystem", "resource_id": 1,
+                       "verify_ssl": 0, "url": None, "security_protocol": "ssl-without-validation",
+                       "api_version": None, "path": None, "certificate_authority": None}],
+        "authentications": [dict(TIMESTAMPS, **{
+            "id": 1, "name": "ManageIQ::Providers::Openshift::ContainerManager Openshift01",
+            "authtype": "bearer", "userid": None, "resource_id": 1,
+            "resource_type": "ExtManagementSystem", "type": "AuthToken",
+            "status": "Valid", "status_details": "Ok",
+            "last_valid_on": "2017-04-04T08:02:51Z", "last_invalid_on": None,
+            "credentials_changed_on": None, "fingerprint": None, "challenge": None,
+            "login": None, "public_key": None, "htpassd_users": [], "ldap_id": None,
+            "ldap_role": None, "ldap_security_protocol": None, "ldap_server": None})],
+    }),
+    API_URL + "/alert_definitions": {
+        "name": "alert_definitions", "count": 20, "subcount": 20,
+        "resources": [recorded_alert(alert_id) for alert_id in range(1, 21)],
+    },
+    API_URL + "/alert_definitions/17": recorded_alert(17),
+    API_URL + "/providers/1/tags": {
+        "name": "tags", "count": 30, "subcount": 3,
+        "resources": [recorded_tag(1, "/managed/environment/prod"),
+                      recorded_tag(2, "/managed/owner/prod_ops"),
+                      recorded_tag(3, "/managed/location/ny")],
+    },
+    API_URL + "/providers/1/policy_profiles": {
+        "name": "policy_profiles", "count": 10, "subcount": 3,
+        "resources": [recorded_policy_profile(profile_id) for profile_id in range(1, 4)],
+    },
+    API_URL + "/vms/1": dict(TIMESTAMPS, **{
+        "href": API_URL + "/vms/1", "id": 1, "name": "vm01", "vendor": "redhat",
+        "type": "ManageIQ::Providers::Redhat::InfraManager::Vm", "power_state": "on",
+        "guid": "b5b4e2a0-1911-11e7-9c4d-02424d459b45", "uid_ems": "4237d4e9-2296-e7a2-1b8a-d7f7ab22b4e5",
+        "location": "vm01/vm01.vmx", "tools_status": "toolsOk", "raw_power_state": "up",
+        "boot_time": "2017-04-01T07:42:51Z", "host_id": 1, "ems_id": 1, "storage_id": 1,
+        "template": False, "cpu_limit": -1, "memory_reserve": 0, "memory_limit": -1,
+        "description": "the first vm, with a rather long description " * 3,
+        "custom_attributes": [
+            dict(TIMESTAMPS, **{"href": API_URL + "/vms/1/custom_attributes/{}".format(ca_id),
+                                "id": ca_id, "section": "metadata", "name": "ca{}".format(ca_id),
+                                "value": "value {}".format(ca_id), "resource_type": "VmOrTemplate",
+                                "resource_id": 1, "source": "EVM", "serialized_value": None})
+            for ca_id in range(1, 4)],
+    }),
+    API_URL + "/users/1": dict(TIMESTAMPS, **{
+        "href": API_URL + "/users/1", "id": 1, "name": "Test User", "userid": "testuser",
+        "email": "testuser@example.com", "current_group_id": 2, "first_name": None,
+        "last_name": None, "region_description": "Region 0", "lastlogon": "2017-04-04T07:42:51Z",
+        "lastlogoff": None, "settings": {"display": {"locale": "default", "timezone": "UTC"}},
+        "password_digest": None,
+    }),
+}
+
+# The bytes each operation transfers, projected, on the recorded responses
+BYTES_PER_OPERATION = {
+    'provider_config_and_validation_details': 1029,
+    'alert_lookup': 2015,
+    'alert_details': 300,
+    'resource_tags': 331,
+    'resource_policies': 271,
+    'custom_attributes': 985,
+    'user_details': 132,
+}
+
+
+class RecordedManageIQ(object):
+    """ Serves the recorded responses, keeping the requested attributes only
+    (and the ids and hrefs) as manageiq does, and counting the bytes served.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+
+    def get(self, url, expand=None, attributes=None, **params):
+        response = copy.deepcopy(RECORDED[url])
+        if attributes:
+            attributes = set(attributes.split(',')) | {'id', 'href'}
+            resources = response['resources'] if 'resources' in response else [response]
+            for resource in resources:
+                for key in set(resource) - attributes:
+                    del resource[key]
+        self.bytes += len(json.dumps(response))
+        return response
+
+
+def operations():
+    def provider(miq):
+        miq.get_provider_config_and_validation_details(1)
+
+    def alert_lookup(miq):
+        miq.find_alert_by_description("Alert 17")
+
+    def alert_details(miq):
+        miq.alert_update_required(17, "Alert 17", {}, "miq_expression", "ContainerNode", {}, True)
+
+    return [
+        ('provider_config_and_validation_details', manageiq_provider.ManageIQProvider, provider),
+        ('alert_lookup', manageiq_alert.ManageIQAlert, alert_lookup),
+        ('alert_details', manageiq_alert.ManageIQAlert, alert_details),
+        ('resource_tags', manageiq_tag_assignment.ManageIQTagAssignment,
+         lambda miq: miq.query_resource_tags('providers', 1)),
+        ('resource_policies', manageiq_policy_assignment.ManageIQ,
+         lambda miq: miq.query_resource_policies_or_profiles('policy_profiles', 'providers', 1)),
+        ('custom_attributes', manageiq_custom_attributes.ManageIQCustomAttributes,
+         lambda miq: miq.get_entity_custom_attributes('vm', 1)),
+        ('user_details', manageiq_user.ManageIQUser,
+         lambda miq: miq.user_update_required(1, "testuser", "Test User", 2, "testuser@example.com")),
+    ]
+
+
+@pytest.mark.parametrize('operation, module_class, operate', operations())
+def test_reads_transfer_only_projected_attributes(monkeypatch, operation, module_class, operate):
+    recorded = RecordedManageIQ()
+    monkeypatch.setattr("{}.MiqApi".format(module_class.__module__), Mock(return_value=recorded))
+    module = Mock(spec=AnsibleModule)
+    module.fail_json.side_effect = AssertionError
+    miq = module_class(module, MANAGEIQ_HOSTNAME, "The username", "The password",
+                       miq_verify_ssl=False, ca_bundle_path=None)
+    operate(miq)
+    assert 0 < recorded.bytes <= BYTES_PER_OPERATION[operation]
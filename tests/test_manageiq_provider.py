@@ -6,6 +6,7 @@ from ansible.module_utils.basic import AnsibleModule
 
 from manageiq_client.api import ManageIQClient
 import manageiq_provider
+from ansible.module_utils.manageiq_polling import Poller
 
 
 PROVIDER_NAME = "Provider name 1 with some unicode characters «ταБЬℓσ»"
@@ -365,6 +366,55 @@ def test_will_add_openshift_provider_if_none_present(miq, miq_api_class, openshi
     miq.client.post.assert_has_calls(calls)
 
 
+def test_reports_validation_timeout_at_the_deadline(miq, miq_api_class, openshift_endpoint):
+    miq_api_class.return_value.collections.providers = []
+    miq_api_class.return_value.get.return_value = {'authentications': []}
+    miq_api_class.return_value.post.return_value = POST_RETURN_VALUES['openshift']
+    sleep = Mock()
+
+    res_args = miq.add_or_update_provider(
+        PROVIDER_NAME, "openshift-origin", openshift_endpoint, "default", None,
+        validation_poller=Poller(interval=1, timeout=0, sleep=sleep))
+    assert res_args['msg'] == "Provider {} validation after addition timed out. Authentication: {{'bearer': \"Validation didn't complete\"}}".format(PROVIDER_NAME)
+    assert miq.client.get.call_count == 1
+    sleep.assert_not_called()
+
+
+def test_waits_for_the_refresh_after_addition(miq, miq_api_class, openshift_endpoint, clock):
+    miq_api_class.return_value.collections.providers = []
+    miq_api_class.return_value.get.side_effect = [
+        GET_RETURN_VALUES['openshift_without_monitoring'],
+        {'last_refresh_date': None, 'last_refresh_error': None},
+        {'last_refresh_date': None, 'last_refresh_error': None},
+        {'last_refresh_date': '2020-09-22T12:00:00Z', 'last_refresh_error': None},
+    ]
+    miq_api_class.return_value.post.return_value = POST_RETURN_VALUES['openshift']
+
+    res_args = miq.add_or_update_provider(
+        PROVIDER_NAME, "openshift-origin", openshift_endpoint, "default", None,
+        wait_for_refresh=True, refresh_poller=Poller(interval=1.5, clock=clock, sleep=clock.sleep))
+    assert res_args['msg'].endswith("Refreshing provider inventory. Refreshed in 1.5 seconds")
+    assert res_args['refresh'] == {'state': 'Finished', 'previous_refresh_date': None, 'duration': 1.5,
+                                   'last_refresh_date': '2020-09-22T12:00:00Z', 'last_refresh_error': None}
+    miq.client.get.assert_called_with('{}/api/providers/{}'.format(MANAGEIQ_HOSTNAME, PROVIDER_ID),
+                                      attributes='last_refresh_date,last_refresh_error')
+
+
+def test_refreshes_existing_provider(miq, miq_api_class, the_provider, clock):
+    miq_api_class.return_value.collections.providers = [the_provider]
+    miq_api_class.return_value.get.side_effect = [
+        {'last_refresh_date': '2020-09-22T11:00:00Z', 'last_refresh_error': None},
+        {'last_refresh_date': '2020-09-22T12:00:00Z', 'last_refresh_error': 'Unauthorized'},
+    ]
+
+    with pytest.raises(AnsibleModuleFailed) as excinfo:
+        miq.refresh_existing_provider(PROVIDER_NAME, wait_for_refresh=True,
+                                      refresh_poller=Poller(clock=clock, sleep=clock.sleep))
+    assert str(excinfo.value) == "Failed to refresh {} provider inventory. Error: Unauthorized".format(PROVIDER_NAME)
+    miq.client.post.assert_called_once_with('{}/api/providers/{}'.format(MANAGEIQ_HOSTNAME, PROVIDER_ID),
+                                            action='refresh')
+
+
 def test_will_add_amazon_provider_if_none_present(miq, miq_api_class, amazon_endpoint):
     miq_api_class.return_value.collections.providers = []
     miq_api_class.return_value.get.return_value = GET_RETURN_VALUES['amazon']
@@ -428,7 +478,6 @@ def test_will_add_hawkular_datawarehose_provider_if_none_present(miq, miq_api_cl
 def test_will_update_openshift_provider_if_present(miq, miq_api_class, openshift_endpoint, hawkular_endpoint, the_provider):
     miq_api_class.return_value.collections.providers = [the_provider]
     miq_api_class.return_value.get.side_effect = [
-        GET_RETURN_VALUES['openshift_without_monitoring'],
         GET_RETURN_VALUES['openshift_without_monitoring'],
         GET_RETURN_VALUES['openshift_with_hawkular']
     ]
@@ -458,7 +507,6 @@ def test_will_update_openshift_provider_if_present(miq, miq_api_class, openshift
 def test_will_add_prometheus_endpoint_to_openshift_provider_if_present(miq, miq_api_class, openshift_endpoint, prometheus_endpoint, the_provider):
     miq_api_class.return_value.collections.providers = [the_provider]
     miq_api_class.return_value.get.side_effect = [
-        GET_RETURN_VALUES['openshift_without_monitoring'],
         GET_RETURN_VALUES['openshift_without_monitoring'],
         GET_RETURN_VALUES['openshift_with_prometheus']
     ]
@@ -487,6 +535,97 @@ def test_will_add_prometheus_endpoint_to_openshift_provider_if_present(miq, miq_
 
 
 
+def test_reads_up_to_date_provider_once(miq, miq_api_class, openshift_endpoint, the_provider):
+    miq_api_class.return_value.collections.providers = [the_provider]
+    miq_api_class.return_value.get.return_value = GET_RETURN_VALUES['openshift_without_monitoring']
+
+    res_args = miq.add_or_update_provider(
+        PROVIDER_NAME, "openshift-origin", openshift_endpoint, "default", None)
+    assert res_args == {'changed': False, 'msg': "Provider {} already exists".format(PROVIDER_NAME)}
+    miq.client.get.assert_called_once_with(
+        '{}/api/providers/{}'.format(MANAGEIQ_HOSTNAME, PROVIDER_ID),
+        attributes='endpoints,authentications,zone_id,provider_region')
+    miq.client.post.assert_not_called()
+
+
+def test_edits_only_the_changed_endpoint_fields(miq, miq_api_class, openshift_endpoint, the_provider):
+    miq_api_class.return_value.collections.providers = [the_provider]
+    revalidated = dict(GET_RETURN_VALUES['openshift_with_hawkular'], authentications=[
+        dict(GET_RETURN_VALUES['openshift_with_hawkular']['authentications'][0], last_valid_on='2020-09-22T13:00:00Z'),
+        GET_RETURN_VALUES['openshift_with_hawkular']['authentications'][1]])
+    miq_api_class.return_value.get.side_effect = [GET_RETURN_VALUES['openshift_with_hawkular'], revalidated]
+    miq_api_class.return_value.post.return_value = POST_RETURN_VALUES['openshift']
+
+    openshift_endpoint.append(miq.generate_auth_key_config("hawkular", "hawkular", HAWKULAR_HOSTNAME,
+                                                           8443, PROVIDER_TOKEN,
+                                                           PROVIDER_VERIFY_SSL, PROVIDER_CA_PATH))
+    res_args = miq.add_or_update_provider(
+        PROVIDER_NAME, "openshift-origin", openshift_endpoint, "default", None, edit_mode='changed')
+    assert res_args['msg'] == "Successful update of {} provider. Authentication: {{'hawkular': ('Valid', 'Ok')}}. Refreshing provider inventory".format(PROVIDER_NAME)
+    miq.client.post.assert_any_call(
+        '{}/api/providers/{}'.format(MANAGEIQ_HOSTNAME, PROVIDER_ID),
+        action='edit',
+        connection_configurations=[{'endpoint': {'role': 'default'}},
+                                   {'endpoint': {'role': 'hawkular', 'port': 8443},
+                                    'authentication': {'authtype': 'hawkular', 'auth_key': PROVIDER_TOKEN}}])
+
+
+def test_edit_of_ssl_settings_revalidates_credentials(miq, miq_api_class, the_provider):
+    miq_api_class.return_value.collections.providers = [the_provider]
+    revalidated = dict(GET_RETURN_VALUES['openshift_without_monitoring'], authentications=[
+        dict(GET_RETURN_VALUES['openshift_without_monitoring']['authentications'][0], last_valid_on='2020-09-22T13:00:00Z')])
+    miq_api_class.return_value.get.side_effect = [GET_RETURN_VALUES['openshift_without_monitoring'], revalidated]
+    miq_api_class.return_value.post.return_value = POST_RETURN_VALUES['openshift']
+
+    endpoints = [miq.generate_auth_key_config("default", "bearer", PROVIDER_HOSTNAME, PROVIDER_PORT,
+                                              PROVIDER_TOKEN, True, PROVIDER_CA_PATH)]
+    res_args = miq.add_or_update_provider(
+        PROVIDER_NAME, "openshift-origin", endpoints, "default", None, edit_mode='changed')
+    assert res_args['msg'] == "Successful update of {} provider. Authentication: {{'bearer': ('Valid', 'Ok')}}. Refreshing provider inventory".format(PROVIDER_NAME)
+    miq.client.post.assert_any_call(
+        '{}/api/providers/{}'.format(MANAGEIQ_HOSTNAME, PROVIDER_ID),
+        action='edit',
+        connection_configurations=[{'endpoint': {'role': 'default', 'verify_ssl': True,
+                                                 'security_protocol': 'ssl-with-validation'},
+                                    'authentication': {'authtype': 'bearer', 'auth_key': PROVIDER_TOKEN}}])
+
+
+def test_compares_certificate_authorities_by_certificates(miq, miq_api_class, the_provider, tmpdir):
+    certificate = "-----BEGIN CERTIFICATE-----\nMIIBszCCAVmgAwIBAgIJAO\n-----END CERTIFICATE-----\n"
+    ca_file = tmpdir.join('ca.pem')
+    ca_file.write("# the provider CA\n" + certificate)
+    existing = dict(GET_RETURN_VALUES['openshift_without_monitoring'], endpoints=[
+        dict(GET_RETURN_VALUES['openshift_without_monitoring']['endpoints'][0],
+             verify_ssl=True, security_protocol='ssl-with-validation-custom-ca',
+             certificate_authority=certificate.replace('\n', '\r\n'))])
+    miq_api_class.return_value.collections.providers = [the_provider]
+    miq_api_class.return_value.get.return_value = existing
+
+    endpoints = [miq.generate_auth_key_config("default", "bearer", PROVIDER_HOSTNAME, PROVIDER_PORT,
+                                              PROVIDER_TOKEN, True, str(ca_file))]
+    res_args = miq.add_or_update_provider(
+        PROVIDER_NAME, "openshift-origin", endpoints, "default", None)
+    assert res_args == {'changed': False, 'msg': "Provider {} already exists".format(PROVIDER_NAME)}
+
+
+def test_sends_only_changed_certificate_authorities(miq, miq_api_class, the_provider, tmpdir):
+    ca_file = tmpdir.join('ca.pem')
+    ca_file.write("-----BEGIN CERTIFICATE-----\nMIIBszCCAVmgAwIBAgIJAO\n-----END CERTIFICATE-----\n")
+    miq_api_class.return_value.collections.providers = [the_provider]
+    miq_api_class.return_value.get.return_value = GET_RETURN_VALUES['openshift_with_hawkular']
+    miq_api_class.return_value.post.return_value = POST_RETURN_VALUES['openshift']
+
+    endpoints = [miq.generate_auth_key_config("default", "bearer", PROVIDER_HOSTNAME, PROVIDER_PORT,
+                                              PROVIDER_TOKEN, PROVIDER_VERIFY_SSL, str(ca_file)),
+                 miq.generate_auth_key_config("hawkular", "hawkular", HAWKULAR_HOSTNAME, HAWKULAR_PORT,
+                                              PROVIDER_TOKEN, PROVIDER_VERIFY_SSL, PROVIDER_CA_PATH)]
+    miq.add_or_update_provider(PROVIDER_NAME, "openshift-origin", endpoints, "default", None,
+                               validate_provider_auth=False)
+    configs = miq.client.post.call_args_list[0][1]['connection_configurations']
+    assert configs[0]['endpoint']['certificate_authority'] == ca_file.read()
+    assert 'certificate_authority' not in configs[1]['endpoint']
+
+
 def test_will_update_amazon_provider_if_present(miq, miq_api_class, amazon_endpoint, the_amazon_provider):
     miq_api_class.return_value.collections.providers = [the_amazon_provider]
     miq_api_class.return_value.get.return_value = GET_RETURN_VALUES['amazon']
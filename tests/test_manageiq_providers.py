@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+import pytest
+from mock import Mock
+
+from ansible.module_utils.basic import AnsibleModule
+
+from manageiq_client.api import ManageIQClient
+import manageiq_providers
+from ansible.module_utils.manageiq_polling import Poller
+from ansible.module_utils.manageiq_provider_base import provider_argument_spec
+
+
+MANAGEIQ_HOSTNAME = "http://themanageiq.tld"
+PROVIDERS_URL = MANAGEIQ_HOSTNAME + "/api/providers"
+PROVIDER_TOKEN = "THE_PROVIDER_TOKEN"
+PROVIDER_PORT = 8443
+VALID = {'authtype': 'bearer', 'status': 'Valid', 'status_details': 'Ok',
+         'last_valid_on': '2020-09-22T11:00:30Z'}
+INVALID = {'authtype': 'bearer', 'status': 'Invalid', 'status_details': 'Unauthorized',
+           'last_invalid_on': '2020-09-22T11:00:30Z'}
+
+
+def openshift_provider(name, hostname, **options):
+    provider = {option: spec.get('default') for option, spec in provider_argument_spec().items()}
+    provider.update(name=name, provider_type='openshift-origin', provider_api_hostname=hostname,
+                    provider_api_port=PROVIDER_PORT, provider_api_auth_token=PROVIDER_TOKEN,
+                    provider_verify_ssl=False, **options)
+    return provider
+
+
+def named(name, entity_id):
+    entity = Mock()
+    entity.name = name
+    entity.id = entity_id
+    return entity
+
+
+@pytest.fixture(autouse=True)
+def miq_api_class(monkeypatch):
+    miq_api_class = Mock(spec=ManageIQClient)
+    monkeypatch.setattr("manageiq_providers.MiqApi", miq_api_class)
+    miq_api_class.return_value.collections.zones = [named("default", 1)]
+    yield miq_api_class
+
+
+@pytest.fixture
+def miq(miq_api_class):
+    miq = manageiq_providers.ManageIQProviders(Mock(spec=AnsibleModule), MANAGEIQ_HOSTNAME,
+                                               "The username", "The password",
+                                               miq_verify_ssl=False, ca_bundle_path=None)
+    yield miq
+
+
+@pytest.fixture
+def manageiq(miq_api_class):
+    """ A manageiq with the existing providers' configs and the providers'
+    authentications after validation, by provider id.
+    """
+    class FakeManageIQ(object):
+        configs = {}
+        authentications = {}
+        created = {}
+
+        refreshes = {}
+
+        def get(self, url, attributes=None, **params):
+            provider_id = int(url.rsplit('/', 1)[1])
+            if attributes == 'authentications':
+                return {'authentications': self.authentications.get(provider_id, [])}
+            if attributes == 'last_refresh_date,last_refresh_error':
+                refreshes = self.refreshes[provider_id]
+                return refreshes.pop(0) if len(refreshes) > 1 else refreshes[0]
+            return self.configs[provider_id]
+
+        def post(self, url, **payload):
+            if url == PROVIDERS_URL:
+                return {'results': [{'id': self.created[payload['name']]}]}
+            if payload['action'] == 'delete':
+                return {'success': True, 'task_id': 7, 'message': 'Deleting provider'}
+            return {}
+
+    fake = FakeManageIQ()
+    miq_api_class.return_value.get.side_effect = fake.get
+    miq_api_class.return_value.post.side_effect = fake.post
+    yield fake
+
+
+def test_manages_many_providers_in_a_run(miq, miq_api_class, manageiq):
+    miq_api_class.return_value.collections.providers = [named("existing", 1), named("deleted", 2)]
+    manageiq.configs[1] = {'zone_id': 1, 'endpoints': [
+        {'role': 'default', 'hostname': 'existing.tld', 'port': PROVIDER_PORT, 'verify_ssl': False,
+         'certificate_authority': None, 'security_protocol': 'ssl-without-validation'}]}
+    manageiq.created["new"] = 3
+    manageiq.authentications[3] = [VALID]
+
+    res_args = miq.add_update_or_delete_providers([
+        openshift_provider("existing", "existing.tld"),
+        openshift_provider("deleted", "deleted.tld", state='absent'),
+        openshift_provider("new", "new.tld"),
+    ], validation_poller=Poller(sleep=Mock()))
+
+    assert res_args['changed'] and not res_args['failed']
+    existing, deleted, new = res_args['results']
+    assert existing == dict(name="existing", changed=False, failed=False, msg="Provider existing already exists")
+    assert deleted == dict(name="deleted", changed=True, failed=False, task_id=7, msg='Deleting provider')
+    assert new['changed'] and new['provider_id'] == 3
+    assert new['msg'] == "Successful addition of new provider. Authentication: {'bearer': ('Valid', 'Ok')}. Refreshing provider inventory"
+    # one listing each resolved all the providers and zones
+    miq_api_class.return_value.get.assert_any_call(PROVIDERS_URL + '/1', attributes='endpoints,authentications,zone_id,provider_region')
+    assert miq_api_class.return_value.get.call_count == 2
+
+
+def test_failing_provider_does_not_fail_the_others(miq, miq_api_class, manageiq):
+    miq_api_class.return_value.collections.providers = []
+    manageiq.created.update(valid=1, invalid=2)
+    manageiq.authentications.update({1: [VALID], 2: [INVALID]})
+
+    res_args = miq.add_update_or_delete_providers([
+        openshift_provider("valid", "valid.tld"),
+        openshift_provider("invalid", "invalid.tld"),
+    ], validation_poller=Poller(sleep=Mock()))
+
+    assert res_args['failed']
+    assert res_args['msg'] == "Failed to manage 1 of 2 providers: invalid"
+    valid, invalid = res_args['results']
+    assert not valid['failed']
+    assert invalid['failed'] and invalid['msg'].startswith("Failed to Validate provider authentication after addition")
+    # only the valid provider is refreshed
+    miq_api_class.return_value.post.assert_any_call(PROVIDERS_URL + '/1', action='refresh')
+    assert all(c[0][0] != PROVIDERS_URL + '/2' for c in miq_api_class.return_value.post.call_args_list)
+
+
+def test_validations_share_the_deadline(miq, miq_api_class, manageiq):
+    miq_api_class.return_value.collections.providers = []
+    manageiq.created.update(first=1, second=2)
+    sleep = Mock()
+
+    res_args = miq.add_update_or_delete_providers([
+        openshift_provider("first", "first.tld"),
+        openshift_provider("second", "second.tld"),
+    ], validation_poller=Poller(interval=1, timeout=0, sleep=sleep))
+
+    assert [result['msg'] for result in res_args['results']] == [
+        "Provider {} validation after addition timed out. Authentication: {{'bearer': \"Validation didn't complete\"}}".format(name)
+        for name in ("first", "second")]
+    sleep.assert_not_called()
+
+
+def test_waits_for_the_refreshes_together(miq, miq_api_class, manageiq, clock):
+    miq_api_class.return_value.collections.providers = [named("fast", 1), named("slow", 2)]
+    manageiq.refreshes.update({
+        1: [{'last_refresh_date': None}, {'last_refresh_date': None}, {'last_refresh_date': '2020-09-22T12:00:00Z'}],
+        2: [{'last_refresh_date': '2020-09-22T11:00:00Z'}],
+    })
+
+    res_args = miq.add_update_or_delete_providers([
+        openshift_provider("fast", "fast.tld", state='refreshed'),
+        openshift_provider("slow", "slow.tld", state='refreshed'),
+    ], wait_for_refresh=True, refresh_poller=Poller(interval=1, max_interval=1, timeout=3,
+                                                    clock=clock, sleep=clock.sleep))
+
+    fast, slow = res_args['results']
+    assert fast['refresh']['state'] == 'Finished' and not fast['failed']
+    assert fast['msg'] == "Refreshing fast provider inventory. Refreshed in 2.0 seconds"
+    assert slow['refresh']['state'] == 'Timed out'
+    assert slow['msg'] == "Refreshing slow provider inventory. Refresh timed out"
+    assert miq_api_class.return_value.post.call_count == 2
+    # a single deadline for both refreshes
+    assert clock.slept == [1, 1, 1]
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from mock import Mock
+
+from manageiq_client.api import ManageIQClient
+from ansible.module_utils.manageiq_polling import Poller
+from ansible.module_utils.manageiq_refresh_scheduler import RefreshScheduler
+
+
+class Refreshes(object):
+    """ Refreshes completing after a number of checks, recording how many
+    were in flight, overall and by zone, whenever one started.
+    """
+
+    def __init__(self, zones, checks_to_complete):
+        self.zones = zones
+        self.checks_to_complete = checks_to_complete
+        self.in_flight = set()
+        self.started = []
+        self.peaks = []
+
+    def start(self, key):
+        self.in_flight.add(key)
+        self.started.append(key)
+        self.peaks.append((len(self.in_flight),
+                           max(sum(1 for k in self.in_flight if self.zones[k] == zone) for zone in set(self.zones.values()))))
+        return dict(state='Initiated', previous_refresh_date=None, checks=0)
+
+    def check(self, key, refresh):
+        refresh['checks'] += 1
+        done = refresh['checks'] >= self.checks_to_complete[key]
+        if done:
+            self.in_flight.discard(key)
+        return done, dict(last_refresh_date='2020-09-22T12:00:00Z' if done else None, last_refresh_error=None)
+
+
+def schedule(refreshes, clock, **limits):
+    scheduler = RefreshScheduler(Mock(spec=ManageIQClient), poller=Poller(interval=1, max_interval=1, timeout=20,
+                                                                          clock=clock, sleep=clock.sleep), **limits)
+    for key in sorted(refreshes.zones):
+        scheduler.add(key, refreshes.zones[key], lambda key=key: refreshes.start(key),
+                      lambda refresh, key=key: refreshes.check(key, refresh))
+    return scheduler.run()
+
+
+def test_releases_refreshes_within_the_limits(clock):
+    refreshes = Refreshes({1: 'east', 2: 'east', 3: 'east', 4: 'west', 5: 'west'},
+                          {1: 1, 2: 3, 3: 1, 4: 2, 5: 1})
+
+    outcomes = schedule(refreshes, clock, max_in_flight=3, max_per_zone=2)
+    assert all(outcome['done'] for outcome in outcomes.values())
+    assert refreshes.started == [1, 2, 4, 3, 5]
+    assert max(total for total, _ in refreshes.peaks) == 3
+    assert max(per_zone for _, per_zone in refreshes.peaks) == 2
+    assert outcomes[2]['duration'] == 3
+
+
+def test_starts_all_refreshes_at_once_without_limits(clock):
+    refreshes = Refreshes({1: 'east', 2: 'east', 3: 'west'}, {1: 1, 2: 1, 3: 1})
+
+    outcomes = schedule(refreshes, clock)
+    assert refreshes.peaks[-1] == (3, 2)
+    assert [outcomes[key]['duration'] for key in (1, 2, 3)] == [1, 1, 1]
+
+
+def test_reports_refreshes_unfinished_at_the_deadline(clock):
+    refreshes = Refreshes({1: 'east', 2: 'east', 3: 'west'}, {1: 100, 2: 1, 3: 1})
+
+    outcomes = schedule(refreshes, clock, max_per_zone=1)
+    assert outcomes[1]['done'] is False and outcomes[1]['refresh']['state'] == 'Initiated'
+    assert outcomes[2] == dict(done=False, refresh=dict(state='Queued'), state={}, duration=None)
+    assert outcomes[3]['done']
+
+
+def test_reports_errors_per_refresh(clock):
+    scheduler = RefreshScheduler(Mock(spec=ManageIQClient), poller=Poller(clock=clock, sleep=clock.sleep))
+    failure = Exception("Failed to refresh provider")
+    scheduler.add('failing', 'east', Mock(side_effect=failure), Mock())
+    scheduler.add('fine', 'east', Mock(return_value={}), Mock(return_value=(True, {})))
+
+    outcomes = scheduler.run()
+    assert outcomes['failing'] == dict(error=failure)
+    assert outcomes['fine']['done']
@@ -4,7 +4,8 @@ from mock import Mock
 
 from ansible.module_utils.basic import AnsibleModule
 
-from manageiq_client.api import ManageIQClient
+from manageiq_client.api import APIException, ManageIQClient
+from ansible.module_utils.manageiq_cache import PersistentCache
 import manageiq_tag_assignment
 
 
@@ -12,6 +13,11 @@ TAG_NAME = "test"
 CATEGORY_NAME = "environment"
 PROVIDER_NAME = "provider01"
 MANAGEIQ_HOSTNAME = "http://themanageiq.tld"
+CATALOG = {
+    'environment': {'single_value': True, 'tags': {'test', 'dev', 'prod'}},
+    'owner': {'single_value': False, 'tags': {'ops', 'dba'}},
+    'location': {'single_value': True, 'tags': {'ny'}},
+}
 
 
 @pytest.fixture(autouse=True)
@@ -48,6 +54,7 @@ def miq(miq_api_class, miq_ansible_module, the_provider):
     miq = manageiq_tag_assignment.ManageIQTagAssignment(
         miq_ansible_module, MANAGEIQ_HOSTNAME, "The username",
         "The password", miq_verify_ssl=False, ca_bundle_path=None)
+    miq.catalog = CATALOG
 
     miq_api_class.return_value.post.return_value = dict(results=[
         {"success": True,
@@ -84,3 +91,124 @@ def test_will_assign_tag_on_resource_if_not_assigned(miq, miq_api_class, the_pro
         '{}/api/providers/1/tags'.format(MANAGEIQ_HOSTNAME),
         action='assign', resources=[{'name': TAG_NAME, 'category': CATEGORY_NAME}])
 
+
+def listed_vm(vm_id, tags):
+    return {'id': vm_id, 'name': 'vm{:02d}'.format(vm_id), 'tags': [{'name': tag} for tag in tags]}
+
+
+def test_assigns_tags_on_many_resources_in_batches(miq, miq_api_class):
+    miq_api_class.return_value.get.return_value = {'count': 4, 'resources': [
+        listed_vm(1, []), listed_vm(2, ['/managed/environment/test']), listed_vm(3, []), listed_vm(4, [])]}
+    miq_api_class.return_value.post.side_effect = lambda url, action, resources: dict(
+        results=[{'success': True, 'message': 'Assigning Tag'} for _ in resources])
+
+    res_args = miq.assign_or_unassign_tags(
+        [{'name': TAG_NAME, 'category': CATEGORY_NAME}], 'vm', ['vm01', 'vm02', 'vm03', 'vm04'], 'present',
+        batch_size=2)
+    assert res_args == {
+        "changed": True,
+        "msg": "Successfully assigned tags on 3 of 4 vms",
+        "updated": ['vm01', 'vm03', 'vm04']}
+    miq_api_class.return_value.get.assert_called_once_with(
+        '{}/api/vms'.format(MANAGEIQ_HOSTNAME), expand='resources', offset=0, limit=1000, attributes='id,name,tags',
+        **{'filter[]': ['name = "vm01"', 'or name = "vm02"', 'or name = "vm03"', 'or name = "vm04"']})
+    assert miq_api_class.return_value.post.call_count == 2
+    miq_api_class.return_value.post.assert_any_call(
+        '{}/api/vms'.format(MANAGEIQ_HOSTNAME), action='assign_tags',
+        resources=[{'href': '{}/api/vms/1'.format(MANAGEIQ_HOSTNAME), 'tags': [{'name': TAG_NAME, 'category': CATEGORY_NAME}]},
+                   {'href': '{}/api/vms/3'.format(MANAGEIQ_HOSTNAME), 'tags': [{'name': TAG_NAME, 'category': CATEGORY_NAME}]}])
+
+
+def test_reads_tags_by_id_when_the_name_filter_is_rejected(miq, miq_api_class):
+    def get(url, **params):
+        if 'filter[]' in params:
+            raise APIException("Invalid filter")
+        return {'tags': [{'name': '/managed/environment/test'}]}
+
+    miq_api_class.return_value.get.side_effect = get
+    miq.lookup.find_id = Mock(side_effect=lambda resource_type, name: {'vm01': 1}.get(name))
+
+    assert miq.query_resources_tags('vms', ['vm01', 'vm02']) == {
+        'vm01': {'id': 1, 'name': 'vm01', 'tags': {'/managed/environment/test'}}}
+    miq_api_class.return_value.get.assert_called_with(
+        '{}/api/vms/1'.format(MANAGEIQ_HOSTNAME), attributes='id,name,tags')
+
+
+def test_fails_before_tagging_when_resources_are_missing(miq, miq_api_class):
+    miq_api_class.return_value.get.return_value = {'count': 1, 'resources': [listed_vm(1, [])]}
+
+    with pytest.raises(AnsibleModuleFailed) as excinfo:
+        miq.assign_or_unassign_tags(
+            [{'name': TAG_NAME, 'category': CATEGORY_NAME}], 'vm', ['vm01', 'vm02', 'vm03'], 'present')
+    assert str(excinfo.value) == "Failed to assign tags: vm vm02, vm03 do not exist in manageiq"
+    miq_api_class.return_value.post.assert_not_called()
+
+
+def test_tags_filtered_resources_page_by_page(miq, miq_api_class):
+    pages = [{'count': 3, 'resources': [listed_vm(1, []), listed_vm(2, [])]},
+             {'count': 3, 'resources': [listed_vm(3, [])]}]
+    posted = []
+
+    def get(url, **params):
+        return pages[len(posted)]
+
+    def post(url, action, resources):
+        posted.append([resource['href'] for resource in resources])
+        return dict(results=[{'success': True, 'message': 'Assigning Tag'} for _ in resources])
+
+    miq_api_class.return_value.get.side_effect = get
+    miq_api_class.return_value.post.side_effect = post
+
+    res_args = miq.assign_or_unassign_tags_by_filter(
+        [{'name': TAG_NAME, 'category': CATEGORY_NAME}], 'vm', ["name='vm%'"], 'present', batch_size=2)
+    assert res_args['msg'] == "Successfully assigned tags on 3 of 3 vms"
+    # every page is tagged before the next one is read
+    assert posted == [['{}/api/vms/{}'.format(MANAGEIQ_HOSTNAME, vm_id) for vm_id in (1, 2)],
+                      ['{}/api/vms/3'.format(MANAGEIQ_HOSTNAME)]]
+    miq_api_class.return_value.get.assert_called_with(
+        '{}/api/vms'.format(MANAGEIQ_HOSTNAME), expand='resources', offset=2, limit=2,
+        attributes='id,name,tags', **{'filter[]': ["name='vm%'"]})
+
+
+def test_exclusive_tags_replace_the_other_tags_of_their_categories(miq, miq_api_class):
+    miq_api_class.return_value.get.return_value = {'resources': [
+        {'name': '/managed/environment/dev'}, {'name': '/managed/owner/ops'},
+        {'name': '/managed/owner/dba'}, {'name': '/managed/location/ny'}]}
+
+    res_args = miq.assign_or_unassign_tag(
+        [{'name': TAG_NAME, 'category': CATEGORY_NAME}, {'name': 'ops', 'category': 'owner'}],
+        'provider', PROVIDER_NAME, 'present', exclusive=True)
+    assert res_args == {
+        "changed": True,
+        "msg": "Successfully assigned 1 and unassigned 1 tags"}
+    # environment is single_value, manageiq replaces dev with test
+    assert miq.client.post.call_args_list == [
+        (('{}/api/providers/1/tags'.format(MANAGEIQ_HOSTNAME),),
+         dict(action='unassign', resources=[{'category': 'owner', 'name': 'dba'}])),
+        (('{}/api/providers/1/tags'.format(MANAGEIQ_HOSTNAME),),
+         dict(action='assign', resources=[{'name': TAG_NAME, 'category': CATEGORY_NAME}]))]
+
+
+def test_fails_before_any_write_on_unknown_tags(miq, miq_api_class):
+    with pytest.raises(AnsibleModuleFailed) as excinfo:
+        miq.assign_or_unassign_tags(
+            [{'name': 'prd', 'category': CATEGORY_NAME}, {'name': 'ops', 'category': 'owner'},
+             {'name': 'qa', 'category': 'team'}], 'vm', ['vm01', 'vm02'], 'present')
+    assert str(excinfo.value) == "Failed to assign tags: unknown tags environment/prd, team/qa"
+    miq_api_class.return_value.get.assert_not_called()
+    miq_api_class.return_value.post.assert_not_called()
+
+
+def test_tag_catalog_is_read_once_and_cached(miq, miq_api_class, tmpdir, clock):
+    miq.catalog = None
+    miq.cache = PersistentCache(str(tmpdir), MANAGEIQ_HOSTNAME, ttl=60, clock=clock)
+    miq_api_class.return_value.get.return_value = {'count': 1, 'resources': [
+        {'name': 'environment', 'single_value': True,
+         'tags': [{'name': '/managed/environment/test'}, {'name': '/managed/environment/prod'}]}]}
+
+    assert miq.tag_catalog() == {'environment': {'single_value': True, 'tags': {'test', 'prod'}}}
+    miq.validate_tags([{'name': TAG_NAME, 'category': CATEGORY_NAME}], 'assign')
+    miq_api_class.return_value.get.assert_called_once_with(
+        '{}/api/categories'.format(MANAGEIQ_HOSTNAME), expand='resources', offset=0, limit=1000,
+        attributes='name,single_value,tags')
+    assert miq.cache.get_document('tag_catalog') == {'environment': {'single_value': True, 'tags': ['prod', 'test']}}
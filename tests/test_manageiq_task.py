@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import pytest
+from mock import Mock
+
+from ansible.module_utils.basic import AnsibleModule
+
+from manageiq_client.api import APIException, ManageIQClient
+import manageiq_task
+from ansible.module_utils.manageiq_polling import Poller
+
+
+MANAGEIQ_HOSTNAME = "http://themanageiq.tld"
+TASKS_URL = MANAGEIQ_HOSTNAME + "/api/tasks"
+
+
+@pytest.fixture(autouse=True)
+def miq_api_class(monkeypatch):
+    miq_api_class = Mock(spec=ManageIQClient)
+    monkeypatch.setattr("manageiq_task.MiqApi", miq_api_class)
+    yield miq_api_class
+
+
+@pytest.fixture
+def miq(miq_api_class):
+    miq = manageiq_task.ManageIQTask(Mock(spec=AnsibleModule), MANAGEIQ_HOSTNAME,
+                                     "The username", "The password",
+                                     miq_verify_ssl=False, ca_bundle_path=None)
+    yield miq
+
+
+@pytest.fixture
+def task_states(miq_api_class):
+    """ The successive states of the tasks, by task id """
+    task_states = {}
+
+    def get(url, attributes=None):
+        states = task_states[url.rsplit('/', 1)[1]]
+        state = states.pop(0) if len(states) > 1 else states[0]
+        if isinstance(state, Exception):
+            raise state
+        return state
+
+    miq_api_class.return_value.get.side_effect = get
+    yield task_states
+
+
+ACTIVE = {'state': 'Active', 'status': 'Ok', 'message': 'Deleting'}
+FINISHED = {'state': 'Finished', 'status': 'Ok', 'message': 'Task completed successfully'}
+ERROR = {'state': 'Finished', 'status': 'Error', 'message': 'Delete failed'}
+
+
+def test_waits_for_all_the_tasks(miq, miq_api_class, task_states, clock):
+    task_states.update({'1': [FINISHED], '2': [ACTIVE, ACTIVE, FINISHED]})
+
+    res_args = miq.wait_for_tasks(['1', '2'], task_poller=Poller(interval=1, clock=clock, sleep=clock.sleep))
+    assert res_args['msg'] == "All 2 tasks finished"
+    assert not res_args['failed']
+    first, second = res_args['tasks']
+    assert first['finished'] and first['elapsed'] == 0
+    assert second['finished'] and second['elapsed'] == 3
+    assert second['message'] == 'Task completed successfully'
+    # finished tasks aren't checked again
+    assert miq_api_class.return_value.get.call_count == 4
+    miq_api_class.return_value.get.assert_any_call(TASKS_URL + '/1', attributes='state,status,message,created_on,updated_on')
+
+
+def test_fails_fast_on_the_first_failure(miq, task_states, clock):
+    task_states.update({'1': [ACTIVE, ERROR], '2': [ACTIVE]})
+
+    res_args = miq.wait_for_tasks(['1', '2'], fail_fast=True,
+                                  task_poller=Poller(interval=1, clock=clock, sleep=clock.sleep))
+    assert res_args['failed']
+    assert res_args['msg'] == "1 of 2 tasks failed: 1"
+    assert [task['finished'] for task in res_args['tasks']] == [True, False]
+    assert clock.now == 1001
+
+
+def test_reports_tasks_unfinished_at_the_deadline(miq, task_states, clock):
+    task_states.update({'1': [FINISHED], '2': [ACTIVE], '3': [APIException("Not found")]})
+
+    res_args = miq.wait_for_tasks(['1', '2', '3'], task_poller=Poller(interval=1, timeout=5, clock=clock, sleep=clock.sleep))
+    assert res_args['failed']
+    assert res_args['msg'].startswith("Timed out waiting for 2 of 3 tasks: 2, 3 (3: Failed to get task data. Error: APIException(")
+    assert res_args['tasks'][2]['read_error'].startswith("Failed to get task data. Error: APIException(")
+    assert res_args['tasks'][1] == dict(ACTIVE, id='2', finished=False, elapsed=None, created_on=None, updated_on=None)
+    assert clock.now == 1005
+
+    task_states['3'] = [FINISHED]
+    res_args = miq.wait_for_tasks(['2', '3'], task_poller=Poller(interval=1, timeout=5, clock=clock, sleep=clock.sleep))
+    assert res_args['msg'] == "Timed out waiting for 1 of 2 tasks: 2"
+
+
+def test_retries_tasks_that_cant_be_read(miq, task_states, clock):
+    task_states.update({'1': [APIException("Service unavailable"), ACTIVE, FINISHED]})
+
+    res_args = miq.wait_for_tasks(['1'], task_poller=Poller(interval=1, timeout=10, clock=clock, sleep=clock.sleep))
+    assert not res_args['failed']
+    assert res_args['msg'] == "All 1 tasks finished"
+    assert res_args['tasks'][0] == dict(FINISHED, id='1', finished=True, elapsed=3, created_on=None, updated_on=None)
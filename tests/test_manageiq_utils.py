@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import stat
+
+import pytest
+import requests
+from mock import Mock
+
+from manageiq_client.api import ManageIQClient
+from ansible.module_utils import manageiq_utils
+
+
+MANAGEIQ_API_URL = "http://themanageiq.tld/api"
+
+
+@pytest.fixture(autouse=True)
+def no_entry_point_request(monkeypatch):
+    monkeypatch.setattr(ManageIQClient, "_load_data", Mock())
+
+
+@pytest.fixture(autouse=True)
+def no_tokens():
+    manageiq_utils._tokens.clear()
+    yield
+    manageiq_utils._tokens.clear()
+
+
+def response(status_code, body=None):
+    the_response = requests.Response()
+    the_response.status_code = status_code
+    the_response._content = json.dumps(body or {}).encode('utf-8')
+    return the_response
+
+
+@pytest.fixture
+def session_get(monkeypatch):
+    session_get = Mock(return_value=response(200, {'auth_token': 'the-token', 'token_ttl': 600}))
+    monkeypatch.setattr(requests.Session, "get", session_get)
+    yield session_get
+
+
+def test_pooled_client_mounts_sized_pool():
+    client = manageiq_utils.PooledManageIQClient(MANAGEIQ_API_URL, ("admin", "smartvm"), pool_size=25)
+    for prefix in ('http://', 'https://'):
+        adapter = client._session.get_adapter(prefix + 'themanageiq.tld')
+        assert adapter._pool_maxsize == 25
+
+
+def test_clients_are_shared_per_connection_settings():
+    client_class = Mock(spec=ManageIQClient)
+    first = manageiq_utils.manageiq_client(client_class, MANAGEIQ_API_URL, "admin", "smartvm", True, None)
+    second = manageiq_utils.manageiq_client(client_class, MANAGEIQ_API_URL, "admin", "smartvm", True, None)
+    manageiq_utils.manageiq_client(client_class, MANAGEIQ_API_URL, "other", "smartvm", True, None)
+    assert first is second
+    assert client_class.call_count == 2
+
+
+def test_client_authenticates_once_with_a_token(session_get):
+    tokens = manageiq_utils.TokenStore()
+    client = manageiq_utils.PooledManageIQClient(MANAGEIQ_API_URL, ("admin", "smartvm"), tokens=tokens)
+    assert client._session.auth is None
+    assert client._session.headers['X-Auth-Token'] == 'the-token'
+    session_get.assert_called_once_with(MANAGEIQ_API_URL + '/auth', auth=("admin", "smartvm"))
+    other = manageiq_utils.PooledManageIQClient(MANAGEIQ_API_URL, ("admin", "smartvm"), tokens=tokens)
+    assert other._session.headers['X-Auth-Token'] == 'the-token'
+    assert session_get.call_count == 1
+
+
+def test_client_keeps_basic_auth_without_token(session_get):
+    session_get.return_value = response(401, {'error': 'unauthorized'})
+    client = manageiq_utils.PooledManageIQClient(MANAGEIQ_API_URL, ("admin", "smartvm"),
+                                                 tokens=manageiq_utils.TokenStore())
+    assert client._session.auth == ("admin", "smartvm")
+    assert 'X-Auth-Token' not in client._session.headers
+
+
+def test_token_is_renewed_before_expiry(session_get, clock):
+    client = manageiq_utils.PooledManageIQClient(MANAGEIQ_API_URL, ("admin", "smartvm"),
+                                                 tokens=manageiq_utils.TokenStore(clock=clock))
+    clock.now += 600 - manageiq_utils.TokenStore.RENEW_MARGIN
+    session_get.return_value = response(200, {'auth_token': 'new-token', 'token_ttl': 600})
+    client.get(MANAGEIQ_API_URL + '/providers')
+    assert client._session.headers['X-Auth-Token'] == 'new-token'
+
+
+def test_token_file_is_private_and_shared(tmpdir):
+    path = str(tmpdir.join('tokens'))
+    manageiq_utils.TokenStore(path).put(MANAGEIQ_API_URL, "admin", 'the-token', 600)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    manageiq_utils._tokens.clear()  # another process
+    assert manageiq_utils.TokenStore(path).get(MANAGEIQ_API_URL, "admin") == 'the-token'
+    assert manageiq_utils.TokenStore().get(MANAGEIQ_API_URL, "other") is None